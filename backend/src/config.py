@@ -27,6 +27,13 @@ class Config:
     JWT_BLACKLIST_ENABLED = True
     JWT_BLACKLIST_TOKEN_CHECKS = ['access', 'refresh']
     
+    # Token Blocklist Configuration (per-process Bloom filter in front of token_blacklist)
+    TOKEN_BLOCKLIST_BLOOM_CAPACITY = int(os.environ.get('TOKEN_BLOCKLIST_BLOOM_CAPACITY', 100000))  # Grows with the table
+    TOKEN_BLOCKLIST_BLOOM_ERROR_RATE = float(os.environ.get('TOKEN_BLOCKLIST_BLOOM_ERROR_RATE', 0.001))
+    TOKEN_BLOCKLIST_REFRESH_INTERVAL = int(os.environ.get('TOKEN_BLOCKLIST_REFRESH_INTERVAL', 60))  # Seconds between rebuilds
+    TOKEN_BLOCKLIST_PRUNE_INTERVAL = int(os.environ.get('TOKEN_BLOCKLIST_PRUNE_INTERVAL', 3600))  # Seconds between expired-row deletes
+    TOKEN_BLOCKLIST_CHANNEL = os.environ.get('TOKEN_BLOCKLIST_CHANNEL', 'token-revocations')  # Redis channel for logouts
+    
     # CORS Configuration
     CORS_ORIGINS = os.environ.get('CORS_ORIGINS', '*').split(',')
     
@@ -34,10 +41,87 @@ class Config:
     MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))  # 16MB
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'uploads')
     
+    # Genotype Store Configuration (unset = packed calls stored inline in the database)
+    GENOTYPE_STORE_PATH = os.environ.get('GENOTYPE_STORE_PATH')
+    
+    # Genomic Relationship Matrix Configuration
+    GRM_BLOCK_SIZE = int(os.environ.get('GRM_BLOCK_SIZE', 10000))  # Markers per block
+    GRM_SYNC_MAX_ANIMALS = int(os.environ.get('GRM_SYNC_MAX_ANIMALS', 200))  # Larger sets run as a task
+    
+    # Pedigree Index Configuration
+    PEDIGREE_INDEX_TTL = int(os.environ.get('PEDIGREE_INDEX_TTL', 300))  # Seconds before a full rebuild
+    
+    # Dashboard Configuration
+    DASHBOARD_SNAPSHOT_TTL = int(os.environ.get('DASHBOARD_SNAPSHOT_TTL', 30))  # Commits invalidate sooner
+    
+    # Statistics Configuration
+    STATS_RECONCILE_INTERVAL = int(os.environ.get('STATS_RECONCILE_INTERVAL', 3600))  # Seconds between full recounts; 0 disables them
+    
     # Pagination Configuration
     DEFAULT_PAGE_SIZE = int(os.environ.get('DEFAULT_PAGE_SIZE', 20))
     MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 100))
     
+    # Search Configuration
+    SEARCH_MAX_RESULTS = int(os.environ.get('SEARCH_MAX_RESULTS', 100))
+    
+    # Autocomplete Configuration
+    AUTOCOMPLETE_INDEX_TTL = int(os.environ.get('AUTOCOMPLETE_INDEX_TTL', 3600))  # Seconds before a background rebuild; 0 disables
+    
+    # Audit Log Configuration (queued, written in batches by a background thread)
+    AUDIT_ASYNC = os.environ.get('AUDIT_ASYNC', 'true').lower() == 'true'
+    AUDIT_QUEUE_SIZE = int(os.environ.get('AUDIT_QUEUE_SIZE', 10000))
+    AUDIT_BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE', 500))
+    AUDIT_FLUSH_INTERVAL = float(os.environ.get('AUDIT_FLUSH_INTERVAL', 1.0))  # Seconds
+    AUDIT_SLOW_FLUSH_SECONDS = float(os.environ.get('AUDIT_SLOW_FLUSH_SECONDS', 2.0))  # Slower flushes divert to the spool
+    AUDIT_SPOOL_RETRY_INTERVAL = int(os.environ.get('AUDIT_SPOOL_RETRY_INTERVAL', 30))  # Seconds before retrying the database
+    AUDIT_SPOOL_PATH = os.environ.get('AUDIT_SPOOL_PATH')  # Default: <instance path>/audit_spool.jsonl
+    AUDIT_PARTITIONING = os.environ.get('AUDIT_PARTITIONING', 'true').lower() == 'true'  # Monthly partitions / rolling tables
+    AUDIT_PARTITION_MONTHS_AHEAD = int(os.environ.get('AUDIT_PARTITION_MONTHS_AHEAD', 2))
+    AUDIT_RETENTION_DAYS = int(os.environ.get('AUDIT_RETENTION_DAYS', 0))  # Automatic retention; 0 keeps everything
+    AUDIT_ARCHIVE_DIR = os.environ.get('AUDIT_ARCHIVE_DIR')  # Default: <instance path>/audit_archive
+    AUDIT_MAINTENANCE_INTERVAL = int(os.environ.get('AUDIT_MAINTENANCE_INTERVAL', 86400))  # Seconds; 0 disables
+    
+    # Export Configuration
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))  # Rows per keyset batch
+    
+    # Cache Configuration (in-process L1 tier in front of Redis)
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL') or os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+    CACHE_SERIALIZER = os.environ.get('CACHE_SERIALIZER', 'json')  # json, msgpack or pickle
+    CACHE_L1_MAX_ENTRIES = int(os.environ.get('CACHE_L1_MAX_ENTRIES', 10000))
+    CACHE_L1_MAX_BYTES = int(os.environ.get('CACHE_L1_MAX_BYTES', 64 * 1024 * 1024))  # 64MB
+    CACHE_L1_TTL = int(os.environ.get('CACHE_L1_TTL', 30))  # Max seconds an L1 copy outlives a Redis write
+    CACHE_NAMESPACE_TTLS = os.environ.get('CACHE_NAMESPACE_TTLS', '')  # e.g. "stats=300,response=10"
+    CACHE_INVALIDATION_PUBSUB = os.environ.get('CACHE_INVALIDATION_PUBSUB', 'True').lower() == 'true'  # Needs Redis
+    CACHE_INVALIDATION_CHANNEL = os.environ.get('CACHE_INVALIDATION_CHANNEL', 'cache-invalidation')
+    CACHE_INVALIDATION_IGNORE_TABLES = os.environ.get('CACHE_INVALIDATION_IGNORE_TABLES', 'audit_logs,background_tasks')
+    
+    # Rate Limiting Configuration (sliding-window counters in Redis, in-process fallback)
+    RATELIMIT_KEY_PREFIX = os.environ.get('RATELIMIT_KEY_PREFIX', 'ratelimit:')
+    RATELIMIT_MEMORY_MAX_KEYS = int(os.environ.get('RATELIMIT_MEMORY_MAX_KEYS', 100000))  # In-process keys kept (LRU)
+    RATELIMIT_REDIS_RETRY_INTERVAL = int(os.environ.get('RATELIMIT_REDIS_RETRY_INTERVAL', 30))  # Seconds on local counters after a Redis error
+    RATELIMIT_REDIS_TIMEOUT = float(os.environ.get('RATELIMIT_REDIS_TIMEOUT', 0.05))  # Seconds a check may wait on Redis
+    IP_RATE_LIMIT = int(os.environ.get('IP_RATE_LIMIT', 100))  # Requests per IP per window (block_suspicious_ips)
+    IP_RATE_LIMIT_WINDOW = int(os.environ.get('IP_RATE_LIMIT_WINDOW', 300))  # Seconds
+    
+    # Principal Cache Configuration (user, roles and permissions per request)
+    PRINCIPAL_CACHE_TTL = int(os.environ.get('PRINCIPAL_CACHE_TTL', 30))  # Seconds; role changes invalidate at once
+    PERMISSION_REBUILD_INTERVAL = int(os.environ.get('PERMISSION_REBUILD_INTERVAL', 30))  # Seconds; only without the invalidation channel
+    
+    # Task Configuration (queue=thread|process:workers; registered tasks choose their queue)
+    TASK_QUEUES = os.environ.get('TASK_QUEUES', 'io=thread:4,cpu=process:2')
+    TASK_PROCESS_START_METHOD = os.environ.get('TASK_PROCESS_START_METHOD', 'spawn')  # Process pools start clean, without the parent's threads
+    TASK_BACKEND = os.environ.get('TASK_BACKEND', 'local')  # 'database': registered tasks wait in background_tasks for `python -m src.worker`
+    TASK_LEASE_SECONDS = int(os.environ.get('TASK_LEASE_SECONDS', 60))  # Renewed every third of this while a task runs
+    TASK_MAX_ATTEMPTS = int(os.environ.get('TASK_MAX_ATTEMPTS', 3))  # Default for tasks registered without max_attempts
+    TASK_RETRY_BACKOFF = float(os.environ.get('TASK_RETRY_BACKOFF', 30))  # Seconds before the first retry, doubling per attempt
+    TASK_RETRY_BACKOFF_MAX = float(os.environ.get('TASK_RETRY_BACKOFF_MAX', 3600))
+    TASK_POLL_INTERVAL = float(os.environ.get('TASK_POLL_INTERVAL', 1.0))  # Seconds an idle worker waits between claims
+    TASK_PROGRESS_INTERVAL = float(os.environ.get('TASK_PROGRESS_INTERVAL', 0.5))  # Min seconds between live progress updates
+    TASK_PROGRESS_MIN_DELTA = int(os.environ.get('TASK_PROGRESS_MIN_DELTA', 1))  # Percentage points (unless the message changed)
+    TASK_PROGRESS_CHECKPOINT_INTERVAL = float(os.environ.get('TASK_PROGRESS_CHECKPOINT_INTERVAL', 10))  # Seconds between progress commits
+    TASK_PROGRESS_TTL = int(os.environ.get('TASK_PROGRESS_TTL', 3600))  # Seconds live progress is kept
+    TASK_PROGRESS_STREAM_TIMEOUT = int(os.environ.get('TASK_PROGRESS_STREAM_TIMEOUT', 300))  # Seconds per event stream; clients reconnect
+    
     # Email Configuration
     MAIL_SERVER = os.environ.get('MAIL_SERVER')
     MAIL_PORT = int(os.environ.get('MAIL_PORT', 587))
@@ -78,8 +162,10 @@ class TestingConfig(Config):
     """Testing configuration."""
     DEBUG = True
     TESTING = True
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL', 'sqlite:///:memory:')
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(seconds=300)
+    AUDIT_ASYNC = False
+    TASK_QUEUES = 'io=thread:2,cpu=thread:2'
 
 config = {
     'development': DevelopmentConfig,
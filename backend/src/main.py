@@ -12,14 +12,25 @@ from src.config import config
 from src.database import init_db, create_tables
 from src.models import *  # Import all models
 
-# Import Redis cache
-from src.cache import reprotech_cache
-
 # Import utilities
 from src.utils.cache import cache
+from src.utils.cache_events import cache_invalidator
 from src.utils.email import email_service
 from src.utils.tasks import task_manager
+from src.utils.task_progress import task_progress
+from src.utils.genotype_store import genotype_store
+from src.utils.pedigree import pedigree_index
+from src.utils.dashboard import dashboard_snapshot
+from src.utils.counters import entity_counters
+from src.utils.search import search_index
+from src.utils.autocomplete import animal_autocomplete
 from src.utils.audit import AuditLogger
+from src.utils.audit_writer import audit_writer
+from src.utils.audit_partitions import audit_partitions
+from src.utils.token_blocklist import token_blocklist
+from src.utils.permissions import permission_registry
+from src.utils.principal import principal_cache
+from src.middleware.rate_limiting import rate_limit_storage
 
 # Import route blueprints
 from src.routes.auth import auth_bp
@@ -34,6 +45,7 @@ from src.routes.workflows import workflows_bp
 from src.routes.system import system_bp
 from src.routes.test import test_bp
 from src.routes.cache_management import cache_bp
+from src.routes.search import search_bp
 
 def create_app(config_name='development'):
     """Application factory pattern."""
@@ -47,20 +59,30 @@ def create_app(config_name='development'):
     jwt = JWTManager(app)
     init_db(app)
     
-    # Initialize Redis cache
-    reprotech_cache.init_app(app)
-    
     # Initialize utilities
-    cache.init_app(app)
+    cache.init_app(app)  # Single two-tier cache (memory L1 + Redis)
+    cache_invalidator.init_app(app, cache)
+    rate_limit_storage.init_app(app, cache)  # Same Redis server as the cache
+    dashboard_snapshot.init_app(app, cache)
     email_service.init_app(app)
     task_manager.init_app(app)
+    task_progress.init_app(app, cache)
+    genotype_store.init_app(app)
+    pedigree_index.init_app(app)
+    entity_counters.init_app(app)
+    search_index.init_app(app)
+    animal_autocomplete.init_app(app, cache_invalidator)
+    audit_writer.init_app(app)
+    audit_partitions.init_app(app)
+    token_blocklist.init_app(app, cache)
+    permission_registry.init_app(app, cache_invalidator)
+    principal_cache.init_app(app, cache)
     
     # JWT token blacklist checker
     @jwt.token_in_blocklist_loader
     def check_if_token_revoked(jwt_header, jwt_payload):
-        from src.models.user import TokenBlacklist
         jti = jwt_payload['jti']
-        return TokenBlacklist.is_jti_blacklisted(jti)
+        return token_blocklist.is_revoked(jti)  # Database only on a Bloom filter hit
     
     # Register API blueprints
     api_prefix = app.config['API_PREFIX']
@@ -77,10 +99,17 @@ def create_app(config_name='development'):
     app.register_blueprint(system_bp, url_prefix=f'{api_prefix}/system')
     app.register_blueprint(test_bp, url_prefix=f'{api_prefix}/test')
     app.register_blueprint(cache_bp, url_prefix=f'{api_prefix}/cache')
+    app.register_blueprint(search_bp, url_prefix=f'{api_prefix}/search')
     
     # Create database tables
     with app.app_context():
         create_tables(app)
+        search_index.ensure_schema()
+        animal_autocomplete.build()
+        token_blocklist.build()
+        entity_counters.start_maintenance()
+        audit_partitions.ensure()
+        audit_partitions.start_maintenance()
         # Log system startup after app context is available
         AuditLogger.log_system_event('SYSTEM_STARTUP', 'Application started successfully')
     
@@ -121,7 +150,8 @@ def create_app(config_name='development'):
                 'genomics': f'{api_prefix}/genomics',
                 'biobank': f'{api_prefix}/biobank',
                 'analytics': f'{api_prefix}/analytics',
-                'workflows': f'{api_prefix}/workflows'
+                'workflows': f'{api_prefix}/workflows',
+                'search': f'{api_prefix}/search'
             }
         })
     
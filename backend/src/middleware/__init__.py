@@ -1,4 +1,4 @@
-from .auth import auth_required, role_required, optional_auth
+from .auth import auth_required, role_required, permission_required, optional_auth
 from .rate_limiting import rate_limit
 from .security import security_headers, validate_request
 from .logging import request_logger
@@ -6,6 +6,7 @@ from .logging import request_logger
 __all__ = [
     'auth_required',
     'role_required', 
+    'permission_required',
     'optional_auth',
     'rate_limit',
     'security_headers',
@@ -1,7 +1,7 @@
 from functools import wraps
 from flask import request, jsonify, current_app, g
-from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt, verify_jwt_in_request
-from src.models.user import User, TokenBlacklist
+from flask_jwt_extended import jwt_required, verify_jwt_in_request
+from src.utils.principal import current_principal, current_user as load_current_user
 
 def auth_required(f):
     """Decorator to require authentication."""
@@ -9,18 +9,16 @@ def auth_required(f):
     @jwt_required()
     def decorated_function(*args, **kwargs):
         try:
-            # Get current user
-            current_user_id = get_jwt_identity()
-            current_user = User.query.get(current_user_id)
+            # Get current principal (cached user, roles and permissions)
+            principal = current_principal()
             
-            if not current_user:
+            if not principal:
                 return jsonify({'error': 'User not found'}), 401
             
-            if not current_user.is_active:
+            if not principal.is_active:
                 return jsonify({'error': 'Account is deactivated'}), 401
             
-            # Store user in Flask's g object for access in views
-            g.current_user = current_user
+            # The User row is loaded into g.current_user on first use (load_current_user)
             
             return f(*args, **kwargs)
             
@@ -37,10 +35,8 @@ def role_required(*required_roles):
         @auth_required
         def decorated_function(*args, **kwargs):
             try:
-                current_user = g.current_user
-                
                 # Check if user has any of the required roles
-                user_roles = [role.name for role in current_user.roles]
+                user_roles = sorted(g.principal.roles)
                 
                 if not any(role in user_roles for role in required_roles):
                     return jsonify({
@@ -58,6 +54,36 @@ def role_required(*required_roles):
         return decorated_function
     return decorator
 
+def permission_required(*required_permissions):
+    """Decorator to require all of the given permissions."""
+    def decorator(f):
+        @wraps(f)
+        @auth_required
+        def decorated_function(*args, **kwargs):
+            try:
+                from src.utils.permissions import permission_registry
+                
+                # One AND against the principal's permission mask; unknown permissions have no bit
+                bits = [permission_registry.bit(permission) for permission in required_permissions]
+                required_mask = 0
+                for bit in bits:
+                    required_mask |= bit
+                
+                if 0 in bits or g.principal.mask & required_mask != required_mask:
+                    return jsonify({
+                        'error': 'Insufficient permissions',
+                        'required_permissions': list(required_permissions)
+                    }), 403
+                
+                return f(*args, **kwargs)
+                
+            except Exception as e:
+                current_app.logger.error(f"Permission check error: {str(e)}")
+                return jsonify({'error': 'Permission check failed'}), 403
+        
+        return decorated_function
+    return decorator
+
 def optional_auth(f):
     """Decorator for optional authentication."""
     @wraps(f)
@@ -66,13 +92,9 @@ def optional_auth(f):
             # Try to verify JWT token
             verify_jwt_in_request(optional=True)
             
-            current_user_id = get_jwt_identity()
-            if current_user_id:
-                current_user = User.query.get(current_user_id)
-                if current_user and current_user.is_active:
-                    g.current_user = current_user
-                else:
-                    g.current_user = None
+            principal = current_principal()
+            if principal and principal.is_active:
+                load_current_user()
             else:
                 g.current_user = None
                 
@@ -107,10 +129,10 @@ def check_resource_ownership(resource_user_id_field='user_id'):
         @auth_required
         def decorated_function(*args, **kwargs):
             try:
-                current_user = g.current_user
+                current_user = load_current_user()
                 
                 # Admin can access everything
-                if any(role.name == 'admin' for role in current_user.roles):
+                if g.principal.has_role('admin'):
                     return f(*args, **kwargs)
                 
                 # Get resource from request data or URL parameters
@@ -150,10 +172,10 @@ def check_customer_access(customer_id_field='customer_id'):
         @auth_required
         def decorated_function(*args, **kwargs):
             try:
-                current_user = g.current_user
+                current_user = load_current_user()
                 
                 # Admin can access everything
-                if any(role.name == 'admin' for role in current_user.roles):
+                if g.principal.has_role('admin'):
                     return f(*args, **kwargs)
                 
                 # Get customer ID from request
@@ -1,11 +1,272 @@
+"""
+Request rate limiting.
+
+Limits use a sliding-window counter: each key keeps only the request count
+of the current and the previous fixed window, and the previous window's
+count is weighted by how much of it still overlaps the sliding window. A
+check is therefore constant time and constant memory per key.
+
+With Redis available the counters live there and are read, checked and
+incremented by one Lua script, so every worker process shares the same
+limits. Without Redis (or while it is unreachable) the counters are kept in
+a bounded, thread-safe in-process map instead. Redis calls use a short
+timeout (RATELIMIT_REDIS_TIMEOUT) so a slow server degrades to local
+counters rather than holding up requests.
+"""
+
+import math
+import redis
+import threading
 import time
+import zlib
+from collections import OrderedDict, namedtuple
 from functools import wraps
 from flask import request, jsonify, current_app, g
-from collections import defaultdict
-from datetime import datetime, timedelta
 
-# In-memory storage for rate limiting (use Redis in production)
-rate_limit_storage = defaultdict(list)
+RateLimitResult = namedtuple('RateLimitResult', ['allowed', 'limit', 'remaining', 'reset_after'])
+
+# KEYS: current window counter, previous window counter
+# ARGV: limit, window seconds, seconds elapsed in the current window
+SLIDING_WINDOW_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local elapsed = tonumber(ARGV[3])
+if previous * (window - elapsed) / window + current >= limit then
+    return {0, current, previous}
+end
+current = redis.call('INCR', KEYS[1])
+if current == 1 then
+    redis.call('EXPIRE', KEYS[1], math.ceil(window * 2))
+end
+return {1, current, previous}
+"""
+
+def _weighted_count(current, previous, window, elapsed):
+    return previous * (window - elapsed) / window + current
+
+def _result(allowed, current, previous, limit, window, elapsed):
+    """Remaining requests and seconds until the next one is allowed (or the window rolls)."""
+    remaining = max(0, int(limit - _weighted_count(current, previous, window, elapsed)))
+    if allowed:
+        return RateLimitResult(True, limit, remaining, window - elapsed)
+    
+    if current >= limit:
+        # Nothing frees up this window; next window this count decays like previous does now
+        reset_after = (window - elapsed) + window * (1 - limit / current)
+    else:
+        reset_after = window * (1 - (limit - current) / previous) - elapsed
+    return RateLimitResult(False, limit, 0, max(reset_after, 0))
+
+class MemoryRateLimitStore:
+    """
+    In-process sliding-window counters.
+    
+    Each key holds [window index, current count, previous count]. Keys are
+    spread over independently locked LRU segments and the least recently
+    used keys are dropped once max_keys is reached.
+    """
+    
+    def __init__(self, max_keys=100000, segments=16):
+        self.max_keys = max_keys
+        self._segments = [OrderedDict() for _ in range(segments)]
+        self._locks = [threading.Lock() for _ in range(segments)]
+        self._key_limit = max(1, max_keys // segments)
+    
+    def _segment(self, key):
+        return zlib.crc32(key.encode('utf-8')) % len(self._segments)
+    
+    @staticmethod
+    def _roll(counter, index):
+        if counter[0] != index:
+            counter[2] = counter[1] if counter[0] == index - 1 else 0
+            counter[1] = 0
+            counter[0] = index
+    
+    def hit(self, key, limit, window, index, elapsed):
+        """Count a request if it fits; returns (allowed, current, previous)."""
+        position = self._segment(key)
+        segment = self._segments[position]
+        with self._locks[position]:
+            counter = segment.get(key)
+            if counter is None:
+                counter = segment[key] = [index, 0, 0]
+                while len(segment) > self._key_limit:
+                    segment.popitem(last=False)
+            else:
+                segment.move_to_end(key)
+                self._roll(counter, index)
+            
+            allowed = _weighted_count(counter[1], counter[2], window, elapsed) < limit
+            if allowed:
+                counter[1] += 1
+            return allowed, counter[1], counter[2]
+    
+    def peek(self, key, window, index):
+        """(current, previous) counts without counting a request."""
+        position = self._segment(key)
+        with self._locks[position]:
+            counter = self._segments[position].get(key)
+            if counter is None:
+                return 0, 0
+            if counter[0] == index:
+                return counter[1], counter[2]
+            return 0, counter[1] if counter[0] == index - 1 else 0
+    
+    def prune(self, before_index):
+        """Drop keys whose last window started before before_index."""
+        for position, segment in enumerate(self._segments):
+            with self._locks[position]:
+                for key in [key for key, counter in segment.items() if counter[0] < before_index(key)]:
+                    del segment[key]
+    
+    def items(self):
+        for position, segment in enumerate(self._segments):
+            with self._locks[position]:
+                entries = list(segment.items())
+            for key, counter in entries:
+                yield key, list(counter)
+    
+    def __len__(self):
+        return sum(len(segment) for segment in self._segments)
+    
+    def clear(self):
+        for position, segment in enumerate(self._segments):
+            with self._locks[position]:
+                segment.clear()
+
+class RateLimitStorage:
+    """Sliding-window counters in Redis, falling back to process memory."""
+    
+    def __init__(self, app=None, cache=None):
+        self.app = app
+        self.redis_client = None
+        self.prefix = 'ratelimit:'
+        self.retry_interval = 30
+        self.memory = MemoryRateLimitStore()
+        self._script = None
+        self._redis_down_until = 0.0
+        
+        if app:
+            self.init_app(app, cache)
+    
+    def init_app(self, app, cache):
+        """Initialize rate limit storage with Flask app, using the cache's Redis server."""
+        self.app = app
+        self.prefix = app.config.get('RATELIMIT_KEY_PREFIX', 'ratelimit:')
+        self.retry_interval = app.config.get('RATELIMIT_REDIS_RETRY_INTERVAL', 30)
+        self.memory = MemoryRateLimitStore(max_keys=app.config.get('RATELIMIT_MEMORY_MAX_KEYS', 100000))
+        self.redis_client = None
+        if cache and cache.redis_client:
+            # Own pool with a short timeout: a slow Redis must not stall every request
+            pool = cache.redis_client.connection_pool
+            timeout = app.config.get('RATELIMIT_REDIS_TIMEOUT', 0.05)
+            self.redis_client = redis.Redis(connection_pool=redis.ConnectionPool(
+                connection_class=pool.connection_class,
+                **{**pool.connection_kwargs, 'socket_timeout': timeout, 'socket_connect_timeout': timeout}
+            ))
+        self._script = self.redis_client.register_script(SLIDING_WINDOW_SCRIPT) if self.redis_client else None
+    
+    @property
+    def backend(self):
+        return 'redis' if self._use_redis() else 'memory'
+    
+    def _use_redis(self):
+        return self._script is not None and time.monotonic() >= self._redis_down_until
+    
+    def _redis_failed(self, e):
+        self._redis_down_until = time.monotonic() + self.retry_interval
+        if self.app:
+            self.app.logger.warning(f"Rate limit Redis unavailable, using in-process counters for {self.retry_interval}s: {str(e)}")
+    
+    def _redis_keys(self, key, window, index):
+        # Hash tag keeps both windows of a key in one cluster slot
+        base = f"{self.prefix}{{{key}:{window}}}"
+        return [f"{base}:{index}", f"{base}:{index - 1}"]
+    
+    def hit(self, key, limit, window):
+        """
+        Count one request against key if it is within limit per window seconds.
+        
+        Returns:
+            RateLimitResult(allowed, limit, remaining, reset_after seconds)
+        """
+        now = time.time()
+        index = int(now // window)
+        elapsed = now - index * window
+        
+        if self._use_redis():
+            try:
+                allowed, current, previous = self._script(
+                    keys=self._redis_keys(key, window, index),
+                    args=[limit, window, repr(elapsed)]
+                )
+                return _result(bool(allowed), int(current), int(previous), limit, window, elapsed)
+            except Exception as e:
+                self._redis_failed(e)
+        
+        allowed, current, previous = self.memory.hit(f"{key}:{window}", limit, window, index, elapsed)
+        return _result(allowed, current, previous, limit, window, elapsed)
+    
+    def peek(self, key, limit, window):
+        """Like hit, without counting a request."""
+        now = time.time()
+        index = int(now // window)
+        elapsed = now - index * window
+        
+        if self._use_redis():
+            try:
+                current, previous = self.redis_client.mget(self._redis_keys(key, window, index))
+                current, previous = int(current or 0), int(previous or 0)
+                allowed = _weighted_count(current, previous, window, elapsed) < limit
+                return _result(allowed, current, previous, limit, window, elapsed)
+            except Exception as e:
+                self._redis_failed(e)
+        
+        current, previous = self.memory.peek(f"{key}:{window}", window, index)
+        allowed = _weighted_count(current, previous, window, elapsed) < limit
+        return _result(allowed, current, previous, limit, window, elapsed)
+    
+    def status(self, key_pattern=None, max_keys=1000):
+        """Current counters by key (for debugging)."""
+        status = {}
+        if self._use_redis():
+            try:
+                match = f"{self.prefix}*{key_pattern}*" if key_pattern else f"{self.prefix}*"
+                keys = []
+                for redis_key in self.redis_client.scan_iter(match=match, count=500):
+                    keys.append(redis_key)
+                    if len(keys) >= max_keys:
+                        break
+                for redis_key, count in zip(keys, self.redis_client.mget(keys) if keys else []):
+                    name = redis_key.decode('utf-8') if isinstance(redis_key, bytes) else redis_key
+                    status[name[len(self.prefix):]] = int(count or 0)
+                return status
+            except Exception as e:
+                self._redis_failed(e)
+        
+        for key, (index, current, previous) in self.memory.items():
+            if key_pattern and key_pattern not in key:
+                continue
+            status[key] = {'window_index': index, 'current': current, 'previous': previous}
+            if len(status) >= max_keys:
+                break
+        return status
+    
+    def clear(self):
+        """Drop all counters (for testing)."""
+        self.memory.clear()
+        if self._use_redis():
+            try:
+                keys = list(self.redis_client.scan_iter(match=f"{self.prefix}*", count=500))
+                for start in range(0, len(keys), 500):
+                    self.redis_client.delete(*keys[start:start + 500])
+            except Exception as e:
+                self._redis_failed(e)
+
+# Shared rate limit counters
+rate_limit_storage = RateLimitStorage()
 
 class RateLimiter:
     """Rate limiter class for managing API request limits."""
@@ -15,39 +276,23 @@ class RateLimiter:
         self.window_seconds = window_seconds
         self.storage = storage or rate_limit_storage
     
+    def check(self, key):
+        """Count a request and return the full RateLimitResult."""
+        return self.storage.hit(key, self.max_requests, self.window_seconds)
+    
     def is_allowed(self, key):
         """Check if request is allowed based on rate limit."""
-        now = time.time()
-        window_start = now - self.window_seconds
-        
-        # Clean old entries
-        self.storage[key] = [timestamp for timestamp in self.storage[key] if timestamp > window_start]
-        
-        # Check if limit exceeded
-        if len(self.storage[key]) >= self.max_requests:
-            return False, self.get_reset_time(key)
-        
-        # Add current request
-        self.storage[key].append(now)
-        return True, self.get_reset_time(key)
+        result = self.check(key)
+        return result.allowed, int(time.time() + result.reset_after)
     
     def get_reset_time(self, key):
         """Get the time when rate limit resets."""
-        if not self.storage[key]:
-            return int(time.time() + self.window_seconds)
-        
-        oldest_request = min(self.storage[key])
-        return int(oldest_request + self.window_seconds)
+        result = self.storage.peek(key, self.max_requests, self.window_seconds)
+        return int(time.time() + result.reset_after)
     
     def get_remaining_requests(self, key):
         """Get remaining requests in current window."""
-        now = time.time()
-        window_start = now - self.window_seconds
-        
-        # Clean old entries
-        self.storage[key] = [timestamp for timestamp in self.storage[key] if timestamp > window_start]
-        
-        return max(0, self.max_requests - len(self.storage[key]))
+        return self.storage.peek(key, self.max_requests, self.window_seconds).remaining
 
 def rate_limit(max_requests=100, window_seconds=3600, per='ip', key_func=None):
     """
@@ -80,23 +325,22 @@ def rate_limit(max_requests=100, window_seconds=3600, per='ip', key_func=None):
                 else:
                     key = f"global:{request.remote_addr}"
                 
-                # Create rate limiter
-                limiter = RateLimiter(max_requests, window_seconds)
+                # Check rate limit (one atomic count-and-check)
+                status = RateLimiter(max_requests, window_seconds).check(key)
+                reset_time = int(time.time() + status.reset_after)
                 
-                # Check rate limit
-                allowed, reset_time = limiter.is_allowed(key)
-                
-                if not allowed:
+                if not status.allowed:
+                    retry_after = max(1, math.ceil(status.reset_after))
                     response = jsonify({
                         'error': 'Rate limit exceeded',
                         'message': f'Maximum {max_requests} requests per {window_seconds} seconds',
-                        'retry_after': reset_time - int(time.time())
+                        'retry_after': retry_after
                     })
                     response.status_code = 429
                     response.headers['X-RateLimit-Limit'] = str(max_requests)
                     response.headers['X-RateLimit-Remaining'] = '0'
                     response.headers['X-RateLimit-Reset'] = str(reset_time)
-                    response.headers['Retry-After'] = str(reset_time - int(time.time()))
+                    response.headers['Retry-After'] = str(retry_after)
                     return response
                 
                 # Execute the function
@@ -104,9 +348,8 @@ def rate_limit(max_requests=100, window_seconds=3600, per='ip', key_func=None):
                 
                 # Add rate limit headers to response
                 if hasattr(result, 'headers'):
-                    remaining = limiter.get_remaining_requests(key)
                     result.headers['X-RateLimit-Limit'] = str(max_requests)
-                    result.headers['X-RateLimit-Remaining'] = str(remaining)
+                    result.headers['X-RateLimit-Remaining'] = str(status.remaining)
                     result.headers['X-RateLimit-Reset'] = str(reset_time)
                 
                 return result
@@ -158,37 +401,19 @@ class RateLimitExceeded(Exception):
 
 def get_rate_limit_status(key_pattern=None):
     """Get current rate limit status for debugging."""
-    if not key_pattern:
-        return dict(rate_limit_storage)
-    
-    filtered_storage = {}
-    for key, timestamps in rate_limit_storage.items():
-        if key_pattern in key:
-            filtered_storage[key] = {
-                'requests': len(timestamps),
-                'oldest_request': min(timestamps) if timestamps else None,
-                'newest_request': max(timestamps) if timestamps else None
-            }
-    
-    return filtered_storage
+    return rate_limit_storage.status(key_pattern)
 
 def clear_rate_limit_storage():
     """Clear rate limit storage (for testing)."""
     rate_limit_storage.clear()
 
 def cleanup_expired_entries():
-    """Clean up expired rate limit entries."""
-    now = time.time()
-    keys_to_remove = []
-    
-    for key, timestamps in rate_limit_storage.items():
-        # Remove timestamps older than 24 hours
-        rate_limit_storage[key] = [ts for ts in timestamps if now - ts < 86400]
-        
-        # Remove empty entries
-        if not rate_limit_storage[key]:
-            keys_to_remove.append(key)
+    """
+    Clean up expired rate limit entries.
     
-    for key in keys_to_remove:
-        del rate_limit_storage[key]
-
+    Redis counters expire on their own and the in-process map is bounded,
+    so this only drops in-process keys idle for more than a day.
+    """
+    cutoff = time.time() - 86400
+    # Memory keys end in ':<window seconds>'
+    rate_limit_storage.memory.prune(lambda key: cutoff // float(key.rsplit(':', 1)[1]))
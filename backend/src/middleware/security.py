@@ -299,41 +299,19 @@ def _is_suspicious_ip(ip_address):
         return True
 
 def _is_ip_rate_limited(ip_address):
-    """Check if an IP address has exceeded rate limits."""
-    from datetime import datetime, timedelta
+    """
+    Check if an IP address has exceeded rate limits.
     
-    # This is a simple in-memory rate limiting
-    # In production, you might want to use Redis or a database
+    Counts go to the shared sliding-window rate limit storage (Redis, or the
+    bounded in-process counters), so the check is constant time and the
+    limit holds across worker processes.
+    """
+    from src.middleware.rate_limiting import rate_limit_storage
     
-    if not hasattr(_is_ip_rate_limited, 'ip_requests'):
-        _is_ip_rate_limited.ip_requests = {}
+    max_requests = current_app.config.get('IP_RATE_LIMIT', 100)
+    window_seconds = current_app.config.get('IP_RATE_LIMIT_WINDOW', 300)
     
-    now = datetime.utcnow()
-    window_minutes = 5  # 5-minute window
-    max_requests = 100  # Max requests per window
-    
-    # Clean old entries
-    cutoff_time = now - timedelta(minutes=window_minutes)
-    _is_ip_rate_limited.ip_requests = {
-        ip: timestamps for ip, timestamps in _is_ip_rate_limited.ip_requests.items()
-        if any(ts > cutoff_time for ts in timestamps)
-    }
-    
-    # Update current IP's requests
-    if ip_address not in _is_ip_rate_limited.ip_requests:
-        _is_ip_rate_limited.ip_requests[ip_address] = []
-    
-    # Remove old timestamps for this IP
-    _is_ip_rate_limited.ip_requests[ip_address] = [
-        ts for ts in _is_ip_rate_limited.ip_requests[ip_address]
-        if ts > cutoff_time
-    ]
-    
-    # Add current request
-    _is_ip_rate_limited.ip_requests[ip_address].append(now)
-    
-    # Check if rate limit exceeded
-    return len(_is_ip_rate_limited.ip_requests[ip_address]) > max_requests
+    return not rate_limit_storage.hit(f"ip_throttle:{ip_address}", max_requests, window_seconds).allowed
 
 def add_ip_to_blocklist(ip_address, reason="Manual block"):
     """Add an IP address to the blocklist."""
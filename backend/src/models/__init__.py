@@ -3,9 +3,9 @@ from .user import User, UserProfile, Role, Permission, TokenBlacklist
 from .customer import Customer, CustomerContact, CustomerAddress
 from .animal import Animal, AnimalRole, AnimalInternalNumber, AnimalGenomicData, AnimalActivity
 from .laboratory import LabSample, LabProtocol, LabTest, LabEquipment
-from .genomics import GenomicAnalysis, SNPData, BeadChipMapping
+from .genomics import GenomicAnalysis, SNPData, BeadChipMapping, GenotypeMarkerMap, AnimalGenotype, GenomicRelationshipMatrix
 from .biobank import BiobankStorageUnit, BiobankSample, TemperatureLog
-from .analytics import AnalyticsMetric, DashboardWidget, Report, ReportExecution
+from .analytics import AnalyticsMetric, DashboardWidget, Report, ReportExecution, EntityCounter
 from .workflow import Workflow, WorkflowInstance, WorkflowStepExecution
 
 __all__ = [
@@ -22,13 +22,14 @@ __all__ = [
     'LabSample', 'LabProtocol', 'LabTest', 'LabEquipment',
     
     # Genomics and intelligence
-    'GenomicAnalysis', 'SNPData', 'BeadChipMapping',
+    'GenomicAnalysis', 'SNPData', 'BeadChipMapping', 'GenotypeMarkerMap', 'AnimalGenotype',
+    'GenomicRelationshipMatrix',
     
     # Biobank and samples
     'BiobankStorageUnit', 'BiobankSample', 'TemperatureLog',
     
     # Analytics and dashboard
-    'AnalyticsMetric', 'DashboardWidget', 'Report', 'ReportExecution',
+    'AnalyticsMetric', 'DashboardWidget', 'Report', 'ReportExecution', 'EntityCounter',
     
     # Workflow management
     'Workflow', 'WorkflowInstance', 'WorkflowStepExecution'
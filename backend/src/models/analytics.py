@@ -1,6 +1,6 @@
 from datetime import datetime, timezone
 from sqlalchemy.dialects.postgresql import UUID, JSON
-from sqlalchemy import CheckConstraint, Index
+from sqlalchemy import CheckConstraint, Index, UniqueConstraint
 import uuid
 from src.database import db
 
@@ -299,3 +299,34 @@ class ReportExecution(db.Model):
             'execution_type': self.execution_type
         }
 
+class EntityCounter(db.Model):
+    """Materialised row count of one entity table per (dimension, value), maintained on flush."""
+    __tablename__ = 'entity_counters'
+    
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    
+    # Counted table, grouping column and its value; ('total', '') holds the overall count
+    entity = db.Column(db.String(100), nullable=False)
+    dimension = db.Column(db.String(100), nullable=False)
+    value = db.Column(db.String(255), nullable=False, default='')
+    count = db.Column(db.BigInteger, nullable=False, default=0)
+    
+    updated_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    
+    # Constraints
+    __table_args__ = (
+        UniqueConstraint('entity', 'dimension', 'value', name='uq_entity_counters_key'),
+    )
+    
+    def __repr__(self):
+        return f'<EntityCounter {self.entity}.{self.dimension}={self.value}: {self.count}>'
+    
+    def to_dict(self):
+        """Convert to dictionary."""
+        return {
+            'entity': self.entity,
+            'dimension': self.dimension,
+            'value': self.value,
+            'count': self.count,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
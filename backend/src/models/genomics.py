@@ -214,3 +214,124 @@ class BeadChipMapping(db.Model):
             'updated_at': self.updated_at.isoformat()
         }
 
+
+class GenotypeMarkerMap(db.Model):
+    """Shared marker map (chromosome, position, snp_id) for packed genotype storage."""
+    __tablename__ = 'genotype_marker_maps'
+    
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    name = db.Column(db.String(255))
+    
+    # Marker identity: SHA-256 of the ordered marker list
+    checksum = db.Column(db.String(64), unique=True, nullable=False, index=True)
+    marker_count = db.Column(db.Integer, nullable=False)
+    
+    # Compressed NumPy archive with chromosomes, positions and snp_ids arrays,
+    # sorted by (chromosome, position)
+    marker_data = db.Column(db.LargeBinary, nullable=False)
+    
+    # Timestamps
+    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    
+    def __repr__(self):
+        return f'<GenotypeMarkerMap {self.name or self.checksum[:12]}: {self.marker_count} markers>'
+    
+    def to_dict(self):
+        """Convert to dictionary."""
+        return {
+            'id': str(self.id),
+            'name': self.name,
+            'checksum': self.checksum,
+            'marker_count': self.marker_count,
+            'created_at': self.created_at.isoformat()
+        }
+
+class AnimalGenotype(db.Model):
+    """Packed genotype calls for one animal, 2 bits per marker of a marker map."""
+    __tablename__ = 'animal_genotypes'
+    
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    animal_id = db.Column(UUID(as_uuid=True), db.ForeignKey('animals.id', ondelete='CASCADE'), nullable=False)
+    marker_map_id = db.Column(UUID(as_uuid=True), db.ForeignKey('genotype_marker_maps.id'), nullable=False)
+    
+    # Call summary
+    call_count = db.Column(db.Integer, nullable=False)
+    missing_count = db.Column(db.Integer, default=0)
+    
+    # Packed calls are stored inline, or in a memory-mappable .npy file
+    packed_calls = db.Column(db.LargeBinary)
+    storage_path = db.Column(db.String(500))
+    
+    # Timestamps
+    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    updated_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    
+    # Relationships
+    animal = db.relationship('Animal', backref='genotypes')
+    marker_map = db.relationship('GenotypeMarkerMap', backref='genotypes')
+    
+    # Constraints
+    __table_args__ = (
+        db.UniqueConstraint('animal_id', 'marker_map_id', name='uq_animal_genotype_map'),
+        Index('idx_animal_genotypes_map', 'marker_map_id'),
+    )
+    
+    def __repr__(self):
+        return f'<AnimalGenotype {self.animal_id}: {self.call_count} calls>'
+    
+    def to_dict(self):
+        """Convert to dictionary."""
+        return {
+            'id': str(self.id),
+            'animal_id': str(self.animal_id),
+            'marker_map_id': str(self.marker_map_id),
+            'call_count': self.call_count,
+            'missing_count': self.missing_count,
+            'call_rate': round(1 - self.missing_count / self.call_count, 4) if self.call_count else None,
+            'storage': 'file' if self.storage_path else 'inline',
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat()
+        }
+
+class GenomicRelationshipMatrix(db.Model):
+    """Cached VanRaden genomic relationship matrix for a set of animals on one marker map."""
+    __tablename__ = 'genomic_relationship_matrices'
+    
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    
+    # SHA-256 of the marker map checksum, the sorted animal ids and, for incremental updates, the base matrix
+    cache_key = db.Column(db.String(64), unique=True, nullable=False, index=True)
+    marker_map_id = db.Column(UUID(as_uuid=True), db.ForeignKey('genotype_marker_maps.id'), nullable=False)
+    
+    # Matrix summary
+    animal_count = db.Column(db.Integer, nullable=False)
+    marker_count = db.Column(db.Integer, nullable=False)  # Informative markers used
+    scale = db.Column(db.Float, nullable=False)  # 2 * sum(p * (1 - p))
+    
+    # Matrix this one was extended from by an incremental update, if any
+    base_matrix_id = db.Column(UUID(as_uuid=True), db.ForeignKey('genomic_relationship_matrices.id'))
+    
+    # Compressed NumPy archive with animal_ids, frequencies and matrix arrays
+    matrix_data = db.Column(db.LargeBinary, nullable=False)
+    
+    # Timestamps
+    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    
+    # Relationships
+    marker_map = db.relationship('GenotypeMarkerMap', backref='relationship_matrices')
+    
+    def __repr__(self):
+        return f'<GenomicRelationshipMatrix {self.cache_key[:12]}: {self.animal_count} animals>'
+    
+    def to_dict(self):
+        """Convert to dictionary."""
+        return {
+            'id': str(self.id),
+            'cache_key': self.cache_key,
+            'marker_map_id': str(self.marker_map_id),
+            'animal_count': self.animal_count,
+            'marker_count': self.marker_count,
+            'scale': self.scale,
+            'base_matrix_id': str(self.base_matrix_id) if self.base_matrix_id else None,
+            'created_at': self.created_at.isoformat()
+        }
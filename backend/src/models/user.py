@@ -63,11 +63,10 @@ class User(db.Model):
         self.failed_login_attempts = 0
     
     def has_permission(self, permission_name):
-        """Check if user has specific permission."""
-        for role in self.roles:
-            if role.has_permission(permission_name):
-                return True
-        return False
+        """Check if user has specific permission (one AND against the cached mask)."""
+        from src.utils.principal import principal_cache
+        principal = principal_cache.load(self.id)
+        return bool(principal) and principal.has_permission(permission_name)
     
     def has_role(self, role_name):
         """Check if user has specific role."""
@@ -157,8 +156,9 @@ class Role(db.Model):
     permissions = db.relationship('Permission', secondary='role_permissions', backref='roles')
     
     def has_permission(self, permission_name):
-        """Check if role has specific permission."""
-        return any(perm.name == permission_name for perm in self.permissions)
+        """Check if role has specific permission (one AND against the role's mask)."""
+        from src.utils.permissions import permission_registry
+        return bool(permission_registry.role_mask(self.name) & permission_registry.bit(permission_name))
     
     def to_dict(self):
         """Convert to dictionary."""
@@ -215,7 +215,7 @@ class TokenBlacklist(db.Model):
     token_type = db.Column(db.String(10), nullable=False)
     user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id', ondelete='CASCADE'))
     revoked_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
-    expires_at = db.Column(db.DateTime(timezone=True), nullable=False)
+    expires_at = db.Column(db.DateTime(timezone=True), nullable=False, index=True)
     
     @classmethod
     def is_jti_blacklisted(cls, jti):
@@ -1,17 +1,17 @@
 from datetime import datetime, timezone, timedelta
 from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 from sqlalchemy import or_, and_, func
 from src.database import db
-from src.models.user import User
+from src.utils.principal import current_user as load_current_user
 from src.models.analytics import AnalyticsMetric, DashboardWidget, Report, ReportExecution
+from src.utils.pagination import paginate_query, InvalidCursor
 
 analytics_bp = Blueprint('analytics', __name__)
 
 def get_current_user():
-    """Get current authenticated user."""
-    current_user_id = get_jwt_identity()
-    return User.query.get(current_user_id)
+    """Get current authenticated user (loaded at most once per request)."""
+    return load_current_user()
 
 def generate_metric_id():
     """Generate unique metric ID."""
@@ -89,23 +89,17 @@ def list_metrics():
         if active_only:
             query = query.filter(AnalyticsMetric.is_active == True)
         
-        query = query.order_by(AnalyticsMetric.category, AnalyticsMetric.metric_name)
-        
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-        metrics = [metric.to_dict() for metric in pagination.items]
+        items, pagination = paginate_query(query, [AnalyticsMetric.category, AnalyticsMetric.metric_name], page, per_page)
+        metrics = [metric.to_dict() for metric in items]
         
         return jsonify({
             'metrics': metrics,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
-            }
+            'pagination': pagination
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    
     except Exception as e:
         current_app.logger.error(f"List metrics error: {str(e)}")
         return jsonify({'error': 'Failed to list metrics'}), 500
@@ -252,23 +246,17 @@ def list_widgets():
         if active_only:
             query = query.filter(DashboardWidget.is_active == True)
         
-        query = query.order_by(DashboardWidget.dashboard_section, DashboardWidget.position_y, DashboardWidget.position_x)
-        
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-        widgets = [widget.to_dict() for widget in pagination.items]
+        items, pagination = paginate_query(query, [DashboardWidget.dashboard_section, DashboardWidget.position_y, DashboardWidget.position_x], page, per_page)
+        widgets = [widget.to_dict() for widget in items]
         
         return jsonify({
             'widgets': widgets,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
-            }
+            'pagination': pagination
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    
     except Exception as e:
         current_app.logger.error(f"List widgets error: {str(e)}")
         return jsonify({'error': 'Failed to list widgets'}), 500
@@ -411,23 +399,17 @@ def list_reports():
             query = query.filter(Report.report_type == report_type_filter)
         
         query = query.filter(Report.is_active == True)
-        query = query.order_by(Report.created_at.desc())
-        
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-        reports = [report.to_dict() for report in pagination.items]
+        items, pagination = paginate_query(query, [Report.created_at.desc()], page, per_page)
+        reports = [report.to_dict() for report in items]
         
         return jsonify({
             'reports': reports,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
-            }
+            'pagination': pagination
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    
     except Exception as e:
         current_app.logger.error(f"List reports error: {str(e)}")
         return jsonify({'error': 'Failed to list reports'}), 500
@@ -550,41 +532,11 @@ def execute_report(report_id):
 def get_dashboard_data():
     """Get comprehensive dashboard data."""
     try:
-        # Import models for statistics
-        from src.models.animal import Animal
-        from src.models.customer import Customer
-        from src.models.laboratory import LabSample, LabTest
-        from src.models.biobank import BiobankSample, BiobankStorageUnit
-        
-        # Basic statistics
-        stats = {
-            'animals': {
-                'total': Animal.query.filter(Animal.deleted_at.is_(None)).count(),
-                'active': Animal.query.filter_by(status='ACTIVE', deleted_at=None).count()
-            },
-            'customers': {
-                'total': Customer.query.count(),
-                'active': Customer.query.filter_by(status='Active').count()
-            },
-            'laboratory': {
-                'samples': LabSample.query.count(),
-                'tests': LabTest.query.count(),
-                'pending_tests': LabTest.query.filter_by(status='PENDING').count()
-            },
-            'biobank': {
-                'samples': BiobankSample.query.count(),
-                'storage_units': BiobankStorageUnit.query.count()
-            }
-        }
+        from src.utils.dashboard import dashboard_snapshot
         
-        # Get recent activities from database
-        recent_activities = _get_recent_activities(limit=10)
-        
-        return jsonify({
-            'statistics': stats,
-            'recent_activities': recent_activities,
-            'generated_at': datetime.now(timezone.utc).isoformat()
-        }), 200
+        # Counters and recent activities come from the cached snapshot;
+        # generated_at is when the snapshot was computed
+        return jsonify(dashboard_snapshot.get()), 200
         
     except Exception as e:
         current_app.logger.error(f"Get dashboard data error: {str(e)}")
@@ -694,41 +646,83 @@ def _generate_animal_summary_report(parameters, filters):
     return {'data': data, 'summary': summary}
 
 def _generate_customer_analysis_report(parameters, filters):
-    """Generate customer analysis report with real data."""
-    query = Customer.query
+    """Generate customer analysis report with real data.
+    
+    Animal counts, primary contacts and the type breakdown are all computed
+    in SQL, so the number of queries stays constant regardless of how many
+    customers the report covers.
+    """
+    from src.models.animal import Animal
+    from src.models.customer import Customer, CustomerContact
+    
+    # Animals per customer, aggregated once and LEFT JOINed onto customers
+    animal_counts = db.session.query(
+        Animal.customer_id.label('customer_id'),
+        func.count(Animal.id).label('animal_count')
+    ).filter(
+        Animal.customer_id.isnot(None),
+        Animal.deleted_at.is_(None)
+    ).group_by(Animal.customer_id).subquery()
+    
+    # Primary contact name as a correlated scalar subquery (no per-row round trip)
+    contact_person = db.session.query(
+        (CustomerContact.first_name + ' ' + CustomerContact.last_name)
+    ).filter(
+        CustomerContact.customer_id == Customer.id,
+        CustomerContact.is_primary == True
+    ).order_by(CustomerContact.created_at).limit(1).correlate(Customer).scalar_subquery()
+    
+    animal_count = func.coalesce(animal_counts.c.animal_count, 0)
+    
+    query = db.session.query(
+        Customer.id,
+        Customer.name,
+        Customer.type,
+        Customer.status,
+        Customer.created_at,
+        animal_count.label('animal_count'),
+        contact_person.label('contact_person')
+    ).outerjoin(animal_counts, animal_counts.c.customer_id == Customer.id)
     
     # Apply filters
+    customer_filters = []
     if filters.get('customer_type'):
-        query = query.filter(Customer.customer_type == filters['customer_type'])
+        customer_filters.append(Customer.type == filters['customer_type'])
     if filters.get('status'):
-        query = query.filter(Customer.status == filters['status'])
+        customer_filters.append(Customer.status == filters['status'])
+    
+    if customer_filters:
+        query = query.filter(*customer_filters)
     
-    customers = query.all()
+    rows = query.order_by(Customer.name).all()
     
     data = []
     total_animals = 0
-    customer_types = {}
     
-    for customer in customers:
-        animal_count = Animal.query.filter_by(customer_id=customer.id).count()
-        total_animals += animal_count
+    for row in rows:
+        total_animals += row.animal_count
         
         data.append({
-            'customer_id': customer.id,
-            'name': customer.name,
-            'customer_type': customer.customer_type,
-            'status': customer.status,
-            'animal_count': animal_count,
-            'contact_person': customer.contact_person,
-            'created_at': customer.created_at.isoformat() if customer.created_at else None
+            'customer_id': str(row.id),
+            'name': row.name,
+            'customer_type': row.type,
+            'status': row.status,
+            'animal_count': row.animal_count,
+            'contact_person': row.contact_person,
+            'created_at': row.created_at.isoformat() if row.created_at else None
         })
-        
-        customer_types[customer.customer_type] = customer_types.get(customer.customer_type, 0) + 1
+    
+    # Type breakdown as a GROUP BY over the same filtered customer set
+    type_rows = db.session.query(
+        Customer.type, func.count(Customer.id)
+    ).filter(*customer_filters).group_by(Customer.type).all()
+    
+    customer_types = {customer_type: count for customer_type, count in type_rows}
     
     summary = {
-        'total_customers': len(customers),
+        'total_customers': len(rows),
         'total_animals': total_animals,
-        'average_animals_per_customer': round(total_animals / len(customers), 2) if customers else 0,
+        'average_animals_per_customer': round(total_animals / len(rows), 2) if rows else 0,
         'customer_type_breakdown': customer_types
     }
     
@@ -1090,123 +1084,3 @@ def _calculate_metric_value(metric):
     except Exception as e:
         current_app.logger.error(f"Metric calculation error: {str(e)}")
         return None
-
-
-def _get_recent_activities(limit=10):
-    """Get recent activities from various database tables."""
-    from src.models.animal import Animal
-    from src.models.customer import Customer
-    from src.models.laboratory import LabSample, LabTest
-    from src.models.biobank import BiobankSample
-    from src.models.genomics import GenomicAnalysis
-    from src.models.user import User
-    from sqlalchemy import desc
-    
-    activities = []
-    
-    try:
-        # Recent animals (last 5)
-        recent_animals = Animal.query.filter(
-            Animal.deleted_at.is_(None)
-        ).order_by(desc(Animal.created_at)).limit(5).all()
-        
-        for animal in recent_animals:
-            activities.append({
-                'id': f"animal_{animal.id}",
-                'type': 'animal_created',
-                'description': f'New animal registered: {animal.name} ({animal.animal_id})',
-                'timestamp': animal.created_at.isoformat() if animal.created_at else datetime.now(timezone.utc).isoformat(),
-                'user': 'System',
-                'entity_id': animal.id,
-                'entity_type': 'animal'
-            })
-        
-        # Recent customers (last 3)
-        recent_customers = Customer.query.order_by(desc(Customer.created_at)).limit(3).all()
-        
-        for customer in recent_customers:
-            activities.append({
-                'id': f"customer_{customer.id}",
-                'type': 'customer_created',
-                'description': f'New customer registered: {customer.name}',
-                'timestamp': customer.created_at.isoformat() if customer.created_at else datetime.now(timezone.utc).isoformat(),
-                'user': 'System',
-                'entity_id': customer.id,
-                'entity_type': 'customer'
-            })
-        
-        # Recent lab samples (last 5)
-        recent_samples = LabSample.query.order_by(desc(LabSample.created_at)).limit(5).all()
-        
-        for sample in recent_samples:
-            activities.append({
-                'id': f"sample_{sample.id}",
-                'type': 'sample_created',
-                'description': f'New sample collected: {sample.sample_id} ({sample.sample_type})',
-                'timestamp': sample.created_at.isoformat() if sample.created_at else datetime.now(timezone.utc).isoformat(),
-                'user': 'Lab Technician',
-                'entity_id': sample.id,
-                'entity_type': 'sample'
-            })
-        
-        # Recent completed tests (last 5)
-        completed_tests = LabTest.query.filter_by(status='COMPLETED').order_by(desc(LabTest.completed_at)).limit(5).all()
-        
-        for test in completed_tests:
-            activities.append({
-                'id': f"test_{test.id}",
-                'type': 'test_completed',
-                'description': f'Test completed: {test.test_id}',
-                'timestamp': test.completed_at.isoformat() if test.completed_at else datetime.now(timezone.utc).isoformat(),
-                'user': 'Lab Technician',
-                'entity_id': test.id,
-                'entity_type': 'test'
-            })
-        
-        # Recent genomic analyses (last 3)
-        recent_analyses = GenomicAnalysis.query.filter_by(status='COMPLETED').order_by(desc(GenomicAnalysis.completed_at)).limit(3).all()
-        
-        for analysis in recent_analyses:
-            activities.append({
-                'id': f"analysis_{analysis.id}",
-                'type': 'analysis_completed',
-                'description': f'Genomic analysis completed: {analysis.analysis_id} ({analysis.analysis_type})',
-                'timestamp': analysis.completed_at.isoformat() if analysis.completed_at else datetime.now(timezone.utc).isoformat(),
-                'user': 'Genomics Team',
-                'entity_id': analysis.id,
-                'entity_type': 'analysis'
-            })
-        
-        # Recent biobank samples (last 3)
-        recent_biobank = BiobankSample.query.order_by(desc(BiobankSample.created_at)).limit(3).all()
-        
-        for sample in recent_biobank:
-            activities.append({
-                'id': f"biobank_{sample.id}",
-                'type': 'biobank_sample_stored',
-                'description': f'Sample stored in biobank: {sample.sample_id} ({sample.sample_type})',
-                'timestamp': sample.created_at.isoformat() if sample.created_at else datetime.now(timezone.utc).isoformat(),
-                'user': 'Biobank Staff',
-                'entity_id': sample.id,
-                'entity_type': 'biobank_sample'
-            })
-        
-        # Sort all activities by timestamp (most recent first)
-        activities.sort(key=lambda x: x['timestamp'], reverse=True)
-        
-        # Return only the requested number of activities
-        return activities[:limit]
-    
-    except Exception as e:
-        current_app.logger.error(f"Get recent activities error: {str(e)}")
-        # Return a default activity if there's an error
-        return [{
-            'id': 'system_1',
-            'type': 'system_status',
-            'description': 'System operational',
-            'timestamp': datetime.now(timezone.utc).isoformat(),
-            'user': 'System',
-            'entity_id': None,
-            'entity_type': 'system'
-        }]
-
@@ -1,18 +1,21 @@
+import uuid
 from datetime import datetime, timezone, date
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from sqlalchemy import or_, and_
 from src.database import db
-from src.models.user import User
+from src.utils.principal import current_user as load_current_user
 from src.models.animal import Animal, AnimalRole, AnimalInternalNumber, AnimalGenomicData, AnimalActivity
 from src.models.customer import Customer
+from src.utils.pedigree import pedigree_index
+from src.utils.pagination import paginate_query, InvalidCursor
+from src.utils.search import search_index
 
 animals_bp = Blueprint('animals', __name__)
 
 def get_current_user():
-    """Get current authenticated user."""
-    current_user_id = get_jwt_identity()
-    return User.query.get(current_user_id)
+    """Get current authenticated user (loaded at most once per request)."""
+    return load_current_user()
 
 def generate_animal_id(species):
     """Generate unique animal ID in SPP-YYYY-XXXX format."""
@@ -65,14 +68,7 @@ def list_animals():
         
         # Apply search filter
         if search:
-            query = query.filter(
-                or_(
-                    Animal.name.ilike(f'%{search}%'),
-                    Animal.animal_id.ilike(f'%{search}%'),
-                    Animal.microchip.ilike(f'%{search}%'),
-                    Animal.owner.ilike(f'%{search}%')
-                )
-            )
+            query = query.filter(search_index.matches('animal', search))
         
         # Apply species filter
         if species_filter:
@@ -97,27 +93,18 @@ def list_animals():
             query = query.outerjoin(AnimalGenomicData).filter(AnimalGenomicData.id.is_(None))
         
         # Order by creation date
-        query = query.order_by(Animal.created_at.desc())
-        
-        # Paginate
-        pagination = query.paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        items, pagination = paginate_query(query, [Animal.created_at.desc()], page, per_page, counter_entity='animals')
         
-        animals = [animal.to_dict() for animal in pagination.items]
+        animals = [animal.to_dict() for animal in items]
         
         return jsonify({
             'animals': animals,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
-            }
+            'pagination': pagination
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    
     except Exception as e:
         current_app.logger.error(f"List animals error: {str(e)}")
         return jsonify({'error': 'Failed to list animals'}), 500
@@ -205,6 +192,7 @@ def create_animal():
             )
         
         db.session.commit()
+        pedigree_index.update_parents(animal.id, animal.father_id, animal.mother_id)
         
         return jsonify({
             'message': 'Animal created successfully',
@@ -216,6 +204,28 @@ def create_animal():
         current_app.logger.error(f"Create animal error: {str(e)}")
         return jsonify({'error': 'Failed to create animal'}), 500
 
+@animals_bp.route('/autocomplete', methods=['GET'])
+@jwt_required()
+def autocomplete_animals():
+    """Type-ahead suggestions by animal ID, microchip, name or internal number prefix."""
+    try:
+        from src.utils.autocomplete import animal_autocomplete
+        
+        prefix = request.args.get('q', '').strip()
+        limit = min(int(request.args.get('limit', 10)), 50)
+        
+        return jsonify({
+            'query': prefix,
+            'suggestions': animal_autocomplete.suggest(prefix, limit)
+        }), 200
+        
+    except ValueError:
+        return jsonify({'error': 'Invalid limit'}), 400
+    
+    except Exception as e:
+        current_app.logger.error(f"Animal autocomplete error: {str(e)}")
+        return jsonify({'error': 'Failed to get suggestions'}), 500
+
 @animals_bp.route('/<animal_id>', methods=['GET'])
 @jwt_required()
 def get_animal(animal_id):
@@ -278,6 +288,9 @@ def update_animal(animal_id):
         
         db.session.commit()
         
+        if 'father_id' in data or 'mother_id' in data:
+            pedigree_index.update_parents(animal.id, animal.father_id, animal.mother_id)
+        
         return jsonify({
             'message': 'Animal updated successfully',
             'animal': animal.to_dict()
@@ -452,24 +465,23 @@ def get_animal_activities(animal_id):
         page = int(request.args.get('page', 1))
         per_page = min(int(request.args.get('per_page', 20)), 100)
         
-        pagination = AnimalActivity.query.filter_by(animal_id=animal_id)\
-            .order_by(AnimalActivity.activity_date.desc())\
-            .paginate(page=page, per_page=per_page, error_out=False)
+        items, pagination = paginate_query(
+            AnimalActivity.query.filter_by(animal_id=animal_id),
+            [AnimalActivity.activity_date.desc()],
+            page,
+            per_page
+        )
         
-        activities = [activity.to_dict() for activity in pagination.items]
+        activities = [activity.to_dict() for activity in items]
         
         return jsonify({
             'activities': activities,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
-            }
+            'pagination': pagination
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    
     except Exception as e:
         current_app.logger.error(f"Get animal activities error: {str(e)}")
         return jsonify({'error': 'Failed to get animal activities'}), 500
@@ -516,35 +528,190 @@ def add_animal_activity(animal_id):
         current_app.logger.error(f"Add animal activity error: {str(e)}")
         return jsonify({'error': 'Failed to add activity'}), 500
 
+# Pedigree routes
+MAX_PEDIGREE_DEPTH = 30
+
+def _pedigree_animal(animal_id):
+    """Look up an animal and make sure the pedigree index knows about it."""
+    try:
+        animal = Animal.query.filter_by(id=uuid.UUID(str(animal_id)), deleted_at=None).first()
+    except ValueError:
+        return None
+    if animal and not pedigree_index.contains(animal.id):
+        # Created by another process since the index was built
+        pedigree_index.invalidate()
+    return animal
+
+def _pedigree_summaries(generations):
+    """Summaries for {animal id: generation} ordered by generation, in one query."""
+    if not generations:
+        return []
+    
+    animals = db.session.query(Animal.id, Animal.animal_id, Animal.name, Animal.sex)\
+        .filter(Animal.id.in_([uuid.UUID(animal_id) for animal_id in generations])).all()
+    
+    summaries = [{
+        'id': str(animal.id),
+        'animal_id': animal.animal_id,
+        'name': animal.name,
+        'sex': animal.sex,
+        'generation': generations[str(animal.id)]
+    } for animal in animals]
+    return sorted(summaries, key=lambda summary: (summary['generation'], summary['animal_id']))
+
+@animals_bp.route('/<animal_id>/ancestors', methods=['GET'])
+@jwt_required()
+def get_animal_ancestors(animal_id):
+    """Get ancestors up to `depth` generations back (default 10)."""
+    try:
+        animal = _pedigree_animal(animal_id)
+        if not animal:
+            return jsonify({'error': 'Animal not found'}), 404
+        
+        depth = min(request.args.get('depth', 10, type=int), MAX_PEDIGREE_DEPTH)
+        ancestors = pedigree_index.ancestors(animal.id, max_depth=depth)
+        
+        return jsonify({
+            'animal_id': str(animal.id),
+            'depth': depth,
+            'ancestors': _pedigree_summaries(ancestors)
+        }), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Get animal ancestors error: {str(e)}")
+        return jsonify({'error': 'Failed to get ancestors'}), 500
+
+@animals_bp.route('/<animal_id>/descendants', methods=['GET'])
+@jwt_required()
+def get_animal_descendants(animal_id):
+    """Get descendants, optionally limited to `depth` generations."""
+    try:
+        animal = _pedigree_animal(animal_id)
+        if not animal:
+            return jsonify({'error': 'Animal not found'}), 404
+        
+        depth = request.args.get('depth', type=int)
+        descendants = pedigree_index.descendants(animal.id, max_depth=depth)
+        
+        return jsonify({
+            'animal_id': str(animal.id),
+            'depth': depth,
+            'descendants': _pedigree_summaries(descendants)
+        }), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Get animal descendants error: {str(e)}")
+        return jsonify({'error': 'Failed to get descendants'}), 500
+
+@animals_bp.route('/<animal_id>/common-ancestors/<other_id>', methods=['GET'])
+@jwt_required()
+def get_common_ancestors(animal_id, other_id):
+    """Get ancestors shared by two animals with their generation on each side."""
+    try:
+        animal = _pedigree_animal(animal_id)
+        other = _pedigree_animal(other_id)
+        if not animal or not other:
+            return jsonify({'error': 'Animal not found'}), 404
+        
+        depth = request.args.get('depth', type=int)
+        common = pedigree_index.common_ancestors(animal.id, other.id, max_depth=depth)
+        
+        summaries = _pedigree_summaries({
+            ancestor_id: min(generations) for ancestor_id, generations in common.items()
+        })
+        for summary in summaries:
+            summary['generation_from_animal'], summary['generation_from_other'] = common[summary['id']]
+        
+        return jsonify({
+            'animal_id': str(animal.id),
+            'other_id': str(other.id),
+            'common_ancestors': summaries
+        }), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Get common ancestors error: {str(e)}")
+        return jsonify({'error': 'Failed to get common ancestors'}), 500
+
+@animals_bp.route('/<animal_id>/inbreeding', methods=['GET'])
+@jwt_required()
+def get_inbreeding_coefficient(animal_id):
+    """Get Wright's inbreeding coefficient computed from the pedigree."""
+    try:
+        animal = _pedigree_animal(animal_id)
+        if not animal:
+            return jsonify({'error': 'Animal not found'}), 404
+        
+        return jsonify({
+            'animal_id': str(animal.id),
+            'inbreeding_coefficient': round(pedigree_index.inbreeding_coefficient(animal.id), 6)
+        }), 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 422
+    except Exception as e:
+        current_app.logger.error(f"Get inbreeding coefficient error: {str(e)}")
+        return jsonify({'error': 'Failed to compute inbreeding coefficient'}), 500
+
+@animals_bp.route('/<animal_id>/relationship/<other_id>', methods=['GET'])
+@jwt_required()
+def get_additive_relationship(animal_id, other_id):
+    """Get the additive genetic relationship and coancestry between two animals."""
+    try:
+        animal = _pedigree_animal(animal_id)
+        other = _pedigree_animal(other_id)
+        if not animal or not other:
+            return jsonify({'error': 'Animal not found'}), 404
+        
+        relationship = pedigree_index.additive_relationship(animal.id, other.id)
+        
+        return jsonify({
+            'animal_id': str(animal.id),
+            'other_id': str(other.id),
+            'additive_relationship': round(relationship, 6),
+            'coancestry': round(relationship / 2, 6)
+        }), 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 422
+    except Exception as e:
+        current_app.logger.error(f"Get additive relationship error: {str(e)}")
+        return jsonify({'error': 'Failed to compute relationship'}), 500
+
+@animals_bp.route('/pedigree/rebuild', methods=['POST'])
+@jwt_required()
+def rebuild_pedigree_index():
+    """Rebuild the in-memory pedigree index from the animals table."""
+    try:
+        pedigree_index.build()
+        
+        return jsonify({
+            'message': 'Pedigree index rebuilt',
+            'index': pedigree_index.stats()
+        }), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Rebuild pedigree index error: {str(e)}")
+        return jsonify({'error': 'Failed to rebuild pedigree index'}), 500
+
 @animals_bp.route('/stats', methods=['GET'])
 @jwt_required()
 def get_animal_stats():
     """Get animal statistics."""
     try:
-        total_animals = Animal.query.filter(Animal.deleted_at.is_(None)).count()
-        active_animals = Animal.query.filter_by(status='ACTIVE', deleted_at=None).count()
-        
-        # Animals by species
-        species_stats = {}
-        species_list = ['BOVINE', 'EQUINE', 'CAMEL', 'OVINE', 'CAPRINE', 'SWINE']
-        for species in species_list:
-            species_stats[species] = Animal.query.filter_by(species=species, deleted_at=None).count()
+        from src.utils.counters import entity_counters
         
-        # Animals by purpose
-        purpose_stats = {}
-        purposes = ['Breeding', 'Racing', 'Dairy', 'Meat', 'Show', 'Research']
-        for purpose in purposes:
-            purpose_stats[purpose] = Animal.query.filter_by(purpose=purpose, deleted_at=None).count()
+        # Materialised counters (non-deleted animals)
+        animals = entity_counters.read('animals')['animals']
         
         # Animals with genomic data
         with_genomic_data = Animal.query.join(AnimalGenomicData)\
             .filter(Animal.deleted_at.is_(None), AnimalGenomicData.has_snp_data == True).count()
         
         return jsonify({
-            'total_animals': total_animals,
-            'active_animals': active_animals,
-            'species_distribution': species_stats,
-            'purpose_distribution': purpose_stats,
+            'total_animals': animals.total,
+            'active_animals': animals.get('status', 'ACTIVE'),
+            'species_distribution': animals.distribution('species', ['BOVINE', 'EQUINE', 'CAMEL', 'OVINE', 'CAPRINE', 'SWINE']),
+            'purpose_distribution': animals.distribution('purpose', ['Breeding', 'Racing', 'Dairy', 'Meat', 'Show', 'Research']),
             'with_genomic_data': with_genomic_data
         }), 200
         
@@ -554,19 +721,109 @@ def get_animal_stats():
 
 
 # Export/Import functionality
+EXPORT_COLUMNS = [
+    'Animal ID', 'Name', 'Species', 'Breed', 'Sex', 'Date of Birth',
+    'Weight', 'Height', 'Status', 'Purpose', 'Customer Name',
+    'Registration Number', 'Microchip ID', 'Created At'
+]
+
+def _animal_export_row(animal):
+    """Build a CSV row for an animal (customer must already be loaded)."""
+    return [
+        animal.animal_id,
+        animal.name,
+        animal.species,
+        animal.breed,
+        animal.sex,
+        animal.date_of_birth.isoformat() if animal.date_of_birth else '',
+        animal.weight,
+        animal.height,
+        animal.status,
+        animal.purpose,
+        animal.customer.name if animal.customer else '',
+        '',  # Animals have no registration number column; kept for import compatibility
+        animal.microchip,
+        animal.created_at.isoformat() if animal.created_at else ''
+    ]
+
+def _iter_animals_keyset(query, batch_size):
+    """
+    Iterate over a query in primary key order using keyset pagination.
+    
+    Each batch is a short, independent query (WHERE id > last_id LIMIT n) with
+    customers eager-loaded, so memory stays bounded by the batch size and no
+    server-side cursor is held open for the duration of the export.
+    """
+    from sqlalchemy.orm import joinedload
+    
+    query = query.options(joinedload(Animal.customer)).order_by(Animal.id)
+    last_id = None
+    
+    while True:
+        batch_query = query if last_id is None else query.filter(Animal.id > last_id)
+        batch = batch_query.limit(batch_size).all()
+        if not batch:
+            break
+        
+        for animal in batch:
+            yield animal
+        
+        last_id = batch[-1].id
+        if len(batch) < batch_size:
+            break
+
+def _iter_export_csv(query, batch_size):
+    """Yield CSV text chunks, one per keyset batch."""
+    import csv
+    import io
+    
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    
+    for row_num, animal in enumerate(_iter_animals_keyset(query, batch_size), start=1):
+        writer.writerow(_animal_export_row(animal))
+        
+        if row_num % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def _iter_gzip(chunks):
+    """Gzip-compress an iterator of text chunks on the fly."""
+    import zlib
+    
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
 @animals_bp.route('/export', methods=['GET'])
 @jwt_required()
 def export_animals():
-    """Export animals data to CSV."""
+    """
+    Export animals data to CSV.
+    
+    Query parameters:
+        customer_id, species, status: Optional filters
+        stream: 'true' to stream rows in constant memory instead of buffering the file
+        compress: 'gzip' to return a gzip-compressed .csv.gz file
+    """
     try:
-        import csv
-        import io
-        from flask import make_response
+        from flask import Response, make_response, stream_with_context
         
         # Get query parameters for filtering
         customer_id = request.args.get('customer_id')
         species = request.args.get('species')
         status = request.args.get('status')
+        stream = request.args.get('stream', 'false').lower() == 'true'
+        compress = request.args.get('compress', '').lower() == 'gzip'
+        batch_size = current_app.config.get('EXPORT_BATCH_SIZE', 1000)
         
         # Build query
         query = Animal.query.filter(Animal.deleted_at.is_(None))
@@ -578,42 +835,24 @@ def export_animals():
         if status:
             query = query.filter(Animal.status == status)
         
-        animals = query.all()
+        chunks = _iter_export_csv(query, batch_size)
+        if compress:
+            chunks = _iter_gzip(chunks)
         
-        # Create CSV content
-        output = io.StringIO()
-        writer = csv.writer(output)
+        filename = f'animals_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+        mimetype = 'text/csv'
+        if compress:
+            filename += '.gz'
+            mimetype = 'application/gzip'
         
-        # Write header
-        writer.writerow([
-            'Animal ID', 'Name', 'Species', 'Breed', 'Sex', 'Date of Birth',
-            'Weight', 'Height', 'Status', 'Purpose', 'Customer Name',
-            'Registration Number', 'Microchip ID', 'Created At'
-        ])
+        if stream:
+            response = Response(stream_with_context(chunks), mimetype=mimetype)
+        else:
+            empty = b'' if compress else ''
+            response = make_response(empty.join(chunks))
+            response.headers['Content-Type'] = mimetype
         
-        # Write data
-        for animal in animals:
-            writer.writerow([
-                animal.animal_id,
-                animal.name,
-                animal.species,
-                animal.breed,
-                animal.sex,
-                animal.date_of_birth.isoformat() if animal.date_of_birth else '',
-                animal.weight,
-                animal.height,
-                animal.status,
-                animal.purpose,
-                animal.customer.name if animal.customer else '',
-                animal.registration_number,
-                animal.microchip_id,
-                animal.created_at.isoformat() if animal.created_at else ''
-            ])
-        
-        # Create response
-        response = make_response(output.getvalue())
-        response.headers['Content-Type'] = 'text/csv'
-        response.headers['Content-Disposition'] = f'attachment; filename=animals_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+        response.headers['Content-Disposition'] = f'attachment; filename={filename}'
         
         return response
         
@@ -752,6 +991,10 @@ def bulk_update_animals():
         
         db.session.commit()
         
+        if 'father_id' in updates or 'mother_id' in updates:
+            for animal in animals:
+                pedigree_index.update_parents(animal.id, animal.father_id, animal.mother_id)
+        
         return jsonify({
             'message': f'{updated_count} animals updated successfully',
             'updated_count': updated_count
@@ -818,6 +1061,9 @@ def advanced_search_animals():
         query = Animal.query.filter(Animal.deleted_at.is_(None))
         
         # Apply filters
+        if data.get('search'):
+            query = query.filter(search_index.matches('animal', data['search']))
+        
         if data.get('animal_id'):
             query = query.filter(Animal.animal_id.ilike(f"%{data['animal_id']}%"))
         
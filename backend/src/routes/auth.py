@@ -6,6 +6,7 @@ from flask_jwt_extended import (
 )
 from src.database import db
 from src.models.user import User, UserProfile, Role, Permission, TokenBlacklist
+from src.utils.principal import principal_claims
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -63,7 +64,7 @@ def login():
         db.session.commit()
         
         # Create tokens
-        access_token = create_access_token(identity=str(user.id))
+        access_token = create_access_token(identity=str(user.id), additional_claims=principal_claims(user.id))
         refresh_token = create_refresh_token(identity=str(user.id))
         
         return jsonify({
@@ -96,6 +97,9 @@ def logout():
         db.session.add(blacklisted_token)
         db.session.commit()
         
+        from src.utils.token_blocklist import token_blocklist
+        token_blocklist.revoke(jti)
+        
         return jsonify({'message': 'Successfully logged out'}), 200
         
     except Exception as e:
@@ -113,7 +117,7 @@ def refresh():
         if not user or not user.is_active:
             return jsonify({'error': 'User not found or inactive'}), 401
         
-        new_access_token = create_access_token(identity=current_user_id)
+        new_access_token = create_access_token(identity=current_user_id, additional_claims=principal_claims(current_user_id))
         
         return jsonify({
             'access_token': new_access_token
@@ -234,10 +238,10 @@ def change_password():
 def register():
     """Register new user (admin only)."""
     try:
-        current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
+        from src.utils.principal import current_principal
+        principal = current_principal()
         
-        if not current_user or not current_user.has_role('admin'):
+        if not principal or not principal.has_role('admin'):
             return jsonify({'error': 'Admin access required'}), 403
         
         data = request.get_json()
@@ -1,17 +1,18 @@
 from datetime import datetime, timezone, timedelta
 from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 from sqlalchemy import or_, and_
 from src.database import db
-from src.models.user import User
+from src.utils.principal import current_user as load_current_user
 from src.models.biobank import BiobankStorageUnit, BiobankSample, TemperatureLog
+from src.utils.pagination import paginate_query, InvalidCursor
+from src.utils.search import search_index
 
 biobank_bp = Blueprint('biobank', __name__)
 
 def get_current_user():
-    """Get current authenticated user."""
-    current_user_id = get_jwt_identity()
-    return User.query.get(current_user_id)
+    """Get current authenticated user (loaded at most once per request)."""
+    return load_current_user()
 
 def generate_unit_id():
     """Generate unique storage unit ID."""
@@ -76,23 +77,17 @@ def list_storage_units():
         if location_filter:
             query = query.filter(BiobankStorageUnit.location.ilike(f'%{location_filter}%'))
         
-        query = query.order_by(BiobankStorageUnit.name)
-        
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-        units = [unit.to_dict() for unit in pagination.items]
+        items, pagination = paginate_query(query, [BiobankStorageUnit.name], page, per_page, counter_entity='biobank_storage_units')
+        units = [unit.to_dict() for unit in items]
         
         return jsonify({
             'storage_units': units,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
-            }
+            'pagination': pagination
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    
     except Exception as e:
         current_app.logger.error(f"List storage units error: {str(e)}")
         return jsonify({'error': 'Failed to list storage units'}), 500
@@ -305,13 +300,7 @@ def list_samples():
         query = BiobankSample.query
         
         if search:
-            query = query.filter(
-                or_(
-                    BiobankSample.sample_id.ilike(f'%{search}%'),
-                    BiobankSample.sample_name.ilike(f'%{search}%'),
-                    BiobankSample.container_id.ilike(f'%{search}%')
-                )
-            )
+            query = query.filter(search_index.matches('biobank_sample', search))
         
         if sample_type_filter:
             query = query.filter(BiobankSample.sample_type == sample_type_filter)
@@ -338,23 +327,17 @@ def list_samples():
                 )
             )
         
-        query = query.order_by(BiobankSample.storage_date.desc())
-        
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-        samples = [sample.to_dict() for sample in pagination.items]
+        items, pagination = paginate_query(query, [BiobankSample.storage_date.desc()], page, per_page, counter_entity='biobank_samples')
+        samples = [sample.to_dict() for sample in items]
         
         return jsonify({
             'samples': samples,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
-            }
+            'pagination': pagination
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    
     except Exception as e:
         current_app.logger.error(f"List biobank samples error: {str(e)}")
         return jsonify({'error': 'Failed to list samples'}), 500
@@ -490,29 +473,17 @@ def access_sample(sample_id):
 def get_biobank_stats():
     """Get biobank statistics."""
     try:
-        # Storage unit statistics
-        total_units = BiobankStorageUnit.query.count()
-        operational_units = BiobankStorageUnit.query.filter_by(status='OPERATIONAL').count()
+        from src.utils.counters import entity_counters
+        
+        counters = entity_counters.read('biobank_storage_units', 'biobank_samples')
+        units = counters['biobank_storage_units']
+        samples = counters['biobank_samples']
         
         # Capacity statistics
         total_capacity = db.session.query(db.func.sum(BiobankStorageUnit.total_capacity)).scalar() or 0
         total_occupancy = db.session.query(db.func.sum(BiobankStorageUnit.current_occupancy)).scalar() or 0
         capacity_utilization = (total_occupancy / total_capacity * 100) if total_capacity > 0 else 0
         
-        # Sample statistics
-        total_samples = BiobankSample.query.count()
-        samples_by_status = {}
-        statuses = ['STORED', 'IN_USE', 'DEPLETED', 'DISCARDED', 'TRANSFERRED']
-        for status in statuses:
-            samples_by_status[status] = BiobankSample.query.filter_by(status=status).count()
-        
-        # Samples by type
-        samples_by_type = {}
-        sample_types = BiobankSample.query.with_entities(BiobankSample.sample_type).distinct().all()
-        for sample_type in sample_types:
-            if sample_type[0]:
-                samples_by_type[sample_type[0]] = BiobankSample.query.filter_by(sample_type=sample_type[0]).count()
-        
         # Expiring samples (within 30 days)
         thirty_days_from_now = datetime.now(timezone.utc) + timedelta(days=30)
         expiring_samples = BiobankSample.query.filter(
@@ -525,8 +496,8 @@ def get_biobank_stats():
         
         return jsonify({
             'storage_units': {
-                'total': total_units,
-                'operational': operational_units
+                'total': units.total,
+                'operational': units.get('status', 'OPERATIONAL')
             },
             'capacity': {
                 'total_capacity': total_capacity,
@@ -534,9 +505,9 @@ def get_biobank_stats():
                 'utilization_percentage': round(capacity_utilization, 2)
             },
             'samples': {
-                'total': total_samples,
-                'by_status': samples_by_status,
-                'by_type': samples_by_type,
+                'total': samples.total,
+                'by_status': samples.distribution('status', ['STORED', 'IN_USE', 'DEPLETED', 'DISCARDED', 'TRANSFERRED']),
+                'by_type': samples.distribution('sample_type'),
                 'expiring_soon': expiring_samples
             }
         }), 200
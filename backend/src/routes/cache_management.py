@@ -3,9 +3,10 @@ Cache Management API Routes
 Provides endpoints for cache monitoring, statistics, and management
 """
 
+from datetime import datetime, timezone
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from src.cache import reprotech_cache
+from src.utils.cache import cache
 from src.utils.audit import AuditLogger
 import logging
 
@@ -23,7 +24,8 @@ def get_cache_stats():
     
     Returns:
         JSON response with cache statistics including:
-        - Hit/miss rates
+        - Hit/miss rates, split by tier (in-process L1, Redis L2)
+        - Per key prefix counters
         - Response times
         - Redis server info
         - Performance metrics
@@ -32,7 +34,7 @@ def get_cache_stats():
         user_id = get_jwt_identity()
         
         # Get cache statistics
-        stats = reprotech_cache.get_stats()
+        stats = cache.get_stats()
         
         # Add additional performance metrics
         performance_data = {
@@ -49,7 +51,7 @@ def get_cache_stats():
         AuditLogger.log_system_event(
             'CACHE_STATS_ACCESS',
             f'Cache statistics accessed by user {user_id}',
-            user_id=user_id
+            {'user_id': user_id}
         )
         
         return jsonify({
@@ -57,7 +59,7 @@ def get_cache_stats():
             'data': {
                 'statistics': stats,
                 'performance': performance_data,
-                'timestamp': AuditLogger._get_timestamp()
+                'timestamp': datetime.now(timezone.utc).isoformat()
             }
         }), 200
         
@@ -69,6 +71,71 @@ def get_cache_stats():
             'error': str(e)
         }), 500
 
+@cache_bp.route('/stats/prefixes', methods=['GET'])
+@jwt_required()
+def get_cache_prefix_stats():
+    """
+    Get cache statistics per key prefix
+    
+    Returns prefixes ordered by total lookups, busiest first, with L1/L2
+    hits, misses, sets, deletes and hit rate for each.
+    """
+    try:
+        prefixes = cache.get_stats()['prefixes']
+        
+        ordered = sorted(
+            ({'prefix': prefix, **counters} for prefix, counters in prefixes.items()),
+            key=lambda item: item['l1_hits'] + item['l2_hits'] + item['misses'],
+            reverse=True
+        )
+        
+        return jsonify({
+            'status': 'success',
+            'data': {
+                'prefixes': ordered,
+                'timestamp': datetime.now(timezone.utc).isoformat()
+            }
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Error getting cache prefix stats: {e}")
+        return jsonify({
+            'status': 'error',
+            'message': 'Failed to retrieve cache prefix statistics',
+            'error': str(e)
+        }), 500
+
+@cache_bp.route('/stats/reset', methods=['POST'])
+@jwt_required()
+def reset_cache_stats():
+    """
+    Reset cache hit/miss counters
+    """
+    try:
+        user_id = get_jwt_identity()
+        
+        cache.reset_stats()
+        
+        AuditLogger.log_system_event(
+            'CACHE_STATS_RESET',
+            f'Cache statistics reset by user {user_id}',
+            {'user_id': user_id}
+        )
+        
+        return jsonify({
+            'status': 'success',
+            'message': 'Cache statistics reset',
+            'timestamp': datetime.now(timezone.utc).isoformat()
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Error resetting cache stats: {e}")
+        return jsonify({
+            'status': 'error',
+            'message': 'Failed to reset cache statistics',
+            'error': str(e)
+        }), 500
+
 @cache_bp.route('/clear', methods=['POST'])
 @jwt_required()
 def clear_cache():
@@ -81,20 +148,20 @@ def clear_cache():
         user_id = get_jwt_identity()
         
         # Clear all cache entries
-        success = reprotech_cache.clear_all()
+        success = cache.clear_all()
         
         if success:
             # Log cache clear action
             AuditLogger.log_system_event(
                 'CACHE_CLEARED',
                 f'All cache entries cleared by user {user_id}',
-                user_id=user_id
+                {'user_id': user_id}
             )
             
             return jsonify({
                 'status': 'success',
                 'message': 'Cache cleared successfully',
-                'timestamp': AuditLogger._get_timestamp()
+                'timestamp': datetime.now(timezone.utc).isoformat()
             }), 200
         else:
             return jsonify({
@@ -134,20 +201,20 @@ def invalidate_cache_key():
         cache_key = data['key']
         
         # Delete specific cache key
-        success = reprotech_cache.delete(cache_key)
+        success = cache.delete(cache_key)
         
         if success:
             # Log cache invalidation
             AuditLogger.log_system_event(
                 'CACHE_KEY_INVALIDATED',
                 f'Cache key "{cache_key}" invalidated by user {user_id}',
-                user_id=user_id
+                {'user_id': user_id}
             )
             
             return jsonify({
                 'status': 'success',
                 'message': f'Cache key "{cache_key}" invalidated successfully',
-                'timestamp': AuditLogger._get_timestamp()
+                'timestamp': datetime.now(timezone.utc).isoformat()
             }), 200
         else:
             return jsonify({
@@ -176,13 +243,13 @@ def cache_health():
         test_value = 'cache_working'
         
         # Test set operation
-        set_success = reprotech_cache.set(test_key, test_value, timeout=10)
+        set_success = cache.set(test_key, test_value, timeout=10)
         
         # Test get operation
-        retrieved_value = reprotech_cache.get(test_key)
+        retrieved_value = cache.get(test_key)
         
         # Test delete operation
-        delete_success = reprotech_cache.delete(test_key)
+        delete_success = cache.delete(test_key)
         
         # Determine health status
         is_healthy = (set_success and 
@@ -194,8 +261,8 @@ def cache_health():
         return jsonify({
             'status': health_status,
             'cache_operational': is_healthy,
-            'redis_connected': reprotech_cache.redis_client is not None,
-            'timestamp': AuditLogger._get_timestamp(),
+            'redis_connected': cache.redis_client is not None,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
             'tests': {
                 'set_operation': set_success,
                 'get_operation': retrieved_value == test_value,
@@ -209,7 +276,7 @@ def cache_health():
             'status': 'unhealthy',
             'cache_operational': False,
             'error': str(e),
-            'timestamp': AuditLogger._get_timestamp()
+            'timestamp': datetime.now(timezone.utc).isoformat()
         }), 503
 
 def _get_performance_recommendations(stats):
@@ -1,17 +1,17 @@
 from datetime import datetime, timezone
 from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from sqlalchemy import or_, and_
+from flask_jwt_extended import jwt_required
 from src.database import db
-from src.models.user import User
+from src.utils.principal import current_user as load_current_user
 from src.models.customer import Customer, CustomerContact, CustomerAddress
+from src.utils.pagination import paginate_query, InvalidCursor
+from src.utils.search import search_index
 
 customers_bp = Blueprint('customers', __name__)
 
 def get_current_user():
-    """Get current authenticated user."""
-    current_user_id = get_jwt_identity()
-    return User.query.get(current_user_id)
+    """Get current authenticated user (loaded at most once per request)."""
+    return load_current_user()
 
 def generate_customer_id():
     """Generate unique customer ID."""
@@ -52,13 +52,7 @@ def list_customers():
         
         # Apply search filter
         if search:
-            query = query.filter(
-                or_(
-                    Customer.name.ilike(f'%{search}%'),
-                    Customer.customer_id.ilike(f'%{search}%'),
-                    Customer.tax_id.ilike(f'%{search}%')
-                )
-            )
+            query = query.filter(search_index.matches('customer', search))
         
         # Apply type filter
         if type_filter:
@@ -73,27 +67,18 @@ def list_customers():
             query = query.filter(Customer.category == category_filter)
         
         # Order by creation date
-        query = query.order_by(Customer.created_at.desc())
-        
-        # Paginate
-        pagination = query.paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        items, pagination = paginate_query(query, [Customer.created_at.desc()], page, per_page, counter_entity='customers')
         
-        customers = [customer.to_dict() for customer in pagination.items]
+        customers = [customer.to_dict() for customer in items]
         
         return jsonify({
             'customers': customers,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
-            }
+            'pagination': pagination
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    
     except Exception as e:
         current_app.logger.error(f"List customers error: {str(e)}")
         return jsonify({'error': 'Failed to list customers'}), 500
@@ -471,26 +456,15 @@ def add_customer_address(customer_id):
 def get_customer_stats():
     """Get customer statistics."""
     try:
-        total_customers = Customer.query.count()
-        active_customers = Customer.query.filter_by(status='Active').count()
-        
-        # Customers by type
-        type_stats = {}
-        types = ['Individual', 'Organization', 'Research', 'Government']
-        for customer_type in types:
-            type_stats[customer_type] = Customer.query.filter_by(type=customer_type).count()
+        from src.utils.counters import entity_counters
         
-        # Customers by category
-        category_stats = {}
-        categories = ['Standard', 'Premium', 'VIP', 'Research']
-        for category in categories:
-            category_stats[category] = Customer.query.filter_by(category=category).count()
+        customers = entity_counters.read('customers')['customers']
         
         return jsonify({
-            'total_customers': total_customers,
-            'active_customers': active_customers,
-            'type_distribution': type_stats,
-            'category_distribution': category_stats
+            'total_customers': customers.total,
+            'active_customers': customers.get('status', 'Active'),
+            'type_distribution': customers.distribution('type', ['Individual', 'Organization', 'Research', 'Government']),
+            'category_distribution': customers.distribution('category', ['Standard', 'Premium', 'VIP', 'Research'])
         }), 200
         
     except Exception as e:
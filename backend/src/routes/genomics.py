@@ -3,17 +3,18 @@ from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from sqlalchemy import or_, and_
 from src.database import db
-from src.models.user import User
+from src.utils.principal import current_user as load_current_user
 from src.models.genomics import GenomicAnalysis, SNPData, BeadChipMapping
 from src.models.animal import Animal
 from src.models.laboratory import LabSample
+from src.utils.pagination import paginate_query, InvalidCursor
+from src.utils.search import search_index
 
 genomics_bp = Blueprint('genomics', __name__)
 
 def get_current_user():
-    """Get current authenticated user."""
-    current_user_id = get_jwt_identity()
-    return User.query.get(current_user_id)
+    """Get current authenticated user (loaded at most once per request)."""
+    return load_current_user()
 
 def generate_analysis_id():
     """Generate unique analysis ID."""
@@ -61,12 +62,7 @@ def list_analyses():
         query = GenomicAnalysis.query
         
         if search:
-            query = query.filter(
-                or_(
-                    GenomicAnalysis.analysis_id.ilike(f'%{search}%'),
-                    GenomicAnalysis.analysis_name.ilike(f'%{search}%')
-                )
-            )
+            query = query.filter(search_index.matches('genomic_analysis', search))
         
         if analysis_type_filter:
             query = query.filter(GenomicAnalysis.analysis_type == analysis_type_filter)
@@ -77,23 +73,17 @@ def list_analyses():
         if animal_id:
             query = query.filter(GenomicAnalysis.animal_id == animal_id)
         
-        query = query.order_by(GenomicAnalysis.created_at.desc())
-        
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-        analyses = [analysis.to_dict() for analysis in pagination.items]
+        items, pagination = paginate_query(query, [GenomicAnalysis.created_at.desc()], page, per_page, counter_entity='genomic_analyses')
+        analyses = [analysis.to_dict() for analysis in items]
         
         return jsonify({
             'analyses': analyses,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
-            }
+            'pagination': pagination
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    
     except Exception as e:
         current_app.logger.error(f"List analyses error: {str(e)}")
         return jsonify({'error': 'Failed to list analyses'}), 500
@@ -254,23 +244,17 @@ def list_snp_data():
         if analysis_id:
             query = query.filter(SNPData.analysis_id == analysis_id)
         
-        query = query.order_by(SNPData.chromosome, SNPData.position)
-        
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-        snp_data = [snp.to_dict() for snp in pagination.items]
+        items, pagination = paginate_query(query, [SNPData.chromosome, SNPData.position], page, per_page, counter_entity='snp_data')
+        snp_data = [snp.to_dict() for snp in items]
         
         return jsonify({
             'snp_data': snp_data,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
-            }
+            'pagination': pagination
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    
     except Exception as e:
         current_app.logger.error(f"List SNP data error: {str(e)}")
         return jsonify({'error': 'Failed to list SNP data'}), 500
@@ -280,6 +264,8 @@ def list_snp_data():
 def bulk_create_snp_data():
     """Bulk create SNP data."""
     try:
+        from src.utils.snp_ingest import validate_records, write_snp_rows
+        
         data = request.get_json()
         
         if not data or 'snp_records' not in data:
@@ -289,30 +275,20 @@ def bulk_create_snp_data():
         if not isinstance(snp_records, list):
             return jsonify({'error': 'SNP records must be a list'}), 400
         
-        created_records = []
-        
-        for record in snp_records:
-            snp = SNPData(
-                animal_id=record.get('animal_id'),
-                chromosome=record.get('chromosome'),
-                position=record.get('position'),
-                snp_id=record.get('snp_id'),
-                reference_allele=record.get('reference_allele'),
-                alternate_allele=record.get('alternate_allele'),
-                genotype=record.get('genotype'),
-                quality_score=record.get('quality_score'),
-                read_depth=record.get('read_depth'),
-                allele_frequency=record.get('allele_frequency'),
-                analysis_id=record.get('analysis_id')
-            )
-            db.session.add(snp)
-            created_records.append(snp)
+        # Validate up front and write with a single executemany/COPY
+        rows, errors = validate_records(list(enumerate(snp_records, start=1)), label='Record')
+        if errors:
+            return jsonify({
+                'error': 'Invalid SNP records',
+                'errors': errors[:100]
+            }), 400
         
+        created_count = write_snp_rows(rows)
         db.session.commit()
         
         return jsonify({
-            'message': f'Successfully created {len(created_records)} SNP records',
-            'count': len(created_records)
+            'message': f'Successfully created {created_count} SNP records',
+            'count': created_count
         }), 201
         
     except Exception as e:
@@ -320,6 +296,292 @@ def bulk_create_snp_data():
         current_app.logger.error(f"Bulk create SNP data error: {str(e)}")
         return jsonify({'error': 'Failed to create SNP data'}), 500
 
+@genomics_bp.route('/snp-data/ingest', methods=['POST'])
+@jwt_required()
+def ingest_snp_data():
+    """
+    Upload a genotype file for background bulk ingestion.
+    
+    Form fields:
+        file: NDJSON (.ndjson/.jsonl) or TSV (.tsv/.txt, header row required)
+        format: Optional explicit format ('ndjson' or 'tsv')
+        animal_id, analysis_id: Optional defaults for records that omit them
+        batch_size: Optional records per batch (default 5000)
+    """
+    try:
+        import os
+        import uuid
+        from werkzeug.utils import secure_filename
+        from src.utils.snp_ingest import detect_format
+        from src.utils.tasks import submit_snp_ingest
+        
+        if 'file' not in request.files:
+            return jsonify({'error': 'No file provided'}), 400
+        
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({'error': 'No file selected'}), 400
+        
+        file_format = detect_format(file.filename, request.form.get('format'))
+        if not file_format:
+            return jsonify({'error': 'File must be NDJSON or TSV'}), 400
+        
+        try:
+            batch_size = min(max(int(request.form.get('batch_size', 5000)), 100), 50000)
+        except ValueError:
+            return jsonify({'error': 'batch_size must be an integer'}), 400
+        
+        defaults = {
+            key: request.form.get(key)
+            for key in ('animal_id', 'analysis_id')
+            if request.form.get(key)
+        }
+        
+        # Persist the upload so the worker can stream it from disk
+        upload_folder = current_app.config.get('UPLOAD_FOLDER', 'uploads')
+        os.makedirs(upload_folder, exist_ok=True)
+        file_path = os.path.join(
+            upload_folder,
+            f"snp_{uuid.uuid4().hex}_{secure_filename(file.filename)}"
+        )
+        file.save(file_path)
+        
+        task_id = submit_snp_ingest(
+            file_path,
+            file_format,
+            get_jwt_identity(),
+            defaults=defaults or None,
+            batch_size=batch_size
+        )
+        
+        return jsonify({
+            'message': 'SNP ingestion started',
+            'task_id': task_id,
+            'format': file_format
+        }), 202
+        
+    except Exception as e:
+        current_app.logger.error(f"Ingest SNP data error: {str(e)}")
+        return jsonify({'error': 'Failed to start SNP ingestion'}), 500
+
+# Packed Genotype Routes
+@genomics_bp.route('/genotypes/<animal_id>/compact', methods=['POST'])
+@jwt_required()
+def compact_genotype(animal_id):
+    """Pack an animal's snp_data rows into the compact 2-bit genotype store."""
+    try:
+        from src.utils.genotype_store import genotype_store, as_uuid
+        
+        try:
+            animal = db.session.get(Animal, as_uuid(animal_id))
+        except ValueError:
+            return jsonify({'error': 'Invalid animal ID'}), 400
+        if not animal:
+            return jsonify({'error': 'Animal not found'}), 404
+        
+        data = request.get_json(silent=True) or {}
+        
+        genotype = genotype_store.compact_from_snp_data(
+            animal.id,
+            marker_map_id=data.get('marker_map_id'),
+            name=data.get('marker_map_name')
+        )
+        if not genotype:
+            return jsonify({'error': 'Animal has no SNP data'}), 404
+        
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'Genotype compacted successfully',
+            'genotype': genotype.to_dict()
+        }), 200
+        
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Compact genotype error: {str(e)}")
+        return jsonify({'error': 'Failed to compact genotype'}), 500
+
+@genomics_bp.route('/genotypes/<animal_id>', methods=['GET'])
+@jwt_required()
+def get_genotype(animal_id):
+    """
+    Get packed genotype calls for an animal.
+    
+    With a chromosome (and optional start/end positions) only that region is
+    returned; otherwise the full call vector in marker map order. Calls are
+    alternate allele dosages (0, 1, 2) with null for missing.
+    """
+    try:
+        from src.utils.genotype_store import genotype_store, MISSING_CALL
+        
+        marker_map_id = request.args.get('marker_map_id')
+        chromosome = request.args.get('chromosome')
+        start = request.args.get('start', type=int)
+        end = request.args.get('end', type=int)
+        
+        def to_dosages(calls):
+            return [None if call == MISSING_CALL else call for call in calls.tolist()]
+        
+        if chromosome:
+            region = genotype_store.get_region(animal_id, chromosome, start, end, marker_map_id)
+            if region is None:
+                return jsonify({'error': 'Genotype not found'}), 404
+            
+            return jsonify({
+                'animal_id': animal_id,
+                'marker_map_id': str(region['marker_map_id']),
+                'chromosome': region['chromosome'],
+                'markers': [
+                    {'position': position, 'snp_id': snp_id or None, 'call': call}
+                    for position, snp_id, call in zip(
+                        region['positions'].tolist(),
+                        region['snp_ids'].tolist(),
+                        to_dosages(region['calls'])
+                    )
+                ]
+            }), 200
+        
+        marker_map, calls = genotype_store.get_vector(animal_id, marker_map_id)
+        if marker_map is None:
+            return jsonify({'error': 'Genotype not found'}), 404
+        
+        return jsonify({
+            'animal_id': animal_id,
+            'marker_map_id': str(marker_map.id),
+            'marker_count': len(marker_map),
+            'calls': to_dosages(calls)
+        }), 200
+        
+    except ValueError:
+        return jsonify({'error': 'Invalid animal or marker map ID'}), 400
+    except Exception as e:
+        current_app.logger.error(f"Get genotype error: {str(e)}")
+        return jsonify({'error': 'Failed to get genotype'}), 500
+
+# Genomic Relationship Matrix Routes
+@genomics_bp.route('/grm', methods=['POST'])
+@jwt_required()
+def create_grm():
+    """
+    Build (or fetch the cached) VanRaden genomic relationship matrix for a
+    set of animals with packed genotypes on one marker map.
+    
+    Small sets are computed inline; sets larger than GRM_SYNC_MAX_ANIMALS,
+    or any set when "async" is true, run as a background task.
+    """
+    try:
+        from src.utils.grm import compute_grm, find_cached_grm
+        from src.utils.tasks import submit_grm_computation
+        
+        data = request.get_json() or {}
+        animal_ids = data.get('animal_ids')
+        marker_map_id = data.get('marker_map_id')
+        
+        if not isinstance(animal_ids, list) or len(set(animal_ids)) < 2:
+            return jsonify({'error': 'animal_ids must list at least two animals'}), 400
+        if not marker_map_id:
+            return jsonify({'error': 'marker_map_id is required'}), 400
+        
+        block_size = current_app.config.get('GRM_BLOCK_SIZE', 10000)
+        
+        cached = find_cached_grm(animal_ids, marker_map_id)
+        if cached:
+            return jsonify({'grm': cached.to_dict(), 'cached': True}), 200
+        
+        run_async = data.get('async') or len(set(animal_ids)) > current_app.config.get('GRM_SYNC_MAX_ANIMALS', 200)
+        if run_async:
+            task_id = submit_grm_computation(
+                [str(animal_id) for animal_id in animal_ids],
+                str(marker_map_id),
+                get_jwt_identity(),
+                block_size=block_size
+            )
+            return jsonify({
+                'message': 'Relationship matrix computation started',
+                'task_id': task_id
+            }), 202
+        
+        record, created = compute_grm(animal_ids, marker_map_id, block_size=block_size)
+        db.session.commit()
+        
+        return jsonify({'grm': record.to_dict(), 'cached': not created}), 201 if created else 200
+        
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Create GRM error: {str(e)}")
+        return jsonify({'error': 'Failed to compute relationship matrix'}), 500
+
+@genomics_bp.route('/grm/<grm_id>', methods=['GET'])
+@jwt_required()
+def get_grm(grm_id):
+    """Get a cached relationship matrix with its animal order and values."""
+    try:
+        from src.models.genomics import GenomicRelationshipMatrix
+        from src.utils.genotype_store import as_uuid
+        from src.utils.grm import unpack_grm
+        
+        try:
+            record = db.session.get(GenomicRelationshipMatrix, as_uuid(grm_id))
+        except ValueError:
+            return jsonify({'error': 'Invalid relationship matrix ID'}), 400
+        if not record:
+            return jsonify({'error': 'Relationship matrix not found'}), 404
+        
+        animal_ids, _, matrix = unpack_grm(record)
+        
+        result = record.to_dict()
+        result['animal_ids'] = animal_ids
+        result['matrix'] = [[round(value, 6) for value in row] for row in matrix.tolist()]
+        
+        return jsonify({'grm': result}), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Get GRM error: {str(e)}")
+        return jsonify({'error': 'Failed to get relationship matrix'}), 500
+
+@genomics_bp.route('/grm/<grm_id>/animals', methods=['POST'])
+@jwt_required()
+def extend_grm(grm_id):
+    """Add one newly genotyped animal to a cached relationship matrix without recomputing it."""
+    try:
+        from src.models.genomics import GenomicRelationshipMatrix
+        from src.utils.genotype_store import as_uuid
+        from src.utils.grm import add_animal_to_grm
+        
+        data = request.get_json() or {}
+        if not data.get('animal_id'):
+            return jsonify({'error': 'animal_id is required'}), 400
+        
+        try:
+            base_record = db.session.get(GenomicRelationshipMatrix, as_uuid(grm_id))
+        except ValueError:
+            return jsonify({'error': 'Invalid relationship matrix ID'}), 400
+        if not base_record:
+            return jsonify({'error': 'Relationship matrix not found'}), 404
+        
+        record, created = add_animal_to_grm(
+            base_record,
+            data['animal_id'],
+            block_size=current_app.config.get('GRM_BLOCK_SIZE', 10000)
+        )
+        db.session.commit()
+        
+        return jsonify({'grm': record.to_dict(), 'cached': not created}), 201 if created else 200
+        
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Extend GRM error: {str(e)}")
+        return jsonify({'error': 'Failed to extend relationship matrix'}), 500
+
 # BeadChip Mapping Routes
 @genomics_bp.route('/beadchip-mappings', methods=['GET'])
 @jwt_required()
@@ -348,23 +610,17 @@ def list_beadchip_mappings():
         if animal_id:
             query = query.filter(BeadChipMapping.animal_id == animal_id)
         
-        query = query.order_by(BeadChipMapping.created_at.desc())
-        
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-        mappings = [mapping.to_dict() for mapping in pagination.items]
+        items, pagination = paginate_query(query, [BeadChipMapping.created_at.desc()], page, per_page, counter_entity='beadchip_mappings')
+        mappings = [mapping.to_dict() for mapping in items]
         
         return jsonify({
             'mappings': mappings,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
-            }
+            'pagination': pagination
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    
     except Exception as e:
         current_app.logger.error(f"List BeadChip mappings error: {str(e)}")
         return jsonify({'error': 'Failed to list BeadChip mappings'}), 500
@@ -445,45 +701,28 @@ def get_beadchip_mapping(mapping_id):
 def get_genomics_stats():
     """Get genomics statistics."""
     try:
-        # Analysis statistics
-        total_analyses = GenomicAnalysis.query.count()
-        analyses_by_status = {}
-        statuses = ['PENDING', 'RUNNING', 'COMPLETED', 'FAILED', 'CANCELLED']
-        for status in statuses:
-            analyses_by_status[status] = GenomicAnalysis.query.filter_by(status=status).count()
-        
-        # Analysis types
-        analyses_by_type = {}
-        analysis_types = GenomicAnalysis.query.with_entities(GenomicAnalysis.analysis_type).distinct().all()
-        for analysis_type in analysis_types:
-            if analysis_type[0]:
-                analyses_by_type[analysis_type[0]] = GenomicAnalysis.query.filter_by(analysis_type=analysis_type[0]).count()
-        
-        # SNP data statistics
-        total_snp_records = SNPData.query.count()
-        animals_with_snp_data = SNPData.query.with_entities(SNPData.animal_id).distinct().count()
+        from src.utils.counters import entity_counters
         
-        # BeadChip statistics
-        total_beadchip_mappings = BeadChipMapping.query.count()
-        beadchip_by_type = {}
-        chip_types = BeadChipMapping.query.with_entities(BeadChipMapping.chip_type).distinct().all()
-        for chip_type in chip_types:
-            if chip_type[0]:
-                beadchip_by_type[chip_type[0]] = BeadChipMapping.query.filter_by(chip_type=chip_type[0]).count()
+        counters = entity_counters.read('genomic_analyses', 'snp_data', 'beadchip_mappings')
+        analyses = counters['genomic_analyses']
+        beadchips = counters['beadchip_mappings']
+        
+        # Distinct genotyped animals is not a counter; read it off the animal_id index
+        animals_with_snp_data = SNPData.query.with_entities(SNPData.animal_id).distinct().count()
         
         return jsonify({
             'analyses': {
-                'total': total_analyses,
-                'by_status': analyses_by_status,
-                'by_type': analyses_by_type
+                'total': analyses.total,
+                'by_status': analyses.distribution('status', ['PENDING', 'RUNNING', 'COMPLETED', 'FAILED', 'CANCELLED']),
+                'by_type': analyses.distribution('analysis_type')
             },
             'snp_data': {
-                'total_records': total_snp_records,
+                'total_records': counters['snp_data'].total,
                 'animals_with_data': animals_with_snp_data
             },
             'beadchip_mappings': {
-                'total': total_beadchip_mappings,
-                'by_type': beadchip_by_type
+                'total': beadchips.total,
+                'by_type': beadchips.distribution('chip_type')
             }
         }), 200
         
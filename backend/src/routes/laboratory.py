@@ -1,19 +1,20 @@
 from datetime import datetime, timezone, timedelta
 from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 from sqlalchemy import or_, and_
 from src.database import db
-from src.models.user import User
+from src.utils.principal import current_user as load_current_user
 from src.models.laboratory import LabSample, LabProtocol, LabTest, LabEquipment
 from src.models.animal import Animal
 from src.models.customer import Customer
+from src.utils.pagination import paginate_query, InvalidCursor
+from src.utils.search import search_index
 
 laboratory_bp = Blueprint('laboratory', __name__)
 
 def get_current_user():
-    """Get current authenticated user."""
-    current_user_id = get_jwt_identity()
-    return User.query.get(current_user_id)
+    """Get current authenticated user (loaded at most once per request)."""
+    return load_current_user()
 
 def generate_sample_id():
     """Generate unique sample ID."""
@@ -63,13 +64,7 @@ def list_samples():
         query = LabSample.query
         
         if search:
-            query = query.filter(
-                or_(
-                    LabSample.sample_id.ilike(f'%{search}%'),
-                    LabSample.barcode.ilike(f'%{search}%'),
-                    LabSample.sample_type.ilike(f'%{search}%')
-                )
-            )
+            query = query.filter(search_index.matches('lab_sample', search))
         
         if status_filter:
             query = query.filter(LabSample.status == status_filter)
@@ -86,23 +81,17 @@ def list_samples():
         if customer_id:
             query = query.filter(LabSample.customer_id == customer_id)
         
-        query = query.order_by(LabSample.collection_date.desc())
-        
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-        samples = [sample.to_dict() for sample in pagination.items]
+        items, pagination = paginate_query(query, [LabSample.collection_date.desc()], page, per_page, counter_entity='lab_samples')
+        samples = [sample.to_dict() for sample in items]
         
         return jsonify({
             'samples': samples,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
-            }
+            'pagination': pagination
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    
     except Exception as e:
         current_app.logger.error(f"List samples error: {str(e)}")
         return jsonify({'error': 'Failed to list samples'}), 500
@@ -255,23 +244,17 @@ def list_protocols():
         if active_only:
             query = query.filter(LabProtocol.is_active == True)
         
-        query = query.order_by(LabProtocol.protocol_name)
-        
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-        protocols = [protocol.to_dict() for protocol in pagination.items]
+        items, pagination = paginate_query(query, [LabProtocol.protocol_name], page, per_page)
+        protocols = [protocol.to_dict() for protocol in items]
         
         return jsonify({
             'protocols': protocols,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
-            }
+            'pagination': pagination
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    
     except Exception as e:
         current_app.logger.error(f"List protocols error: {str(e)}")
         return jsonify({'error': 'Failed to list protocols'}), 500
@@ -358,23 +341,17 @@ def list_tests():
         if sample_id:
             query = query.filter(LabTest.sample_id == sample_id)
         
-        query = query.order_by(LabTest.requested_date.desc())
-        
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-        tests = [test.to_dict() for test in pagination.items]
+        items, pagination = paginate_query(query, [LabTest.requested_date.desc()], page, per_page, counter_entity='lab_tests')
+        tests = [test.to_dict() for test in items]
         
         return jsonify({
             'tests': tests,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
-            }
+            'pagination': pagination
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    
     except Exception as e:
         current_app.logger.error(f"List tests error: {str(e)}")
         return jsonify({'error': 'Failed to list tests'}), 500
@@ -560,23 +537,17 @@ def list_equipment():
         if location_filter:
             query = query.filter(LabEquipment.location == location_filter)
         
-        query = query.order_by(LabEquipment.name)
-        
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-        equipment = [item.to_dict() for item in pagination.items]
+        items, pagination = paginate_query(query, [LabEquipment.name], page, per_page, counter_entity='lab_equipment')
+        equipment = [item.to_dict() for item in items]
         
         return jsonify({
             'equipment': equipment,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
-            }
+            'pagination': pagination
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    
     except Exception as e:
         current_app.logger.error(f"List equipment error: {str(e)}")
         return jsonify({'error': 'Failed to list equipment'}), 500
@@ -586,36 +557,25 @@ def list_equipment():
 def get_lab_stats():
     """Get laboratory statistics."""
     try:
-        # Sample statistics
-        total_samples = LabSample.query.count()
-        samples_by_status = {}
-        statuses = ['COLLECTED', 'PROCESSING', 'TESTED', 'ARCHIVED', 'DISPOSED']
-        for status in statuses:
-            samples_by_status[status] = LabSample.query.filter_by(status=status).count()
-        
-        # Test statistics
-        total_tests = LabTest.query.count()
-        tests_by_status = {}
-        test_statuses = ['PENDING', 'IN_PROGRESS', 'COMPLETED', 'FAILED', 'ON_HOLD', 'CANCELLED']
-        for status in test_statuses:
-            tests_by_status[status] = LabTest.query.filter_by(status=status).count()
-        
-        # Equipment statistics
-        total_equipment = LabEquipment.query.count()
-        operational_equipment = LabEquipment.query.filter_by(status='OPERATIONAL').count()
+        from src.utils.counters import entity_counters
+        
+        counters = entity_counters.read('lab_samples', 'lab_tests', 'lab_equipment')
+        samples = counters['lab_samples']
+        tests = counters['lab_tests']
+        equipment = counters['lab_equipment']
         
         return jsonify({
             'samples': {
-                'total': total_samples,
-                'by_status': samples_by_status
+                'total': samples.total,
+                'by_status': samples.distribution('status', ['COLLECTED', 'PROCESSING', 'TESTED', 'ARCHIVED', 'DISPOSED'])
             },
             'tests': {
-                'total': total_tests,
-                'by_status': tests_by_status
+                'total': tests.total,
+                'by_status': tests.distribution('status', ['PENDING', 'IN_PROGRESS', 'COMPLETED', 'FAILED', 'ON_HOLD', 'CANCELLED'])
             },
             'equipment': {
-                'total': total_equipment,
-                'operational': operational_equipment
+                'total': equipment.total,
+                'operational': equipment.get('status', 'OPERATIONAL')
             }
         }), 200
         
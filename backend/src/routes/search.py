@@ -0,0 +1,40 @@
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required
+from src.utils.search import search_index, SEARCH_ENTITIES
+
+search_bp = Blueprint('search', __name__)
+
+@search_bp.route('', methods=['GET'])
+@jwt_required()
+def search():
+    """Ranked search across animals, customers, samples and analyses."""
+    try:
+        term = request.args.get('q', '').strip()
+        if not term:
+            return jsonify({'error': 'Search term (q) is required'}), 400
+        
+        limit = int(request.args.get('limit', 20))
+        
+        entity_types = None
+        if request.args.get('types'):
+            entity_types = [t.strip() for t in request.args['types'].split(',') if t.strip()]
+            unknown = [t for t in entity_types if t not in SEARCH_ENTITIES]
+            if unknown:
+                return jsonify({
+                    'error': f"Unknown entity types: {', '.join(unknown)}",
+                    'valid_types': list(SEARCH_ENTITIES)
+                }), 400
+        
+        results = search_index.search(term, entity_types, limit)
+        
+        return jsonify({
+            'query': term,
+            'results': results
+        }), 200
+    
+    except ValueError:
+        return jsonify({'error': 'Invalid limit'}), 400
+    
+    except Exception as e:
+        current_app.logger.error(f"Search error: {str(e)}")
+        return jsonify({'error': 'Search failed'}), 500
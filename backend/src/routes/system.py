@@ -3,25 +3,41 @@
 System management routes for monitoring and administration.
 """
 
+import json
+import time
 from datetime import datetime, timezone, timedelta
-from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
+from flask_jwt_extended import jwt_required
 from src.database import db
 from src.utils.audit import AuditLogger, get_audit_logs, cleanup_old_audit_logs
 from src.utils.tasks import task_manager, cleanup_old_tasks, BackgroundTask, TaskStatus
+from src.utils.task_progress import task_progress, TERMINAL_STATUSES
 from src.utils.cache import cache, warm_cache
 from src.utils.email import send_system_alert, get_admin_emails
 from src.middleware.auth import admin_required
+from src.utils.pagination import paginate_query, InvalidCursor
+from src.utils.principal import current_principal
+from src.utils.genotype_store import as_uuid
 
 system_bp = Blueprint('system', __name__)
 
+def can_access_task(task):
+    """True if the current user owns the task or is an admin."""
+    principal = current_principal()
+    if principal is None:
+        return False
+    return principal.has_role('admin') or (task.user_id is not None and str(task.user_id) == principal.id)
+
 # Background Tasks Management
 @system_bp.route('/tasks', methods=['GET'])
 @jwt_required()
 def get_background_tasks():
     """Get background tasks for current user or all tasks for admin."""
     try:
-        user_id = get_jwt_identity()
+        principal = current_principal()
+        if principal is None:
+            return jsonify({'error': 'User not found'}), 404
+        
         page = request.args.get('page', 1, type=int)
         per_page = min(request.args.get('per_page', 20, type=int), 100)
         status = request.args.get('status')
@@ -29,38 +45,23 @@ def get_background_tasks():
         # Build query
         query = BackgroundTask.query
         
-        # Check if user is admin (simplified check)
-        from src.models.user import User
-        user = User.query.get(user_id)
-        is_admin = user and user.role == 'admin'
-        
-        if not is_admin:
-            query = query.filter(BackgroundTask.user_id == user_id)
+        if not principal.has_role('admin'):
+            query = query.filter(BackgroundTask.user_id == as_uuid(principal.id))
         
         if status:
             query = query.filter(BackgroundTask.status == TaskStatus(status))
         
         # Order by most recent first
-        query = query.order_by(BackgroundTask.created_at.desc())
-        
-        tasks_paginated = query.paginate(
-            page=page, 
-            per_page=per_page, 
-            error_out=False
-        )
+        items, tasks_paginated = paginate_query(query, [BackgroundTask.created_at.desc()], page, per_page)
         
         return jsonify({
-            'tasks': [task.to_dict() for task in tasks_paginated.items],
-            'pagination': {
-                'page': tasks_paginated.page,
-                'per_page': tasks_paginated.per_page,
-                'total': tasks_paginated.total,
-                'pages': tasks_paginated.pages,
-                'has_next': tasks_paginated.has_next,
-                'has_prev': tasks_paginated.has_prev
-            }
+            'tasks': [task.to_dict() for task in items],
+            'pagination': tasks_paginated
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    
     except Exception as e:
         current_app.logger.error(f"Get background tasks error: {str(e)}")
         return jsonify({'error': 'Failed to get background tasks'}), 500
@@ -70,43 +71,111 @@ def get_background_tasks():
 def get_task_status(task_id):
     """Get status of a specific background task."""
     try:
-        user_id = get_jwt_identity()
-        
         task = BackgroundTask.query.filter_by(task_id=task_id).first()
         if not task:
             return jsonify({'error': 'Task not found'}), 404
         
-        # Check if user owns the task or is admin
-        from src.models.user import User
-        user = User.query.get(user_id)
-        is_admin = user and user.role == 'admin'
-        
-        if not is_admin and task.user_id != user_id:
+        if not can_access_task(task):
             return jsonify({'error': 'Access denied'}), 403
         
-        return jsonify(task.to_dict()), 200
+        # Progress is committed only at checkpoints; the live value is newer
+        return jsonify(task_progress.merge(task.to_dict())), 200
         
     except Exception as e:
         current_app.logger.error(f"Get task status error: {str(e)}")
         return jsonify({'error': 'Failed to get task status'}), 500
 
+@system_bp.route('/tasks/<task_id>/events', methods=['GET'])
+@jwt_required()
+def stream_task_progress(task_id):
+    """
+    Stream task progress as server-sent events.
+    
+    Sends a 'progress' event whenever the task's state changes and an 'end'
+    event once it completes, fails or is cancelled. Streams close after
+    TASK_PROGRESS_STREAM_TIMEOUT seconds; EventSource clients reconnect.
+    """
+    try:
+        task = BackgroundTask.query.filter_by(task_id=task_id).first()
+        if not task:
+            return jsonify({'error': 'Task not found'}), 404
+        
+        if not can_access_task(task):
+            return jsonify({'error': 'Access denied'}), 403
+        
+        row = task.to_dict()
+        db.session.rollback()  # Do not hold a transaction open for the life of the stream
+        
+    except Exception as e:
+        current_app.logger.error(f"Stream task progress error: {str(e)}")
+        return jsonify({'error': 'Failed to stream task progress'}), 500
+    
+    interval = current_app.config.get('TASK_PROGRESS_INTERVAL', 0.5)
+    timeout = current_app.config.get('TASK_PROGRESS_STREAM_TIMEOUT', 300)
+    
+    def read_row():
+        # Status and checkpointed progress; catches cancellation and tasks without live progress
+        task = BackgroundTask.query.filter_by(task_id=task_id).first()
+        data = task.to_dict() if task else row
+        db.session.rollback()
+        return data
+    
+    def events():
+        nonlocal row
+        started = time.monotonic()
+        row_read_at = started
+        last_sent = None
+        sent_at = started
+        
+        yield f"retry: {int(interval * 4000)}\n\n"
+        while True:
+            now = time.monotonic()
+            live = task_progress.read(task_id)
+            if now - row_read_at >= (2 if live is None else 5):
+                row = read_row()
+                row_read_at = now
+            
+            status = row['status']
+            if live and live['status'] in TERMINAL_STATUSES:
+                status = live['status']
+            state = task_progress.merge(dict(row, status=status), live)
+            event = {key: state.get(key) for key in ('task_id', 'status', 'progress')}
+            event['message'] = (state.get('metadata') or {}).get('progress_message')
+            
+            if event != last_sent:
+                yield f"event: progress\ndata: {json.dumps(event)}\n\n"
+                last_sent = event
+                sent_at = now
+            elif now - sent_at >= 15:
+                yield ": keepalive\n\n"
+                sent_at = now
+            
+            if status in TERMINAL_STATUSES:
+                if status != row['status']:
+                    row = read_row()  # Result and error are only in the row
+                yield f"event: end\ndata: {json.dumps(row, default=str)}\n\n"
+                return
+            if now - started >= timeout:
+                return
+            
+            time.sleep(interval)
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @system_bp.route('/tasks/<task_id>/cancel', methods=['POST'])
 @jwt_required()
 def cancel_task(task_id):
     """Cancel a pending background task."""
     try:
-        user_id = get_jwt_identity()
-        
         task = BackgroundTask.query.filter_by(task_id=task_id).first()
         if not task:
             return jsonify({'error': 'Task not found'}), 404
         
-        # Check if user owns the task or is admin
-        from src.models.user import User
-        user = User.query.get(user_id)
-        is_admin = user and user.role == 'admin'
-        
-        if not is_admin and task.user_id != user_id:
+        if not can_access_task(task):
             return jsonify({'error': 'Access denied'}), 403
         
         if task_manager.cancel_task(task_id):
@@ -169,6 +238,20 @@ def get_audit_logs_endpoint():
         current_app.logger.error(f"Get audit logs error: {str(e)}")
         return jsonify({'error': 'Failed to get audit logs'}), 500
 
+@system_bp.route('/audit-logs/metrics', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_audit_writer_metrics():
+    """Audit writer queue depth, flush latency and spool counters (admin only)."""
+    try:
+        from src.utils.audit_writer import audit_writer
+        
+        return jsonify(audit_writer.metrics()), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Get audit writer metrics error: {str(e)}")
+        return jsonify({'error': 'Failed to get audit writer metrics'}), 500
+
 # Cache Management
 @system_bp.route('/cache/clear', methods=['POST'])
 @jwt_required()
@@ -178,13 +261,18 @@ def clear_cache():
     try:
         data = request.get_json() or {}
         pattern = data.get('pattern')
+        tags = data.get('tags')
         
-        cache.clear(pattern)
+        if tags:
+            # O(1) per tag; no key scan
+            cache.invalidate_tags(*tags)
+        else:
+            cache.clear(pattern)
         
         AuditLogger.log_system_event(
             'CACHE_CLEARED',
-            f'Application cache cleared with pattern: {pattern or "all"}',
-            {'pattern': pattern}
+            f'Application cache cleared with {"tags: " + ", ".join(tags) if tags else "pattern: " + (pattern or "all")}',
+            {'pattern': pattern, 'tags': tags}
         )
         
         return jsonify({'message': 'Cache cleared successfully'}), 200
@@ -270,6 +358,17 @@ def detailed_health_check():
         if running_tasks > 10:
             issues.append('Many running background tasks')
         
+        # Audit writer metrics
+        from src.utils.audit_writer import audit_writer
+        audit_metrics = audit_writer.metrics()
+        health_data['audit_writer'] = audit_metrics
+        if audit_metrics['degraded']:
+            issues.append('Audit log writes diverted to local spool')
+        
+        # Token blocklist cache
+        from src.utils.token_blocklist import token_blocklist
+        health_data['token_blocklist'] = token_blocklist.stats()
+        
         if issues:
             health_data['status'] = 'warning'
             health_data['issues'] = issues
@@ -298,7 +397,7 @@ def system_cleanup():
         # Clean up old audit logs
         if data.get('cleanup_audit_logs', True):
             days_to_keep = data.get('audit_logs_days', 90)
-            deleted_logs = cleanup_old_audit_logs(days_to_keep)
+            deleted_logs = cleanup_old_audit_logs(days_to_keep, archive=data.get('archive_audit_logs', True))
             results['audit_logs_cleaned'] = deleted_logs
         
         # Clean up old background tasks
@@ -327,6 +426,38 @@ def system_cleanup():
         current_app.logger.error(f"System cleanup error: {str(e)}")
         return jsonify({'error': 'System cleanup failed'}), 500
 
+@system_bp.route('/maintenance/reconcile-counters', methods=['POST'])
+@jwt_required()
+@admin_required
+def reconcile_counters():
+    """Recount materialised statistics counters from their tables (admin only)."""
+    try:
+        from src.utils.counters import entity_counters, COUNTED_TABLES
+        
+        data = request.get_json() or {}
+        entities = data.get('entities')
+        
+        unknown = [entity for entity in entities or [] if entity not in COUNTED_TABLES]
+        if unknown:
+            return jsonify({'error': f"Unknown entities: {', '.join(unknown)}"}), 400
+        
+        corrected = entity_counters.reconcile(entities)
+        
+        AuditLogger.log_system_event(
+            'COUNTERS_RECONCILED',
+            f'Statistics counters reconciled; {sum(corrected.values())} rows corrected',
+            {'corrected': corrected}
+        )
+        
+        return jsonify({
+            'message': 'Counters reconciled',
+            'corrected': corrected
+        }), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Reconcile counters error: {str(e)}")
+        return jsonify({'error': 'Failed to reconcile counters'}), 500
+
 # System Alerts
 @system_bp.route('/alerts/test', methods=['POST'])
 @jwt_required()
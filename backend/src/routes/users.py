@@ -1,21 +1,22 @@
 from datetime import datetime, timezone, timedelta
 from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 from sqlalchemy import or_, and_
 from src.database import db
 from src.models.user import User, UserProfile, Role, Permission
+from src.utils.principal import principal_cache, current_principal, current_user as load_current_user
+from src.utils.pagination import paginate_query, InvalidCursor
 
 users_bp = Blueprint('users', __name__)
 
 def get_current_user():
-    """Get current authenticated user."""
-    current_user_id = get_jwt_identity()
-    return User.query.get(current_user_id)
+    """Get current authenticated user (loaded at most once per request)."""
+    return load_current_user()
 
 def check_admin_permission():
     """Check if current user has admin permissions."""
-    current_user = get_current_user()
-    return current_user and current_user.has_role('admin')
+    principal = current_principal()
+    return principal and principal.has_role('admin')
 
 @users_bp.route('', methods=['GET'])
 @jwt_required()
@@ -60,27 +61,18 @@ def list_users():
             query = query.join(UserProfile).filter(UserProfile.department == department_filter)
         
         # Order by creation date
-        query = query.order_by(User.created_at.desc())
+        items, pagination = paginate_query(query, [User.created_at.desc()], page, per_page, counter_entity='users')
         
-        # Paginate
-        pagination = query.paginate(
-            page=page, per_page=per_page, error_out=False
-        )
-        
-        users = [user.to_dict(include_profile=True) for user in pagination.items]
+        users = [user.to_dict(include_profile=True) for user in items]
         
         return jsonify({
             'users': users,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
-            }
+            'pagination': pagination
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    
     except Exception as e:
         current_app.logger.error(f"List users error: {str(e)}")
         return jsonify({'error': 'Failed to list users'}), 500
@@ -90,10 +82,10 @@ def list_users():
 def get_user(user_id):
     """Get user details."""
     try:
-        current_user = get_current_user()
+        principal = current_principal()
         
         # Users can view their own profile, admins can view any profile
-        if str(current_user.id) != user_id and not current_user.has_role('admin'):
+        if principal.id != user_id and not principal.has_role('admin'):
             return jsonify({'error': 'Access denied'}), 403
         
         user = User.query.get(user_id)
@@ -113,10 +105,10 @@ def get_user(user_id):
 def update_user(user_id):
     """Update user information."""
     try:
-        current_user = get_current_user()
+        principal = current_principal()
         
         # Users can update their own profile, admins can update any profile
-        if str(current_user.id) != user_id and not current_user.has_role('admin'):
+        if principal.id != user_id and not principal.has_role('admin'):
             return jsonify({'error': 'Access denied'}), 403
         
         user = User.query.get(user_id)
@@ -128,7 +120,7 @@ def update_user(user_id):
             return jsonify({'error': 'No data provided'}), 400
         
         # Update user fields (admin only for some fields)
-        is_admin = current_user.has_role('admin')
+        is_admin = principal.has_role('admin')
         
         if 'email' in data:
             # Check if email is already taken
@@ -204,7 +196,7 @@ def delete_user(user_id):
         
         user.is_active = False
         user.updated_at = datetime.now(timezone.utc)
-        db.session.commit()
+        db.session.commit()  # Retires the user's principals and token claims
         
         return jsonify({'message': 'User deactivated successfully'}), 200
         
@@ -228,7 +220,7 @@ def activate_user(user_id):
         user.is_active = True
         user.unlock_account()  # Also unlock if locked
         user.updated_at = datetime.now(timezone.utc)
-        db.session.commit()
+        db.session.commit()  # Retires the user's principals and token claims
         
         return jsonify({'message': 'User activated successfully'}), 200
         
@@ -288,6 +280,7 @@ def assign_user_roles(user_id):
         
         user.updated_at = datetime.now(timezone.utc)
         db.session.commit()
+        principal_cache.invalidate(user.id)
         
         return jsonify({
             'message': 'Roles assigned successfully',
@@ -319,6 +312,7 @@ def remove_user_role(user_id, role_id):
             user.roles.remove(role)
             user.updated_at = datetime.now(timezone.utc)
             db.session.commit()
+            principal_cache.invalidate(user.id)
             return jsonify({'message': 'Role removed successfully'}), 200
         else:
             return jsonify({'error': 'User does not have this role'}), 400
@@ -336,16 +330,22 @@ def get_user_stats():
         if not check_admin_permission():
             return jsonify({'error': 'Admin access required'}), 403
         
-        total_users = User.query.count()
-        active_users = User.query.filter_by(is_active=True).count()
-        inactive_users = total_users - active_users
-        verified_users = User.query.filter_by(is_verified=True).count()
+        from src.utils.counters import entity_counters
         
-        # Users by role
-        role_stats = {}
-        roles = Role.query.all()
-        for role in roles:
-            role_stats[role.name] = len(role.users)
+        users = entity_counters.read('users')['users']
+        total_users = users.total
+        active_users = users.get('is_active', True)
+        inactive_users = total_users - active_users
+        verified_users = users.get('is_verified', True)
+        
+        # Users by role, in one grouped query (Role has no users relationship)
+        from src.models.user import user_roles
+        role_stats = dict(
+            db.session.query(Role.name, db.func.count(user_roles.c.user_id))
+            .outerjoin(user_roles, user_roles.c.role_id == Role.id)
+            .group_by(Role.name)
+            .all()
+        )
         
         # Recent registrations (last 30 days)
         thirty_days_ago = datetime.now(timezone.utc) - timedelta(days=30)
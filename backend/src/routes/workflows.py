@@ -1,17 +1,17 @@
 from datetime import datetime, timezone, timedelta
 from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 from sqlalchemy import or_, and_
 from src.database import db
-from src.models.user import User
+from src.utils.principal import current_user as load_current_user
 from src.models.workflow import Workflow, WorkflowInstance, WorkflowStepExecution
+from src.utils.pagination import paginate_query, InvalidCursor
 
 workflows_bp = Blueprint('workflows', __name__)
 
 def get_current_user():
-    """Get current authenticated user."""
-    current_user_id = get_jwt_identity()
-    return User.query.get(current_user_id)
+    """Get current authenticated user (loaded at most once per request)."""
+    return load_current_user()
 
 def generate_workflow_id():
     """Generate unique workflow ID."""
@@ -75,23 +75,17 @@ def list_workflows():
         if templates_only:
             query = query.filter(Workflow.is_template == True)
         
-        query = query.order_by(Workflow.category, Workflow.name)
-        
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-        workflows = [workflow.to_dict() for workflow in pagination.items]
+        items, pagination = paginate_query(query, [Workflow.category, Workflow.name], page, per_page)
+        workflows = [workflow.to_dict() for workflow in items]
         
         return jsonify({
             'workflows': workflows,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
-            }
+            'pagination': pagination
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    
     except Exception as e:
         current_app.logger.error(f"List workflows error: {str(e)}")
         return jsonify({'error': 'Failed to list workflows'}), 500
@@ -258,23 +252,17 @@ def list_instances():
                 )
             )
         
-        query = query.order_by(WorkflowInstance.created_at.desc())
-        
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-        instances = [instance.to_dict() for instance in pagination.items]
+        items, pagination = paginate_query(query, [WorkflowInstance.created_at.desc()], page, per_page, counter_entity='workflow_instances')
+        instances = [instance.to_dict() for instance in items]
         
         return jsonify({
             'instances': instances,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
-            }
+            'pagination': pagination
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    
     except Exception as e:
         current_app.logger.error(f"List instances error: {str(e)}")
         return jsonify({'error': 'Failed to list instances'}), 500
@@ -569,17 +557,11 @@ def complete_step(instance_id, step_id):
 def get_workflow_stats():
     """Get workflow statistics."""
     try:
-        # Workflow statistics
-        total_workflows = Workflow.query.count()
-        active_workflows = Workflow.query.filter_by(is_active=True).count()
-        template_workflows = Workflow.query.filter_by(is_template=True).count()
-        
-        # Instance statistics
-        total_instances = WorkflowInstance.query.count()
-        instances_by_status = {}
-        statuses = ['PENDING', 'RUNNING', 'PAUSED', 'COMPLETED', 'FAILED', 'CANCELLED', 'WAITING']
-        for status in statuses:
-            instances_by_status[status] = WorkflowInstance.query.filter_by(status=status).count()
+        from src.utils.counters import entity_counters
+        
+        counters = entity_counters.read('workflows', 'workflow_instances')
+        workflows = counters['workflows']
+        instances = counters['workflow_instances']
         
         # Overdue instances
         now = datetime.now(timezone.utc)
@@ -591,22 +573,16 @@ def get_workflow_stats():
             )
         ).count()
         
-        # Workflows by category
-        workflows_by_category = {}
-        categories = ['BREEDING', 'LABORATORY', 'CLINICAL', 'GENOMIC', 'ADMINISTRATIVE']
-        for category in categories:
-            workflows_by_category[category] = Workflow.query.filter_by(category=category).count()
-        
         return jsonify({
             'workflows': {
-                'total': total_workflows,
-                'active': active_workflows,
-                'templates': template_workflows,
-                'by_category': workflows_by_category
+                'total': workflows.total,
+                'active': workflows.get('is_active', True),
+                'templates': workflows.get('is_template', True),
+                'by_category': workflows.distribution('category', ['BREEDING', 'LABORATORY', 'CLINICAL', 'GENOMIC', 'ADMINISTRATIVE'])
             },
             'instances': {
-                'total': total_instances,
-                'by_status': instances_by_status,
+                'total': instances.total,
+                'by_status': instances.distribution('status', ['PENDING', 'RUNNING', 'PAUSED', 'COMPLETED', 'FAILED', 'CANCELLED', 'WAITING']),
                 'overdue': overdue_instances
             }
         }), 200
@@ -3,7 +3,7 @@ Audit logging system for tracking user actions and system events.
 """
 
 import json
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 from functools import wraps
 from flask import current_app, request, g
 from flask_jwt_extended import get_jwt_identity
@@ -81,21 +81,20 @@ class AuditLogger:
     def log_event(event_type, event_category, description=None, entity_type=None, 
                   entity_id=None, old_values=None, new_values=None, metadata=None,
                   status='SUCCESS', error_message=None):
-        """Log an audit event."""
+        """
+        Record an audit event.
+        
+        The row is queued for the background audit writer, so this never
+        queries or commits the caller's session.
+        """
         try:
-            # Get user information
+            # Get user information (the writer resolves emails per batch)
             user_id = None
-            user_email = None
             
             try:
                 user_id = get_jwt_identity()
-                if user_id:
-                    from src.models.user import User
-                    user = User.query.get(user_id)
-                    if user:
-                        user_email = user.email
             except:
-                pass  # No JWT context or user not found
+                pass  # No JWT context
             
             # Get request information
             ip_address = None
@@ -109,34 +108,33 @@ class AuditLogger:
                 request_method = request.method
                 request_url = request.url[:500]  # Limit length
             
-            # Create audit log entry
-            audit_log = AuditLog(
-                event_type=event_type,
-                event_category=event_category,
-                event_description=description,
-                user_id=user_id,
-                user_email=user_email,
-                ip_address=ip_address,
-                user_agent=user_agent,
-                request_method=request_method,
-                request_url=request_url,
-                entity_type=entity_type,
-                entity_id=str(entity_id) if entity_id else None,
-                old_values=old_values,
-                new_values=new_values,
-                audit_metadata=metadata,
-                status=status,
-                error_message=error_message
-            )
-            
-            db.session.add(audit_log)
-            db.session.commit()
+            # Queue audit log entry
+            from src.utils.audit_writer import audit_writer
+            audit_writer.enqueue({
+                'event_type': event_type,
+                'event_category': event_category,
+                'event_description': description,
+                'user_id': user_id,
+                'user_email': None,
+                'ip_address': ip_address,
+                'user_agent': user_agent,
+                'request_method': request_method,
+                'request_url': request_url,
+                'entity_type': entity_type,
+                'entity_id': str(entity_id) if entity_id else None,
+                'old_values': old_values,
+                'new_values': new_values,
+                'audit_metadata': metadata,
+                'status': status,
+                'error_message': error_message,
+                'created_at': datetime.now(timezone.utc)
+            })
             
             # Also log to application logger for immediate visibility
             log_level = 'INFO' if status == 'SUCCESS' else 'WARNING' if status == 'WARNING' else 'ERROR'
             log_message = f"AUDIT [{event_category}] {event_type}: {description or 'No description'}"
-            if user_email:
-                log_message += f" (User: {user_email})"
+            if user_id:
+                log_message += f" (User: {user_id})"
             if entity_type and entity_id:
                 log_message += f" (Entity: {entity_type}#{entity_id})"
             
@@ -253,7 +251,7 @@ def audit_action(event_type, entity_type=None, description=None):
                     description=description or f"API call: {f.__name__}",
                     entity_type=entity_type,
                     entity_id=entity_id,
-                    audit_metadata=metadata,
+                    metadata=metadata,
                     status='FAILED' if error_occurred else 'SUCCESS',
                     error_message=error_message
                 )
@@ -270,51 +268,79 @@ def get_audit_logs(filters=None, page=1, per_page=50):
         page: Page number
         per_page: Records per page
     """
-    query = AuditLog.query
+    from sqlalchemy.orm import aliased
+    from src.utils.audit_partitions import audit_partitions
+    from src.utils.search import escape_like
     
-    if filters:
-        if filters.get('event_type'):
-            query = query.filter(AuditLog.event_type == filters['event_type'])
-        
-        if filters.get('event_category'):
-            query = query.filter(AuditLog.event_category == filters['event_category'])
-        
-        if filters.get('user_id'):
-            query = query.filter(AuditLog.user_id == filters['user_id'])
-        
-        if filters.get('user_email'):
-            query = query.filter(AuditLog.user_email.ilike(f"%{filters['user_email']}%"))
-        
-        if filters.get('entity_type'):
-            query = query.filter(AuditLog.entity_type == filters['entity_type'])
-        
-        if filters.get('entity_id'):
-            query = query.filter(AuditLog.entity_id == str(filters['entity_id']))
-        
-        if filters.get('status'):
-            query = query.filter(AuditLog.status == filters['status'])
-        
-        if filters.get('date_from'):
-            query = query.filter(AuditLog.created_at >= filters['date_from'])
-        
-        if filters.get('date_to'):
-            query = query.filter(AuditLog.created_at <= filters['date_to'])
+    filters = filters or {}
+    
+    # Rolled-over month tables (SQLite) are read together with the live table
+    source = audit_partitions.source(filters.get('date_from'), filters.get('date_to'))
+    log = aliased(AuditLog, source) if source is not None else AuditLog
+    query = db.session.query(log)
+    
+    if filters.get('event_type'):
+        query = query.filter(log.event_type == filters['event_type'])
+    
+    if filters.get('event_category'):
+        query = query.filter(log.event_category == filters['event_category'])
+    
+    if filters.get('user_id'):
+        query = query.filter(log.user_id == filters['user_id'])
+    
+    if filters.get('user_email'):
+        # Case-insensitive prefix, served by the lower(user_email) index
+        prefix = escape_like(filters['user_email'].lower())
+        query = query.filter(db.func.lower(log.user_email).like(f'{prefix}%', escape='\\'))
+    
+    if filters.get('entity_type'):
+        query = query.filter(log.entity_type == filters['entity_type'])
+    
+    if filters.get('entity_id'):
+        query = query.filter(log.entity_id == str(filters['entity_id']))
+    
+    if filters.get('status'):
+        query = query.filter(log.status == filters['status'])
+    
+    if filters.get('date_from'):
+        query = query.filter(log.created_at >= filters['date_from'])
+    
+    if filters.get('date_to'):
+        query = query.filter(log.created_at <= filters['date_to'])
     
     # Order by most recent first
-    query = query.order_by(AuditLog.created_at.desc())
+    query = query.order_by(log.created_at.desc())
     
     return query.paginate(page=page, per_page=per_page, error_out=False)
 
-def cleanup_old_audit_logs(days_to_keep=90):
-    """Clean up old audit logs to prevent database bloat."""
+def cleanup_old_audit_logs(days_to_keep=90, archive=True):
+    """
+    Remove audit logs older than days_to_keep.
+    
+    With partitioned storage whole months are archived to compressed JSONL
+    and dropped; otherwise old rows are deleted.
+    
+    Returns:
+        Number of audit log entries removed
+    """
+    from src.utils.audit_partitions import audit_partitions
+    
     try:
-        cutoff_date = datetime.now(timezone.utc) - timedelta(days=days_to_keep)
-        
-        deleted_count = AuditLog.query.filter(
-            AuditLog.created_at < cutoff_date
-        ).delete()
-        
-        db.session.commit()
+        if audit_partitions.enabled:
+            result = audit_partitions.expire(days_to_keep, archive=archive)
+            deleted_count = result['rows_removed']
+            if result['dropped']:
+                current_app.logger.info(
+                    f"Dropped audit log tables {', '.join(result['dropped'])}; archives: {', '.join(result['archives']) or 'none'}"
+                )
+        else:
+            cutoff_date = datetime.now(timezone.utc) - timedelta(days=days_to_keep)
+            
+            deleted_count = AuditLog.query.filter(
+                AuditLog.created_at < cutoff_date
+            ).delete()
+            
+            db.session.commit()
         
         current_app.logger.info(f"Cleaned up {deleted_count} old audit log entries")
         return deleted_count
@@ -323,4 +349,3 @@ def cleanup_old_audit_logs(days_to_keep=90):
         db.session.rollback()
         current_app.logger.error(f"Audit log cleanup failed: {str(e)}")
         return 0
-
@@ -0,0 +1,357 @@
+"""
+Time-partitioned audit log storage and retention.
+
+PostgreSQL: audit_logs is a table partitioned by RANGE (created_at), with one
+partition per UTC month (audit_logs_YYYY_MM) plus audit_logs_default for
+anything outside the prepared range. Partitions are created
+AUDIT_PARTITION_MONTHS_AHEAD months in advance. An existing unpartitioned
+audit_logs is converted once at startup. Queries with a created_at range
+touch only the matching partitions.
+
+SQLite: audit_logs holds the current month. Rows from earlier months are
+rolled into audit_logs_YYYY_MM tables once a month, and get_audit_logs reads
+through a UNION ALL of the tables its date range overlaps.
+
+On both backends retention drops whole month tables instead of deleting
+rows, after first archiving each one to <AUDIT_ARCHIVE_DIR>/<table>.jsonl.gz.
+Retention therefore works at month granularity: a month is dropped only when
+all of it is older than the cutoff. Rows in the default partition or in the
+live SQLite table are few, and those are deleted row by row.
+"""
+
+import gzip
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone, timedelta
+from sqlalchemy import MetaData, Table, Column, Index, select, delete, insert, union_all, func, text
+from src.database import db
+
+PARTITION_PATTERN = re.compile(r'^audit_logs_(\d{4})_(\d{2})$')
+DEFAULT_PARTITION = 'audit_logs_default'
+LOCK_KEY = 'audit_log_partitions'  # PostgreSQL advisory lock name for maintenance
+
+# Indexes of the partitioned PostgreSQL table: (name, expression)
+POSTGRESQL_INDEXES = (
+    ('ix_audit_logs_created_at', 'created_at'),
+    ('ix_audit_logs_event_type', 'event_type'),
+    ('ix_audit_logs_event_category', 'event_category'),
+    ('ix_audit_logs_user_id', 'user_id'),
+    ('ix_audit_logs_entity_type', 'entity_type'),
+    ('ix_audit_logs_entity_id', 'entity_id'),
+    ('ix_audit_logs_user_email_prefix', 'lower(user_email) text_pattern_ops')
+)
+
+def month_start(value):
+    """First instant of value's UTC month."""
+    if value.tzinfo:
+        value = value.astimezone(timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+def partition_name(month):
+    return f'audit_logs_{month:%Y_%m}'
+
+def partition_month(name):
+    """Month of a partition table name, or None if it is not one."""
+    match = PARTITION_PATTERN.match(name)
+    if not match:
+        return None
+    return datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=timezone.utc)
+
+def _audit_table():
+    from src.utils.audit import AuditLog
+    return AuditLog.__table__
+
+def _month_table(name):
+    """Column-compatible Table for a month table (no foreign keys; created_at index only)."""
+    metadata = MetaData()
+    columns = [Column(c.name, c.type, primary_key=c.primary_key) for c in _audit_table().columns]
+    table = Table(name, metadata, *columns)
+    Index(f'ix_{name}_created_at', table.c.created_at)
+    return table
+
+class AuditPartitionManager:
+    """Creates, rolls, archives and drops audit log month tables."""
+    
+    def __init__(self, app=None):
+        self.app = app
+        self.enabled = True
+        self.months_ahead = 2
+        self.retention_days = 0
+        self.archive_dir = None
+        self.interval = None
+        self._scheduled = False
+        self._maintainer = None
+        self._maintainer_pid = None
+        self._lock = threading.Lock()
+        
+        if app:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        """Initialize partition maintenance with Flask app. Call ensure() once tables exist."""
+        self.app = app
+        self.enabled = app.config.get('AUDIT_PARTITIONING', True)
+        self.months_ahead = app.config.get('AUDIT_PARTITION_MONTHS_AHEAD', 2)
+        self.retention_days = app.config.get('AUDIT_RETENTION_DAYS', 0)
+        self.archive_dir = app.config.get('AUDIT_ARCHIVE_DIR') or os.path.join(app.instance_path, 'audit_archive')
+        self.interval = app.config.get('AUDIT_MAINTENANCE_INTERVAL', 86400)
+        app.before_request(self._ensure_maintainer)
+    
+    @property
+    def dialect(self):
+        return db.engine.dialect.name
+    
+    # Partition layout
+    
+    def ensure(self):
+        """Convert to partitioned storage if needed and prepare the current and upcoming months."""
+        if not self.enabled:
+            return
+        try:
+            if self.dialect == 'postgresql':
+                self._ensure_postgresql()
+            elif self.dialect == 'sqlite':
+                self.roll()
+        except Exception as e:
+            self.app.logger.error(f"Audit log partition maintenance error: {str(e)}")
+    
+    def _locked(self, connection):
+        """Take the maintenance lock for this transaction; False if another process holds it."""
+        return connection.execute(
+            select(func.pg_try_advisory_xact_lock(func.hashtext(LOCK_KEY)))
+        ).scalar()
+    
+    def _is_partitioned(self, connection):
+        return connection.execute(text(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = 'audit_logs' AND c.relnamespace = current_schema()::regnamespace"
+        )).first() is not None
+    
+    def _create_partition(self, connection, month):
+        connection.exec_driver_sql(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF audit_logs "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d} 00:00:00+00') TO ('{add_months(month, 1):%Y-%m-%d} 00:00:00+00')"
+        )
+    
+    def _ensure_postgresql(self):
+        with db.engine.begin() as connection:
+            if not self._locked(connection):
+                return
+            if not self._is_partitioned(connection):
+                self._convert_postgresql(connection)
+            
+            connection.exec_driver_sql(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF audit_logs DEFAULT")
+            current = month_start(datetime.now(timezone.utc))
+            for offset in range(self.months_ahead + 1):
+                month = add_months(current, offset)
+                # A month that already has rows in the default partition cannot be attached
+                try:
+                    with connection.begin_nested():
+                        self._create_partition(connection, month)
+                except Exception as e:
+                    self.app.logger.warning(f"Could not create audit partition {partition_name(month)}: {str(e)}")
+    
+    def _convert_postgresql(self, connection):
+        """Replace an unpartitioned audit_logs with a partitioned copy of it (one-time)."""
+        self.app.logger.warning("Converting audit_logs to monthly partitions")
+        
+        connection.exec_driver_sql("LOCK TABLE audit_logs IN ACCESS EXCLUSIVE MODE")
+        connection.exec_driver_sql("UPDATE audit_logs SET created_at = now() WHERE created_at IS NULL")
+        sequence = connection.exec_driver_sql("SELECT pg_get_serial_sequence('audit_logs', 'id')").scalar()
+        months = [
+            month_start(row[0]) for row in connection.exec_driver_sql(
+                "SELECT DISTINCT date_trunc('month', created_at AT TIME ZONE 'UTC') AT TIME ZONE 'UTC' FROM audit_logs"
+            )
+        ]
+        
+        connection.exec_driver_sql("ALTER TABLE audit_logs RENAME TO audit_logs_unpartitioned")
+        connection.exec_driver_sql(
+            "CREATE TABLE audit_logs (LIKE audit_logs_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)"
+        )
+        if sequence:
+            connection.exec_driver_sql(f"ALTER SEQUENCE {sequence} OWNED BY audit_logs.id")
+        
+        for month in months:
+            self._create_partition(connection, month)
+        connection.exec_driver_sql("INSERT INTO audit_logs SELECT * FROM audit_logs_unpartitioned")
+        connection.exec_driver_sql("DROP TABLE audit_logs_unpartitioned")
+        
+        # Constraint and index names are free again only once the old table is gone.
+        # The partition key must be part of the primary key; indexes created on
+        # the parent apply to every partition
+        connection.exec_driver_sql("ALTER TABLE audit_logs ADD PRIMARY KEY (id, created_at)")
+        for name, expression in POSTGRESQL_INDEXES:
+            connection.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {name} ON audit_logs ({expression})")
+    
+    def roll(self):
+        """SQLite: move rows from closed months out of audit_logs into their month tables."""
+        current = month_start(datetime.now(timezone.utc))
+        live = _audit_table()
+        
+        with db.engine.begin() as connection:
+            months = {
+                month_start(datetime.strptime(value, '%Y-%m'))
+                for (value,) in connection.execute(
+                    select(func.distinct(func.substr(live.c.created_at, 1, 7)))
+                    .where(live.c.created_at < current.replace(tzinfo=None))
+                )
+                if value
+            }
+            for month in sorted(months):
+                table = _month_table(partition_name(month))
+                table.create(connection, checkfirst=True)
+                in_month = (
+                    (live.c.created_at >= month.replace(tzinfo=None))
+                    & (live.c.created_at < add_months(month, 1).replace(tzinfo=None))
+                )
+                connection.execute(insert(table).from_select(list(live.c.keys()), select(live).where(in_month)))
+                connection.execute(delete(live).where(in_month))
+    
+    def partitions(self):
+        """Month tables as a sorted list of (name, month start)."""
+        if self.dialect == 'postgresql':
+            statement = text(
+                "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = 'audit_logs'::regclass"
+            )
+        else:
+            statement = text("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'audit_logs_%'")
+        
+        with db.engine.connect() as connection:
+            names = [row[0] for row in connection.execute(statement)]
+        return sorted((name, partition_month(name)) for name in names if partition_month(name))
+    
+    # Reading
+    
+    def source(self, date_from=None, date_to=None):
+        """
+        Selectable to read audit rows from for a date range.
+        
+        Returns None when AuditLog itself covers the range (PostgreSQL prunes
+        partitions on its own); on SQLite, a UNION ALL subquery of the live
+        table and the month tables the range overlaps.
+        """
+        if not self.enabled or self.dialect != 'sqlite':
+            return None
+        
+        live = _audit_table()
+        tables = []
+        for name, month in self.partitions():
+            if date_from and add_months(month, 1) <= month_start(date_from):
+                continue
+            if date_to and month > date_to.replace(tzinfo=date_to.tzinfo or timezone.utc):
+                continue
+            tables.append(_month_table(name))
+        
+        if not tables:
+            return None
+        selects = [select(live)] + [select(*[table.c[column.name] for column in live.columns]) for table in tables]
+        return union_all(*selects).subquery('audit_logs_all')
+    
+    # Retention
+    
+    def archive(self, name):
+        """
+        Write a month table to <archive_dir>/<name>.jsonl.gz.
+        
+        Returns:
+            Tuple of (archive path, number of rows written)
+        """
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = os.path.join(self.archive_dir, f'{name}.jsonl.gz')
+        partial = f'{path}.partial'
+        
+        table = _month_table(name)
+        count = 0
+        with db.engine.connect() as connection, gzip.open(partial, 'wt', encoding='utf-8') as archive:
+            result = connection.execution_options(yield_per=5000).execute(select(table).order_by(table.c.created_at))
+            for row in result:
+                archive.write(json.dumps(dict(row._mapping), default=str) + '\n')
+                count += 1
+        
+        # Only a complete archive gets the final name
+        os.replace(partial, path)
+        return path, count
+    
+    def expire(self, days_to_keep, archive=True):
+        """
+        Drop month tables entirely older than the cutoff, archiving them first.
+        
+        Returns:
+            Dictionary with the dropped tables, archive files and rows removed
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(days=days_to_keep)
+        if self.enabled and self.dialect == 'sqlite':
+            self.roll()  # Closed months first move to tables that can be dropped
+        result = {'cutoff': cutoff.isoformat(), 'dropped': [], 'archives': [], 'rows_removed': 0}
+        
+        for name, month in self.partitions():
+            if add_months(month, 1) > cutoff:
+                continue
+            if archive:
+                path, count = self.archive(name)
+                result['archives'].append(path)
+            else:
+                with db.engine.connect() as connection:
+                    count = connection.execute(select(func.count()).select_from(_month_table(name))).scalar()
+            
+            with db.engine.begin() as connection:
+                if self.dialect == 'postgresql' and not self._locked(connection):
+                    break
+                connection.exec_driver_sql(f'DROP TABLE IF EXISTS {name}')
+            result['dropped'].append(name)
+            result['rows_removed'] += count
+        
+        # Stragglers outside the month tables (PostgreSQL default partition, SQLite live table)
+        if self.dialect == 'postgresql':
+            stragglers, cutoff_value = _month_table(DEFAULT_PARTITION), cutoff
+        else:
+            stragglers, cutoff_value = _audit_table(), cutoff.replace(tzinfo=None)
+        with db.engine.begin() as connection:
+            deleted = connection.execute(delete(stragglers).where(stragglers.c.created_at < cutoff_value))
+            result['rows_removed'] += deleted.rowcount or 0
+        
+        return result
+    
+    # Scheduled maintenance
+    
+    def start_maintenance(self):
+        """Run ensure() (and retention, if AUDIT_RETENTION_DAYS is set) every AUDIT_MAINTENANCE_INTERVAL seconds."""
+        if not self.enabled or not self.interval:
+            return
+        self._scheduled = True
+        self._ensure_maintainer()
+    
+    def _ensure_maintainer(self):
+        # Threads do not survive a fork (gunicorn --preload); worker processes start theirs on their first request
+        if not self._scheduled or self._maintainer_pid == os.getpid():
+            return
+        with self._lock:
+            if self._maintainer_pid == os.getpid():
+                return
+            self._maintainer = threading.Thread(target=self._maintenance_loop, daemon=True, name='audit-partitions')
+            self._maintainer_pid = os.getpid()
+            self._maintainer.start()
+    
+    def _maintenance_loop(self):
+        while True:
+            time.sleep(self.interval)
+            with self.app.app_context():
+                self.ensure()
+                if self.retention_days:
+                    try:
+                        expired = self.expire(self.retention_days)
+                        if expired['dropped']:
+                            self.app.logger.info(f"Expired audit log tables: {', '.join(expired['dropped'])}")
+                    except Exception as e:
+                        self.app.logger.error(f"Audit log retention error: {str(e)}")
+
+# Global audit partition manager instance
+audit_partitions = AuditPartitionManager()
@@ -0,0 +1,382 @@
+"""
+Asynchronous, batched audit log writer.
+
+AuditLogger.log_event only builds the row and puts it on a bounded
+in-memory queue; it never touches the request's session. A background
+thread drains the queue in batches of up to AUDIT_BATCH_SIZE rows (or
+whatever arrived within AUDIT_FLUSH_INTERVAL seconds) and writes each batch
+with one bulk INSERT on its own connection, resolving user emails for the
+whole batch in one query.
+
+When a flush fails or takes longer than AUDIT_SLOW_FLUSH_SECONDS, the writer
+degrades for AUDIT_SPOOL_RETRY_INTERVAL seconds: batches (and events that
+find the queue full) are appended to a local JSONL spool file instead of
+the database. Once the database is healthy again the spool is replayed into
+audit_logs and removed. Every process shares the spool; appends and the
+hand-over to replay hold an fcntl lock on <spool>.lock, and one process at
+a time replays.
+
+A batch the database rejects (rather than one it cannot take) is retried
+row by row. Rows that still fail are appended to <spool>.dead with their
+error instead of blocking the batch, the spool and the writer. Queue
+depth, flush latency and spool counters are available from metrics().
+"""
+
+import atexit
+import contextlib
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from sqlalchemy import insert, select
+from sqlalchemy.exc import InterfaceError, OperationalError
+from src.database import db
+
+try:
+    import fcntl
+except ImportError:  # Not on Windows; the spool is then only guarded within the process
+    fcntl = None
+
+# Errors meaning the database cannot take writes at all, as opposed to rejecting rows
+UNAVAILABLE_ERRORS = (OperationalError, InterfaceError)
+
+class AuditWriter:
+    """Queues audit rows and writes them to audit_logs in batches."""
+    
+    def __init__(self, app=None):
+        self.app = app
+        self.asynchronous = True
+        self.batch_size = 500
+        self.flush_interval = 1.0
+        self.slow_flush_seconds = 2.0
+        self.retry_interval = 30
+        self.spool_path = None
+        self._queue = None
+        self._worker = None
+        self._worker_pid = None
+        self._degraded_until = 0.0
+        self._lock = threading.Lock()
+        self._spool_lock = threading.Lock()
+        self._metrics = {
+            'enqueued': 0,
+            'written': 0,
+            'spooled': 0,
+            'replayed': 0,
+            'dead_lettered': 0,
+            'overflowed': 0,
+            'flushes': 0,
+            'failed_flushes': 0,
+            'slow_flushes': 0,
+            'flush_ms_total': 0.0,
+            'last_flush_ms': None,
+            'max_flush_ms': 0.0
+        }
+        
+        if app:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        """Initialize audit writer with Flask app."""
+        self.app = app
+        self.asynchronous = app.config.get('AUDIT_ASYNC', True)
+        self.batch_size = app.config.get('AUDIT_BATCH_SIZE', 500)
+        self.flush_interval = app.config.get('AUDIT_FLUSH_INTERVAL', 1.0)
+        self.slow_flush_seconds = app.config.get('AUDIT_SLOW_FLUSH_SECONDS', 2.0)
+        self.retry_interval = app.config.get('AUDIT_SPOOL_RETRY_INTERVAL', 30)
+        self.spool_path = app.config.get('AUDIT_SPOOL_PATH') or os.path.join(app.instance_path, 'audit_spool.jsonl')
+        self._queue = queue.Queue(maxsize=app.config.get('AUDIT_QUEUE_SIZE', 10000))
+        atexit.register(self.shutdown)
+    
+    # Producing
+    
+    def enqueue(self, row):
+        """Queue one audit row (a dictionary of AuditLog column values)."""
+        if not self.asynchronous or self._queue is None:
+            self._flush([row])
+            return
+        
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(row)
+            self._metrics['enqueued'] += 1
+        except queue.Full:
+            # Never block the request on auditing; keep the event on disk instead
+            self._metrics['overflowed'] += 1
+            self._spool([row])
+    
+    def _ensure_worker(self):
+        # Threads do not survive a fork; each worker process starts its own
+        if self._worker and self._worker.is_alive() and self._worker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker and self._worker.is_alive() and self._worker_pid == os.getpid():
+                return
+            self._worker = threading.Thread(target=self._run, daemon=True, name='audit-writer')
+            self._worker_pid = os.getpid()
+            self._worker.start()
+    
+    # Writing
+    
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch:
+                self._flush(batch)
+            if not self._degraded():
+                self._replay_spool()
+    
+    def _collect(self):
+        """Up to batch_size rows, waiting at most flush_interval for them."""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+    
+    def _degraded(self):
+        return time.monotonic() < self._degraded_until
+    
+    def _degrade(self):
+        self._degraded_until = time.monotonic() + self.retry_interval
+    
+    def _flush(self, batch):
+        if self._degraded():
+            self._spool(batch)
+            return
+        
+        start = time.perf_counter()
+        written, pending, error = self._write(batch)
+        self._metrics['written'] += written
+        if error is not None:
+            self._metrics['failed_flushes'] += 1
+            self.app.logger.error(f"Audit log flush failed, spooling {len(pending)} events: {str(error)}")
+            self._spool(pending)
+            self._degrade()
+            return
+        
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self._metrics['flushes'] += 1
+        self._metrics['flush_ms_total'] += elapsed_ms
+        self._metrics['last_flush_ms'] = round(elapsed_ms, 2)
+        self._metrics['max_flush_ms'] = max(self._metrics['max_flush_ms'], round(elapsed_ms, 2))
+        
+        if elapsed_ms > self.slow_flush_seconds * 1000:
+            self._metrics['slow_flushes'] += 1
+            self.app.logger.warning(f"Slow audit log flush ({elapsed_ms:.0f} ms); spooling to disk for {self.retry_interval}s")
+            self._degrade()
+    
+    def _write(self, rows):
+        """
+        Insert rows, isolating the ones the database rejects.
+        
+        Returns:
+            (rows written, rows left unwritten because the database is
+            unavailable, that error or None). Rows rejected on their own are
+            dead-lettered.
+        """
+        try:
+            self._insert(rows)
+            return len(rows), [], None
+        except UNAVAILABLE_ERRORS as e:
+            return 0, rows, e
+        except Exception as e:
+            if len(rows) == 1:
+                self._dead_letter(rows, e)
+                return 0, [], None
+            self.app.logger.warning(f"Audit batch of {len(rows)} events rejected, inserting them one by one: {str(e)}")
+        
+        written = 0
+        for index, row in enumerate(rows):
+            try:
+                self._insert([row])
+                written += 1
+            except UNAVAILABLE_ERRORS as e:
+                return written, rows[index:], e
+            except Exception as e:
+                self._dead_letter([row], e)
+        return written, [], None
+    
+    def _insert(self, rows):
+        """Bulk insert rows on a dedicated connection, filling in user emails."""
+        from src.utils.audit import AuditLog
+        from src.models.user import User
+        
+        with self.app.app_context():
+            missing = set()
+            for row in rows:
+                if row.get('user_id') and not row.get('user_email'):
+                    try:
+                        missing.add(uuid.UUID(str(row['user_id'])))
+                    except ValueError:
+                        pass
+            
+            with db.engine.begin() as connection:
+                emails = {}
+                if missing:
+                    emails = {
+                        str(user_id): email
+                        for user_id, email in connection.execute(select(User.id, User.email).where(User.id.in_(missing)))
+                    }
+                
+                columns = AuditLog.__table__.columns.keys()
+                values = []
+                for row in rows:
+                    value = {column: row.get(column) for column in columns if column != 'id'}
+                    if not value['user_email'] and row.get('user_id'):
+                        value['user_email'] = emails.get(str(row['user_id']))
+                    values.append(value)
+                
+                connection.execute(insert(AuditLog.__table__), values)
+    
+    # Spool file
+    
+    @contextlib.contextmanager
+    def _file_lock(self, suffix, blocking=True):
+        """
+        Hold an exclusive fcntl lock on <spool><suffix> across processes.
+        
+        Yields False instead of waiting when blocking is off and another
+        process holds the lock.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(self.spool_path)), exist_ok=True)
+        with open(f'{self.spool_path}{suffix}', 'a') as lock_file:
+            if fcntl is None:
+                yield True
+                return
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def _spool(self, rows):
+        """Append rows to the local spool file."""
+        if not rows:
+            return
+        try:
+            with self._spool_lock, self._file_lock('.lock'):
+                with open(self.spool_path, 'a', encoding='utf-8') as spool:
+                    for row in rows:
+                        spool.write(json.dumps(row, default=str) + '\n')
+            self._metrics['spooled'] += len(rows)
+        except Exception as e:
+            self.app.logger.error(f"Audit spool write failed, {len(rows)} events lost: {str(e)}")
+    
+    def _dead_letter(self, rows, error):
+        """Set aside rows the database rejects, with the error, for manual review."""
+        self.app.logger.error(f"Audit log rejected {len(rows)} events, moving them to the dead-letter file: {str(error)}")
+        try:
+            failed_at = datetime.now(timezone.utc).isoformat()
+            with self._spool_lock, self._file_lock('.lock'):
+                with open(f'{self.spool_path}.dead', 'a', encoding='utf-8') as dead:
+                    for row in rows:
+                        dead.write(json.dumps({'row': row, 'error': str(error), 'failed_at': failed_at}, default=str) + '\n')
+            self._metrics['dead_lettered'] += len(rows)
+        except Exception as e:
+            self.app.logger.error(f"Audit dead-letter write failed, {len(rows)} events lost: {str(e)}")
+    
+    @staticmethod
+    def _decode(line):
+        row = json.loads(line)
+        if row.get('created_at'):
+            row['created_at'] = datetime.fromisoformat(row['created_at'])
+        return row
+    
+    def _replay_spool(self):
+        """Move spooled rows into the database once it is healthy again."""
+        if not self.spool_path or not (os.path.exists(self.spool_path) or os.path.exists(f'{self.spool_path}.replay')):
+            return
+        with self._file_lock('.replay.lock', blocking=False) as acquired:
+            if acquired:  # Otherwise another process is replaying
+                self._replay_locked()
+    
+    def _replay_locked(self):
+        replay_path = f'{self.spool_path}.replay'
+        with self._spool_lock, self._file_lock('.lock'):
+            if not os.path.exists(replay_path):
+                if not os.path.exists(self.spool_path):
+                    return
+                # New events keep spooling to a fresh file while this one replays
+                os.replace(self.spool_path, replay_path)
+        
+        entries = []
+        with open(replay_path, encoding='utf-8') as spool:
+            for line in spool:
+                if not line.strip():
+                    continue
+                try:
+                    entries.append((line, self._decode(line)))
+                except ValueError as e:
+                    self._dead_letter([line.rstrip('\n')], e)
+        
+        replayed = 0
+        for start in range(0, len(entries), self.batch_size):
+            chunk = entries[start:start + self.batch_size]
+            written, pending, error = self._write([row for _, row in chunk])
+            replayed += written
+            self._metrics['replayed'] += written
+            if error is not None:
+                # Keep what is left for the next attempt
+                with open(replay_path, 'w', encoding='utf-8') as spool:
+                    spool.writelines(line for line, _ in entries[start + len(chunk) - len(pending):])
+                self.app.logger.warning(f"Audit spool replay paused: {str(error)}")
+                self._degrade()
+                return
+        
+        os.remove(replay_path)
+        self.app.logger.info(f"Replayed {replayed} spooled audit events")
+    
+    # Lifecycle and metrics
+    
+    def flush_pending(self):
+        """Write everything still queued (used at shutdown)."""
+        if self._queue is None:
+            return
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch = []
+        if batch:
+            self._flush(batch)
+    
+    def shutdown(self):
+        try:
+            self.flush_pending()
+        except Exception:
+            pass  # Interpreter shutdown; anything left is lost
+    
+    def metrics(self):
+        """Queue depth, flush latency and spool counters."""
+        metrics = dict(self._metrics)
+        flush_ms_total = metrics.pop('flush_ms_total')
+        metrics['avg_flush_ms'] = round(flush_ms_total / metrics['flushes'], 2) if metrics['flushes'] else None
+        metrics['queue_depth'] = self._queue.qsize() if self._queue else 0
+        metrics['queue_capacity'] = self._queue.maxsize if self._queue else 0
+        metrics['degraded'] = self._degraded()
+        metrics['spool_bytes'] = sum(
+            os.path.getsize(path)
+            for path in (self.spool_path, f'{self.spool_path}.replay')
+            if path and os.path.exists(path)
+        )
+        return metrics
+
+# Global audit writer instance
+audit_writer = AuditWriter()
@@ -0,0 +1,244 @@
+"""
+In-memory type-ahead index for animals.
+
+Every live animal contributes lower-cased keys for its animal ID, microchip,
+name (and each later word of the name) and active internal numbers. The
+keys live in one sorted list of (key, animal id, kind) tuples, so a prefix
+lookup is a bisect to the first key >= prefix followed by a short forward
+scan; shorter keys sort first, which puts exact matches at the top.
+
+The index is built from one streamed query at startup. Committed changes
+arrive through cache_invalidator subscriptions (including ones published by
+other worker processes) as animal ids to refresh; they are re-read in one
+batch before the next lookup. Bulk writes, large batches, and the
+AUTOCOMPLETE_INDEX_TTL timer trigger a full rebuild in a background thread
+while lookups keep using the current index.
+"""
+
+import threading
+import time
+from bisect import bisect_left, insort
+from sqlalchemy import select, and_
+from src.database import db
+from src.utils.genotype_store import as_uuid
+
+REBUILD_THRESHOLD = 500  # Pending animal refreshes above which a full rebuild is cheaper
+STREAM_BATCH_SIZE = 5000
+
+def normalize(text):
+    return text.strip().lower()
+
+def _keys_for(record):
+    """(key, kind) pairs an animal is found under."""
+    keys = set()
+    if record['animal_id']:
+        keys.add((normalize(record['animal_id']), 'animal_id'))
+    if record['microchip']:
+        keys.add((normalize(record['microchip']), 'microchip'))
+    if record['name']:
+        name = normalize(record['name'])
+        keys.add((name, 'name'))
+        # Later words too, so 'bolt' finds 'Thunder Bolt'
+        for word in name.split()[1:]:
+            keys.add((word, 'name'))
+    for number in record['internal_numbers']:
+        keys.add((normalize(number), 'internal_number'))
+    return [key for key in keys if key[0]]
+
+class AnimalAutocomplete:
+    """Sorted prefix index over animal identifiers and names."""
+    
+    def __init__(self, app=None, invalidator=None):
+        self.app = app
+        self.ttl = None
+        self._entries = []  # Sorted (key, animal id, kind)
+        self._animals = {}  # animal id -> (record, entries)
+        self._built_at = None
+        self._stale = set()  # Animal ids committed since they were last read
+        self._rebuild_requested = False
+        self._rebuilding = False
+        self._lock = threading.RLock()
+        
+        if app:
+            self.init_app(app, invalidator)
+    
+    def init_app(self, app, invalidator):
+        """Initialize autocomplete with Flask app and subscribe to committed changes."""
+        self.app = app
+        self.ttl = app.config.get('AUTOCOMPLETE_INDEX_TTL', 3600)
+        invalidator.subscribe(self._on_invalidate)
+    
+    # Loading
+    
+    @staticmethod
+    def _statement(animal_ids=None):
+        from src.models.animal import Animal, AnimalInternalNumber
+        
+        statement = select(
+            Animal.id, Animal.animal_id, Animal.name, Animal.microchip, Animal.species, Animal.status,
+            AnimalInternalNumber.internal_number
+        ).outerjoin(
+            AnimalInternalNumber,
+            and_(AnimalInternalNumber.animal_id == Animal.id, AnimalInternalNumber.is_active.is_(True))
+        ).where(Animal.deleted_at.is_(None))
+        
+        if animal_ids is not None:
+            statement = statement.where(Animal.id.in_([as_uuid(animal) for animal in animal_ids]))
+        return statement
+    
+    def _load(self, animal_ids=None):
+        """Records and internal numbers of live animals, streamed from a dedicated connection."""
+        records = {}
+        with db.engine.connect() as connection:
+            result = connection.execution_options(yield_per=STREAM_BATCH_SIZE).execute(self._statement(animal_ids))
+            for row in result:
+                animal = str(row.id)
+                if animal not in records:
+                    records[animal] = {
+                        'id': animal,
+                        'animal_id': row.animal_id,
+                        'name': row.name,
+                        'microchip': row.microchip,
+                        'species': row.species,
+                        'status': row.status,
+                        'internal_numbers': []
+                    }
+                if row.internal_number:
+                    records[animal]['internal_numbers'].append(row.internal_number)
+        return records
+    
+    def build(self):
+        """Rebuild the whole index from one streamed query."""
+        with self._lock:
+            # Changes committed from here on are re-applied after the swap
+            self._stale.clear()
+            self._rebuild_requested = False
+        
+        records = self._load()
+        
+        entries = []
+        animals = {}
+        for animal, record in records.items():
+            animal_entries = [(key, animal, kind) for key, kind in _keys_for(record)]
+            entries.extend(animal_entries)
+            animals[animal] = (record, animal_entries)
+        entries.sort()
+        
+        with self._lock:
+            self._entries = entries
+            self._animals = animals
+            self._built_at = time.monotonic()
+    
+    def _refresh(self, animal_ids):
+        """Re-read a few animals and replace their entries in place."""
+        records = self._load(animal_ids)
+        
+        with self._lock:
+            for animal in animal_ids:
+                _, old_entries = self._animals.pop(animal, (None, []))
+                for entry in old_entries:
+                    index = bisect_left(self._entries, entry)
+                    if index < len(self._entries) and self._entries[index] == entry:
+                        del self._entries[index]
+                
+                if animal in records:
+                    record = records[animal]
+                    new_entries = [(key, animal, kind) for key, kind in _keys_for(record)]
+                    for entry in new_entries:
+                        insort(self._entries, entry)
+                    self._animals[animal] = (record, new_entries)
+    
+    def _on_invalidate(self, tags, remote):
+        animal_ids = {tag.split(':', 1)[1] for tag in tags if tag.startswith('animal:')}
+        with self._lock:
+            if animal_ids:
+                self._stale.update(animal_ids)
+            elif 'animals' in tags:
+                # Bulk statement: the affected rows are unknown
+                self._rebuild_requested = True
+    
+    def _start_rebuild(self):
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        
+        def rebuild():
+            with self.app.app_context():
+                try:
+                    self.build()
+                except Exception as e:
+                    self.app.logger.error(f"Autocomplete index rebuild error: {str(e)}")
+                finally:
+                    self._rebuilding = False
+        
+        threading.Thread(target=rebuild, daemon=True, name='autocomplete-rebuild').start()
+    
+    def _ensure_current(self):
+        if self._built_at is None:
+            self.build()
+            return
+        
+        with self._lock:
+            expired = self.ttl and time.monotonic() - self._built_at > self.ttl
+            if self._rebuilding:
+                # Refreshed rows could be overwritten by the older snapshot; apply after the swap
+                return
+            if self._rebuild_requested or expired or len(self._stale) > REBUILD_THRESHOLD:
+                rebuild = True
+                stale = set()
+            else:
+                rebuild = False
+                stale, self._stale = self._stale, set()
+        
+        if rebuild:
+            self._start_rebuild()
+        elif stale:
+            self._refresh(sorted(stale))
+    
+    def stats(self):
+        """Index size and age."""
+        with self._lock:
+            if self._built_at is None:
+                return {'built': False}
+            return {
+                'built': True,
+                'animals': len(self._animals),
+                'keys': len(self._entries),
+                'pending_refresh': len(self._stale),
+                'age_seconds': round(time.monotonic() - self._built_at, 1)
+            }
+    
+    # Lookup
+    
+    def suggest(self, prefix, limit=10):
+        """
+        Animals with a key starting with prefix, shortest (closest) keys first.
+        
+        Returns:
+            List of animal summaries, each naming the field that matched
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        
+        self._ensure_current()
+        
+        suggestions = []
+        seen = set()
+        with self._lock:
+            entries = self._entries
+            index = bisect_left(entries, (prefix,))
+            while index < len(entries) and len(suggestions) < limit:
+                key, animal, kind = entries[index]
+                if not key.startswith(prefix):
+                    break
+                if animal not in seen:
+                    seen.add(animal)
+                    suggestions.append({**self._animals[animal][0], 'matched': kind})
+                index += 1
+        
+        return suggestions
+
+# Global animal autocomplete index instance
+animal_autocomplete = AnimalAutocomplete()
@@ -1,21 +1,245 @@
 """
 Caching utilities for improved performance.
+
+CacheManager is the application's single cache facade. It is two-tier: a
+bounded in-process MemoryCache (L1) in front of Redis (L2). Reads check L1
+first and populate it from Redis on a miss, so hot keys are served without a
+network round trip. L1 entries live for at most the namespace's L1 TTL, which
+bounds how stale another worker's write can look. Without Redis the memory
+tier is used alone with the full timeout.
+
+Keys are content-addressed (a SHA-256 of the canonical JSON of the
+arguments), so every worker process derives the same key for the same call.
+Values go through a pluggable serializer (json, msgpack or pickle).
 """
 
 import json
 import hashlib
-from datetime import datetime, timedelta
+import pickle
+import threading
+import time
+import zlib
+from collections import OrderedDict
 from functools import wraps
 from flask import current_app, request
 import redis
 
+try:
+    import msgpack
+except ImportError:  # Optional serializer
+    msgpack = None
+
+TAG_KEY_PREFIX = 'cache_tag:'  # Redis/L1 key holding a tag's current version
+TAGS_FIELD = '__cache_tags__'  # Envelope field recording tag versions at write time
+
+def key_namespace(key):
+    """Namespace of a cache key: the part before the first ':'."""
+    return key.split(':', 1)[0]
+
+def parse_namespace_ttls(value):
+    """Parse "stats=3600,response=60" into {'stats': 3600, 'response': 60}."""
+    ttls = {}
+    for item in (value or '').split(','):
+        if '=' in item:
+            namespace, ttl = item.split('=', 1)
+            ttls[namespace.strip()] = int(ttl)
+    return ttls
+
+def make_cache_key(prefix, *args, **kwargs):
+    """Stable, content-addressed cache key for a call's arguments."""
+    key_data = {
+        'args': args,
+        'kwargs': sorted(kwargs.items()) if kwargs else {}
+    }
+    key_string = json.dumps(key_data, sort_keys=True, default=str)
+    return f"{prefix}:{hashlib.sha256(key_string.encode()).hexdigest()}"
+
+class JSONSerializer:
+    name = 'json'
+    
+    def dumps(self, value):
+        return json.dumps(value, default=str).encode('utf-8')
+    
+    def loads(self, payload):
+        return json.loads(payload)
+
+class MsgpackSerializer:
+    name = 'msgpack'
+    
+    def dumps(self, value):
+        return msgpack.packb(value, default=str, use_bin_type=True)
+    
+    def loads(self, payload):
+        return msgpack.unpackb(payload, raw=False)
+
+class PickleSerializer:
+    """Pickle serializer; only for caches whose Redis instance is fully trusted."""
+    name = 'pickle'
+    
+    def dumps(self, value):
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    
+    def loads(self, payload):
+        return pickle.loads(payload)
+
+def get_serializer(name):
+    """Serializer instance for a CACHE_SERIALIZER name."""
+    name = (name or 'json').lower()
+    if name == 'json':
+        return JSONSerializer()
+    if name == 'msgpack':
+        if msgpack is None:
+            raise ValueError('CACHE_SERIALIZER=msgpack requires the msgpack package')
+        return MsgpackSerializer()
+    if name == 'pickle':
+        return PickleSerializer()
+    raise ValueError(f'Unknown cache serializer: {name}')
+
+class MemoryCache:
+    """
+    Thread-safe, size-bounded LRU cache.
+    
+    Keys are spread over independently locked segments so concurrent workers
+    rarely contend. Each segment evicts its least recently used entries once
+    it exceeds its share of the entry or byte budget. Values are stored in
+    serialized form, so callers never share mutable objects and the byte
+    budget is exact.
+    """
+    
+    def __init__(self, max_entries=10000, max_bytes=64 * 1024 * 1024, segments=16):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._segments = [OrderedDict() for _ in range(segments)]
+        self._segment_bytes = [0] * segments
+        self._locks = [threading.Lock() for _ in range(segments)]
+        self._entry_limit = max(1, max_entries // segments)
+        self._byte_limit = max(1, max_bytes // segments)
+        self._stats_lock = threading.Lock()
+        self._stats = {}
+    
+    def _segment(self, key):
+        return zlib.crc32(key.encode('utf-8')) % len(self._segments)
+    
+    def _count(self, key, counter):
+        namespace = key_namespace(key)
+        with self._stats_lock:
+            counters = self._stats.setdefault(namespace, {
+                'hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0, 'expirations': 0
+            })
+            counters[counter] += 1
+    
+    def get(self, key):
+        """Return the serialized value for key, or None."""
+        index = self._segment(key)
+        segment = self._segments[index]
+        
+        with self._locks[index]:
+            entry = segment.get(key)
+            if entry is not None:
+                payload, expires_at = entry
+                if expires_at > time.monotonic():
+                    segment.move_to_end(key)
+                    hit = True
+                else:
+                    del segment[key]
+                    self._segment_bytes[index] -= len(payload)
+                    hit = None
+            else:
+                hit = False
+        
+        if hit:
+            self._count(key, 'hits')
+            return payload
+        if hit is None:
+            self._count(key, 'expirations')
+        self._count(key, 'misses')
+        return None
+    
+    def set(self, key, payload, timeout):
+        """Store a serialized value for timeout seconds, evicting LRU entries as needed."""
+        size = len(payload)
+        if size > self._byte_limit:
+            return False
+        
+        index = self._segment(key)
+        segment = self._segments[index]
+        evicted = []
+        
+        with self._locks[index]:
+            previous = segment.pop(key, None)
+            if previous is not None:
+                self._segment_bytes[index] -= len(previous[0])
+            
+            segment[key] = (payload, time.monotonic() + timeout)
+            self._segment_bytes[index] += size
+            
+            while len(segment) > self._entry_limit or self._segment_bytes[index] > self._byte_limit:
+                evicted_key, (evicted_payload, _) = segment.popitem(last=False)
+                self._segment_bytes[index] -= len(evicted_payload)
+                evicted.append(evicted_key)
+        
+        self._count(key, 'sets')
+        for evicted_key in evicted:
+            self._count(evicted_key, 'evictions')
+        return True
+    
+    def delete(self, key):
+        index = self._segment(key)
+        with self._locks[index]:
+            entry = self._segments[index].pop(key, None)
+            if entry is not None:
+                self._segment_bytes[index] -= len(entry[0])
+        return entry is not None
+    
+    def clear(self, pattern=None):
+        """Remove all entries, or those whose key contains pattern."""
+        removed = 0
+        for index, segment in enumerate(self._segments):
+            with self._locks[index]:
+                if pattern:
+                    keys = [key for key in segment if pattern in key]
+                else:
+                    keys = list(segment)
+                for key in keys:
+                    self._segment_bytes[index] -= len(segment.pop(key)[0])
+                removed += len(keys)
+        return removed
+    
+    def get_stats(self):
+        """Size, budget and per-namespace hit/miss/eviction counters."""
+        with self._stats_lock:
+            namespaces = {namespace: dict(counters) for namespace, counters in self._stats.items()}
+        
+        totals = {'hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0, 'expirations': 0}
+        for counters in namespaces.values():
+            for counter, value in counters.items():
+                totals[counter] += value
+        
+        lookups = totals['hits'] + totals['misses']
+        return {
+            'entries': sum(len(segment) for segment in self._segments),
+            'bytes': sum(self._segment_bytes),
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'hit_rate_percentage': round(totals['hits'] / lookups * 100, 2) if lookups else 0,
+            **totals,
+            'namespaces': namespaces
+        }
+
 class CacheManager:
     """Cache manager for handling different cache backends."""
     
     def __init__(self, app=None):
         self.app = app
         self.redis_client = None
-        self.memory_cache = {}
+        self.memory_cache = MemoryCache()
+        self.serializer = JSONSerializer()
+        self.l1_ttl = 30
+        self.namespace_ttls = {}
+        self._local_tag_versions = {}  # Tag versions when running without Redis
+        self._tag_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
         
         if app:
             self.init_app(app)
@@ -23,142 +247,456 @@ class CacheManager:
     def init_app(self, app):
         """Initialize cache with Flask app."""
         self.app = app
+        self.serializer = get_serializer(app.config.get('CACHE_SERIALIZER', 'json'))
+        
+        # In-process tier
+        self.memory_cache = MemoryCache(
+            max_entries=app.config.get('CACHE_L1_MAX_ENTRIES', 10000),
+            max_bytes=app.config.get('CACHE_L1_MAX_BYTES', 64 * 1024 * 1024)
+        )
+        self.l1_ttl = app.config.get('CACHE_L1_TTL', 30)
+        self.namespace_ttls = parse_namespace_ttls(app.config.get('CACHE_NAMESPACE_TTLS'))
         
         # Try to connect to Redis if configured
-        redis_url = app.config.get('RATELIMIT_STORAGE_URL', 'redis://localhost:6379')
+        redis_url = app.config.get('CACHE_REDIS_URL') or app.config.get('RATELIMIT_STORAGE_URL', 'redis://localhost:6379')
         try:
-            self.redis_client = redis.from_url(redis_url, decode_responses=True)
+            self.redis_client = redis.from_url(redis_url)
             self.redis_client.ping()  # Test connection
             app.logger.info("Redis cache connected successfully")
         except Exception as e:
             app.logger.warning(f"Redis not available, using memory cache: {str(e)}")
             self.redis_client = None
     
-    def _generate_cache_key(self, prefix, *args, **kwargs):
-        """Generate a cache key from arguments."""
-        key_data = {
-            'args': args,
-            'kwargs': sorted(kwargs.items()) if kwargs else {}
+    # Statistics
+    
+    def _reset_stats(self):
+        self._prefix_stats = {}
+        self._total_time = 0.0
+        self._lookups = 0
+    
+    def _record(self, key, counter, elapsed=None):
+        namespace = key_namespace(key)
+        with self._stats_lock:
+            counters = self._prefix_stats.setdefault(namespace, {
+                'l1_hits': 0, 'l2_hits': 0, 'misses': 0, 'stale': 0, 'sets': 0, 'deletes': 0,
+                'invalidations': 0, 'errors': 0
+            })
+            counters[counter] += 1
+            if elapsed is not None:
+                self._lookups += 1
+                self._total_time += elapsed
+    
+    def get_stats(self):
+        """Consolidated statistics for both tiers, overall and per key prefix."""
+        with self._stats_lock:
+            prefixes = {namespace: dict(counters) for namespace, counters in self._prefix_stats.items()}
+            lookups = self._lookups
+            total_time = self._total_time
+        
+        for counters in prefixes.values():
+            hits = counters['l1_hits'] + counters['l2_hits']
+            requests = hits + counters['misses']
+            counters['hit_rate_percentage'] = round(hits / requests * 100, 2) if requests else 0
+        
+        l1_hits = sum(counters['l1_hits'] for counters in prefixes.values())
+        l2_hits = sum(counters['l2_hits'] for counters in prefixes.values())
+        misses = sum(counters['misses'] for counters in prefixes.values())
+        total_requests = l1_hits + l2_hits + misses
+        
+        return {
+            'backend': 'redis' if self.redis_client else 'memory',
+            'serializer': self.serializer.name,
+            'total_requests': total_requests,
+            'cache_hits': l1_hits + l2_hits,
+            'cache_misses': misses,
+            'l1_hits': l1_hits,
+            'l2_hits': l2_hits,
+            'hit_rate_percentage': round((l1_hits + l2_hits) / total_requests * 100, 2) if total_requests else 0,
+            'avg_response_time_ms': round(total_time / lookups * 1000, 3) if lookups else 0,
+            'prefixes': prefixes,
+            'l1_ttl': self.l1_ttl,
+            'namespace_ttls': self.namespace_ttls,
+            'memory': self.memory_cache.get_stats(),
+            'redis_info': self._get_redis_info()
         }
-        key_string = json.dumps(key_data, sort_keys=True, default=str)
-        key_hash = hashlib.md5(key_string.encode()).hexdigest()
-        return f"{prefix}:{key_hash}"
+    
+    def reset_stats(self):
+        with self._stats_lock:
+            self._reset_stats()
+    
+    def _get_redis_info(self):
+        """Get Redis server information."""
+        if not self.redis_client:
+            return {'status': 'Redis not connected'}
+        try:
+            info = self.redis_client.info()
+            return {
+                'redis_version': info.get('redis_version', 'Unknown'),
+                'used_memory_human': info.get('used_memory_human', 'Unknown'),
+                'connected_clients': info.get('connected_clients', 0),
+                'total_commands_processed': info.get('total_commands_processed', 0)
+            }
+        except Exception as e:
+            current_app.logger.error(f"Error getting Redis info: {str(e)}")
+            return {'status': 'Redis info unavailable'}
+    
+    # Keys
+    
+    def make_key(self, prefix, *args, **kwargs):
+        """Generate a stable cache key from arguments."""
+        return make_cache_key(prefix, *args, **kwargs)
+    
+    _generate_cache_key = make_key
+    
+    def _l1_timeout(self, key, timeout):
+        """L1 lifetime: the namespace (or default) L1 TTL, capped by the entry timeout."""
+        if not self.redis_client:
+            return timeout
+        return min(timeout, self.namespace_ttls.get(key_namespace(key), self.l1_ttl))
+    
+    # Reads
+    
+    def _fetch_payloads(self, keys):
+        """Serialized payloads for keys: L1 first, then one Redis round trip for the rest."""
+        found = {}
+        missing = []
+        for key in keys:
+            payload = self.memory_cache.get(key)
+            if payload is not None:
+                found[key] = ('l1_hits', payload)
+            else:
+                missing.append(key)
+        
+        if missing and self.redis_client:
+            if len(missing) == 1:
+                payloads = [self.redis_client.get(missing[0])]
+            else:
+                payloads = self.redis_client.mget(missing)
+            
+            for key, payload in zip(missing, payloads):
+                if payload is not None:
+                    # Read-through: keep the hot key in process
+                    self.memory_cache.set(key, payload, self._l1_timeout(key, self.l1_ttl))
+                    found[key] = ('l2_hits', payload)
+        
+        return found
+    
+    def _decode(self, found):
+        """Deserialize payloads, dropping tagged entries whose tag versions have moved on."""
+        values = {}
+        tagged = {}
+        for key, (tier, payload) in found.items():
+            value = self.serializer.loads(payload)
+            if isinstance(value, dict) and TAGS_FIELD in value:
+                tagged[key] = (tier, value)
+            else:
+                values[key] = (tier, value)
+        
+        if tagged:
+            tags = set()
+            for _, envelope in tagged.values():
+                tags.update(envelope[TAGS_FIELD])
+            current = self.tag_versions(tags)
+            
+            for key, (tier, envelope) in tagged.items():
+                if all(current.get(tag, 0) == version for tag, version in envelope[TAGS_FIELD].items()):
+                    values[key] = (tier, envelope['value'])
+                else:
+                    # Stale: a tag was invalidated after this entry was written
+                    self.memory_cache.delete(key)
+                    self._record(key, 'stale')
+        
+        return values
     
     def get(self, key):
         """Get value from cache."""
+        started = time.perf_counter()
         try:
-            if self.redis_client:
-                value = self.redis_client.get(key)
-                if value:
-                    return json.loads(value)
-            else:
-                # Memory cache with expiration check
-                if key in self.memory_cache:
-                    data, expires_at = self.memory_cache[key]
-                    if datetime.utcnow() < expires_at:
-                        return data
-                    else:
-                        del self.memory_cache[key]
+            values = self._decode(self._fetch_payloads([key]))
+            if key in values:
+                tier, value = values[key]
+                self._record(key, tier, time.perf_counter() - started)
+                return value
+            
+            self._record(key, 'misses', time.perf_counter() - started)
             return None
         except Exception as e:
+            self._record(key, 'errors')
             current_app.logger.error(f"Cache get error: {str(e)}")
             return None
     
-    def set(self, key, value, timeout=300):
-        """Set value in cache with timeout in seconds."""
+    def get_many(self, keys):
+        """
+        Get several keys: L1 first, then one Redis MGET for the rest.
+        
+        Returns:
+            Dictionary of key -> value for the keys found
+        """
+        started = time.perf_counter()
+        results = {}
         try:
+            values = self._decode(self._fetch_payloads(keys))
+            for key in keys:
+                if key in values:
+                    tier, results[key] = values[key]
+                    self._record(key, tier)
+                else:
+                    self._record(key, 'misses')
+            
+            with self._stats_lock:
+                self._lookups += 1
+                self._total_time += time.perf_counter() - started
+        except Exception as e:
+            current_app.logger.error(f"Cache get_many error: {str(e)}")
+        
+        return results
+    
+    # Writes
+    
+    def _wrap(self, value, tags):
+        """Envelope recording tag versions; tags may be names or pre-read {tag: version}."""
+        if tags is None:
+            return value
+        versions = tags if isinstance(tags, dict) else self.tag_versions(tags)
+        return {TAGS_FIELD: versions, 'value': value}
+    
+    def set(self, key, value, timeout=300, tags=None):
+        """
+        Set value in cache with timeout in seconds.
+        
+        Entries written with tags are treated as misses once any of those
+        tags is invalidated. Pass the dict returned by tag_versions() (read
+        before computing the value) to avoid caching data computed before a
+        concurrent invalidation.
+        """
+        try:
+            payload = self.serializer.dumps(self._wrap(value, tags))
             if self.redis_client:
-                self.redis_client.setex(key, timeout, json.dumps(value, default=str))
-            else:
-                # Memory cache
-                expires_at = datetime.utcnow() + timedelta(seconds=timeout)
-                self.memory_cache[key] = (value, expires_at)
-                
-                # Clean up expired entries periodically
-                if len(self.memory_cache) > 1000:
-                    self._cleanup_memory_cache()
+                self.redis_client.setex(key, timeout, payload)
+            self.memory_cache.set(key, payload, self._l1_timeout(key, timeout))
+            self._record(key, 'sets')
+            return True
         except Exception as e:
+            self._record(key, 'errors')
             current_app.logger.error(f"Cache set error: {str(e)}")
+            return False
     
     def delete(self, key):
-        """Delete value from cache."""
+        """Delete value from cache. Returns True if the key existed."""
         try:
+            existed = self.memory_cache.delete(key)
             if self.redis_client:
-                self.redis_client.delete(key)
-            else:
-                self.memory_cache.pop(key, None)
+                existed = bool(self.redis_client.delete(key)) or existed
+            self._record(key, 'deletes')
+            return existed
         except Exception as e:
+            self._record(key, 'errors')
             current_app.logger.error(f"Cache delete error: {str(e)}")
+            return False
+    
+    # Multi-key operations
+    
+    def set_many(self, mapping, timeout=300, tags=None):
+        """Set several keys with one pipelined Redis round trip."""
+        try:
+            if tags is not None and not isinstance(tags, dict):
+                tags = self.tag_versions(tags)
+            payloads = {key: self.serializer.dumps(self._wrap(value, tags)) for key, value in mapping.items()}
+            if self.redis_client and payloads:
+                pipeline = self.redis_client.pipeline(transaction=False)
+                for key, payload in payloads.items():
+                    pipeline.setex(key, timeout, payload)
+                pipeline.execute()
+            for key, payload in payloads.items():
+                self.memory_cache.set(key, payload, self._l1_timeout(key, timeout))
+                self._record(key, 'sets')
+            return True
+        except Exception as e:
+            current_app.logger.error(f"Cache set_many error: {str(e)}")
+            return False
+    
+    def delete_many(self, keys):
+        """Delete several keys with one Redis round trip."""
+        try:
+            for key in keys:
+                self.memory_cache.delete(key)
+                self._record(key, 'deletes')
+            if self.redis_client and keys:
+                self.redis_client.delete(*keys)
+            return True
+        except Exception as e:
+            current_app.logger.error(f"Cache delete_many error: {str(e)}")
+            return False
     
     def clear(self, pattern=None):
-        """Clear cache entries matching pattern."""
+        """
+        Clear cache entries matching pattern.
+        
+        Redis keys are found with incremental SCAN rather than KEYS so a large
+        keyspace never blocks the server. Prefer invalidate_tags() for
+        routine invalidation.
+        """
         try:
+            self.memory_cache.clear(pattern.replace('*', '') if pattern else None)
             if self.redis_client:
                 if pattern:
-                    keys = self.redis_client.keys(pattern)
-                    if keys:
-                        self.redis_client.delete(*keys)
+                    batch = []
+                    for key in self.redis_client.scan_iter(match=pattern, count=1000):
+                        batch.append(key)
+                        if len(batch) >= 500:
+                            self.redis_client.delete(*batch)
+                            batch = []
+                    if batch:
+                        self.redis_client.delete(*batch)
                 else:
                     self.redis_client.flushdb()
-            else:
-                if pattern:
-                    # Simple pattern matching for memory cache
-                    keys_to_delete = [k for k in self.memory_cache.keys() if pattern in k]
-                    for key in keys_to_delete:
-                        del self.memory_cache[key]
-                else:
-                    self.memory_cache.clear()
+            if not pattern:
+                with self._tag_lock:
+                    self._local_tag_versions.clear()
+            return True
         except Exception as e:
             current_app.logger.error(f"Cache clear error: {str(e)}")
+            return False
+    
+    def clear_all(self):
+        """Clear every cache entry."""
+        return self.clear()
+    
+    # Tags
+    
+    def tag_versions(self, tags):
+        """Current version of each tag (0 if never invalidated)."""
+        tags = list(tags)
+        if not self.redis_client:
+            with self._tag_lock:
+                return {tag: self._local_tag_versions.get(tag, 0) for tag in tags}
+        
+        versions = {}
+        missing = []
+        for tag in tags:
+            payload = self.memory_cache.get(TAG_KEY_PREFIX + tag)
+            if payload is not None:
+                versions[tag] = int(payload)
+            else:
+                missing.append(tag)
+        
+        if missing:
+            tag_keys = [TAG_KEY_PREFIX + tag for tag in missing]
+            for tag, tag_key, value in zip(missing, tag_keys, self.redis_client.mget(tag_keys)):
+                versions[tag] = int(value) if value else 0
+                self.memory_cache.set(tag_key, str(versions[tag]).encode(), self._l1_timeout(tag_key, self.l1_ttl))
+        
+        return versions
+    
+    def seed_tags(self, tags):
+        """
+        Current version of each tag, first giving tags without one a clock-based version.
+        
+        A tag key lost to Redis eviction or a flush reads back as 0. Seeding
+        it with the time in milliseconds rather than counting from 1 keeps a
+        re-created key ahead of every version handed out before the loss.
+        """
+        tags = list(tags)
+        versions = self.tag_versions(tags)
+        missing = [tag for tag in tags if not versions[tag]]
+        if not missing or not self.redis_client:
+            return versions
+        
+        try:
+            pipeline = self.redis_client.pipeline(transaction=False)
+            for tag in missing:
+                pipeline.set(TAG_KEY_PREFIX + tag, int(time.time() * 1000), nx=True)
+            pipeline.execute()
+            for tag in missing:
+                self.memory_cache.delete(TAG_KEY_PREFIX + tag)
+            return self.tag_versions(tags)
+        except Exception as e:
+            current_app.logger.error(f"Cache tag seeding error: {str(e)}")
+            return versions
     
-    def _cleanup_memory_cache(self):
-        """Clean up expired entries from memory cache."""
-        now = datetime.utcnow()
-        expired_keys = [
-            key for key, (_, expires_at) in self.memory_cache.items()
-            if now >= expires_at
-        ]
-        for key in expired_keys:
-            del self.memory_cache[key]
+    def invalidate_tags(self, *tags):
+        """
+        Invalidate every entry written with any of these tags in O(1) per tag.
+        
+        Bumps the tag versions; entries carrying an older version are
+        skipped on read and age out on their own timeout.
+        """
+        tags = [tag for tag in tags if tag]
+        if not tags:
+            return {}
+        
+        try:
+            if self.redis_client:
+                pipeline = self.redis_client.pipeline(transaction=False)
+                for tag in tags:
+                    pipeline.incr(TAG_KEY_PREFIX + tag)
+                versions = dict(zip(tags, pipeline.execute()))
+                for tag, version in versions.items():
+                    tag_key = TAG_KEY_PREFIX + tag
+                    self.memory_cache.set(tag_key, str(version).encode(), self._l1_timeout(tag_key, self.l1_ttl))
+            else:
+                with self._tag_lock:
+                    for tag in tags:
+                        self._local_tag_versions[tag] = self._local_tag_versions.get(tag, 0) + 1
+                    versions = {tag: self._local_tag_versions[tag] for tag in tags}
+            
+            for tag in tags:
+                self._record(tag, 'invalidations')
+            return versions
+        except Exception as e:
+            current_app.logger.error(f"Cache tag invalidation error: {str(e)}")
+            return {}
 
 # Global cache instance
 cache = CacheManager()
 
-def cached(timeout=300, key_prefix=None):
+def _resolve_tags(tags, *args, **kwargs):
+    """Tags may be a list of names or a callable building them from the call's arguments."""
+    if callable(tags):
+        return list(tags(*args, **kwargs))
+    return list(tags) if tags else None
+
+def cached(timeout=300, key_prefix=None, tags=None):
     """
     Decorator to cache function results.
     
     Args:
         timeout: Cache timeout in seconds (default: 5 minutes)
         key_prefix: Custom prefix for cache key
+        tags: Tags the result depends on, or callable(*args, **kwargs) returning them
     """
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
             # Generate cache key
             prefix = key_prefix or f"{f.__module__}.{f.__name__}"
-            cache_key = cache._generate_cache_key(prefix, *args, **kwargs)
+            cache_key = cache.make_key(prefix, *args, **kwargs)
             
             # Try to get from cache
             cached_result = cache.get(cache_key)
             if cached_result is not None:
                 return cached_result
             
+            # Read tag versions before computing so a concurrent invalidation wins
+            entry_tags = _resolve_tags(tags, *args, **kwargs)
+            versions = cache.tag_versions(entry_tags) if entry_tags else None
+            
             # Execute function and cache result
             result = f(*args, **kwargs)
-            cache.set(cache_key, result, timeout)
+            cache.set(cache_key, result, timeout, tags=versions)
             
             return result
         return decorated_function
     return decorator
 
-def cache_response(timeout=300, vary_on=None):
+def cache_response(timeout=300, vary_on=None, tags=None):
     """
     Decorator to cache HTTP response based on request parameters.
     
     Args:
         timeout: Cache timeout in seconds
         vary_on: List of request parameters to include in cache key
+        tags: Tags the response depends on, or callable(**view_args) returning them
     """
     def decorator(f):
         @wraps(f)
@@ -182,12 +720,15 @@ def cache_response(timeout=300, vary_on=None):
             if cached_result is not None:
                 return cached_result
             
+            entry_tags = _resolve_tags(tags, *args, **kwargs)
+            versions = cache.tag_versions(entry_tags) if entry_tags else None
+            
             # Execute function and cache result
             result = f(*args, **kwargs)
             
             # Only cache successful responses
             if hasattr(result, 'status_code') and result.status_code == 200:
-                cache.set(cache_key, result.get_json(), timeout)
+                cache.set(cache_key, result.get_json(), timeout, tags=versions)
             
             return result
         return decorated_function
@@ -197,6 +738,10 @@ def invalidate_cache(pattern):
     """Invalidate cache entries matching pattern."""
     cache.clear(pattern)
 
+def invalidate_tags(*tags):
+    """Invalidate every cache entry written with any of these tags."""
+    return cache.invalidate_tags(*tags)
+
 def warm_cache():
     """Warm up cache with frequently accessed data."""
     try:
@@ -206,13 +751,13 @@ def warm_cache():
         
         # Cache commonly accessed statistics
         total_animals = Animal.query.filter(Animal.deleted_at.is_(None)).count()
-        cache.set("stats:total_animals", total_animals, 3600)  # 1 hour
+        cache.set("stats:total_animals", total_animals, 3600, tags=['animals'])  # 1 hour
         
         total_customers = Customer.query.count()
-        cache.set("stats:total_customers", total_customers, 3600)
+        cache.set("stats:total_customers", total_customers, 3600, tags=['customers'])
         
         total_samples = LabSample.query.count()
-        cache.set("stats:total_samples", total_samples, 3600)
+        cache.set("stats:total_samples", total_samples, 3600, tags=['laboratory'])
         
         current_app.logger.info("Cache warmed up successfully")
         
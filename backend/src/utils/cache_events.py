@@ -0,0 +1,218 @@
+"""
+Commit-driven cache invalidation.
+
+SQLAlchemy session listeners record which rows each flush inserts, updates
+or deletes. When the transaction commits, the affected collection and entity
+tags (see CacheManager.invalidate_tags) are bumped, registered subscribers
+are notified, and the event is optionally published on a Redis channel so
+other worker processes drop their in-process (L1) copies of those tag
+versions. Rolled back transactions emit nothing.
+
+Each process subscribes to the channel on its first request or
+invalidation, not in init_app: threads do not survive a fork, so a
+subscription made by a preloading master would not reach the workers.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from src.utils.cache import TAG_KEY_PREFIX
+
+# Collection tag per table; tables not listed use their table name
+COLLECTION_TAGS = {
+    'animals': 'animals',
+    'animal_roles': 'animals',
+    'animal_internal_numbers': 'animals',
+    'animal_genomic_data': 'animals',
+    'animal_activities': 'animals',
+    'customers': 'customers',
+    'customer_contacts': 'customers',
+    'customer_addresses': 'customers',
+    'lab_samples': 'laboratory',
+    'lab_protocols': 'laboratory',
+    'lab_tests': 'laboratory',
+    'lab_equipment': 'laboratory',
+    'biobank_storage_units': 'biobank',
+    'biobank_samples': 'biobank',
+    'temperature_logs': 'biobank'
+}
+
+# Entity tag prefix per table, used for the row itself and for foreign keys to it
+ENTITY_TAGS = {
+    'animals': 'animal',
+    'customers': 'customer',
+    'lab_samples': 'lab_sample',
+    'lab_tests': 'lab_test',
+    'biobank_storage_units': 'storage_unit',
+    'biobank_samples': 'biobank_sample',
+    'users': 'user'
+}
+
+PENDING_KEY = 'cache_invalidation'  # session.info key for tags pending commit
+
+class CacheInvalidator:
+    """Turns committed ORM changes into cache tag invalidations."""
+    
+    def __init__(self, app=None, cache=None):
+        self.app = app
+        self.cache = cache
+        self.ignored_tables = set()
+        self.channel = None
+        self.instance_id = uuid.uuid4().hex
+        self._subscribers = []
+        self._listener_thread = None
+        self._listener_pid = None
+        self._lock = threading.Lock()
+        self._registered = False
+        
+        if app:
+            self.init_app(app, cache)
+    
+    def init_app(self, app, cache):
+        """Initialize invalidation hooks with Flask app and cache."""
+        self.app = app
+        self.cache = cache
+        self.ignored_tables = {
+            table.strip()
+            for table in app.config.get('CACHE_INVALIDATION_IGNORE_TABLES', '').split(',')
+            if table.strip()
+        }
+        
+        if not self._registered:
+            event.listen(Session, 'after_flush', self._after_flush)
+            event.listen(Session, 'do_orm_execute', self._on_orm_execute)
+            event.listen(Session, 'after_commit', self._after_commit)
+            event.listen(Session, 'after_rollback', self._after_rollback)
+            self._registered = True
+        
+        if app.config.get('CACHE_INVALIDATION_PUBSUB') and cache.redis_client:
+            self.channel = app.config.get('CACHE_INVALIDATION_CHANNEL', 'cache-invalidation')
+            app.before_request(self._ensure_listener)
+    
+    def subscribe(self, callback):
+        """Register callback(tags, remote) called after each invalidation."""
+        self._subscribers.append(callback)
+        return callback
+    
+    # Collecting changes
+    
+    def _tags_for(self, obj):
+        table = obj.__table__
+        if table.name in self.ignored_tables:
+            return set()
+        
+        # Read loaded state only, so collecting tags never triggers a lazy load
+        state = inspect(obj)
+        tags = {COLLECTION_TAGS.get(table.name, table.name)}
+        
+        # Pending rows have no identity key until the flush completes; read the primary key
+        entity = ENTITY_TAGS.get(table.name)
+        identity = state.identity or state.mapper.primary_key_from_instance(obj)
+        if entity and identity and identity[0] is not None:
+            tags.add(f'{entity}:{identity[0]}')
+        
+        # Rows that reference an entity also change what that entity's views show,
+        # for both the current and (when reassigned) the previous reference
+        for column in table.columns:
+            for foreign_key in column.foreign_keys:
+                parent = ENTITY_TAGS.get(foreign_key.column.table.name)
+                if not parent or column.key not in state.attrs:
+                    continue
+                history = state.attrs[column.key].history
+                for value in (*history.added, *history.unchanged, *history.deleted):
+                    if value is not None:
+                        tags.add(f'{parent}:{value}')
+        
+        return tags
+    
+    def _pending(self, session):
+        return session.info.setdefault(PENDING_KEY, set())
+    
+    def _after_flush(self, session, flush_context):
+        pending = self._pending(session)
+        for obj in session.new:
+            pending.update(self._tags_for(obj))
+        for obj in session.deleted:
+            pending.update(self._tags_for(obj))
+        for obj in session.dirty:
+            if session.is_modified(obj, include_collections=False):
+                pending.update(self._tags_for(obj))
+    
+    def _on_orm_execute(self, orm_execute_state):
+        # Bulk query.update()/delete() bypass flush; invalidate the whole collection
+        if (orm_execute_state.is_update or orm_execute_state.is_delete) and orm_execute_state.bind_mapper:
+            table = orm_execute_state.bind_mapper.local_table
+            if table.name not in self.ignored_tables:
+                self._pending(orm_execute_state.session).add(COLLECTION_TAGS.get(table.name, table.name))
+    
+    def _after_rollback(self, session):
+        session.info.pop(PENDING_KEY, None)
+    
+    def _after_commit(self, session):
+        tags = session.info.pop(PENDING_KEY, None)
+        if tags:
+            self.invalidate(sorted(tags))
+    
+    # Emitting
+    
+    def invalidate(self, tags):
+        """Bump tags locally, notify subscribers and publish to other workers."""
+        self._ensure_listener()
+        self.cache.invalidate_tags(*tags)
+        self._notify(tags, remote=False)
+        
+        if self.channel:
+            try:
+                self.cache.redis_client.publish(
+                    self.channel,
+                    json.dumps({'origin': self.instance_id, 'tags': tags})
+                )
+            except Exception as e:
+                self.app.logger.warning(f"Cache invalidation publish failed: {str(e)}")
+    
+    def _notify(self, tags, remote):
+        for callback in self._subscribers:
+            try:
+                callback(tags, remote)
+            except Exception as e:
+                self.app.logger.error(f"Cache invalidation subscriber error: {str(e)}")
+    
+    def _handle_remote(self, tags):
+        # The shared version already moved in Redis; drop our L1 copy so the next read sees it
+        for tag in tags:
+            self.cache.memory_cache.delete(TAG_KEY_PREFIX + tag)
+        self._notify(tags, remote=True)
+    
+    def _ensure_listener(self):
+        # Threads do not survive a fork (gunicorn --preload); each worker process subscribes itself
+        if not self.channel or self._listener_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listener_pid == os.getpid():
+                return
+            # Forked copies share the parent's id and would skip each other's messages
+            self.instance_id = uuid.uuid4().hex
+            self._listener_pid = os.getpid()
+            self._listener_thread = threading.Thread(target=self._listen, daemon=True, name='cache-invalidation')
+            self._listener_thread.start()
+    
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.cache.redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    data = json.loads(message['data'])
+                    if data.get('origin') != self.instance_id:
+                        with self.app.app_context():
+                            self._handle_remote(data.get('tags', []))
+            except Exception as e:
+                self.app.logger.warning(f"Cache invalidation listener error, reconnecting: {str(e)}")
+                time.sleep(5)
+
+# Global cache invalidator instance
+cache_invalidator = CacheInvalidator()
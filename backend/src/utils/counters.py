@@ -0,0 +1,380 @@
+"""
+Materialised entity statistics.
+
+Row counts of the main entity tables, overall and per value of a few
+grouping columns (status, type, category...), are kept in entity_counters.
+A session after_flush listener turns every ORM insert, update, delete and
+soft delete into +1/-1 deltas and applies them as upserts in the same
+transaction, so a /stats endpoint reads all of its numbers with one indexed
+query instead of one COUNT(*) per value.
+
+Changes the listener cannot see exactly (bulk query.update()/delete(), ORM
+inserts of raw rows, or an update whose previous value was never loaded)
+hand that table to a background reconciler after commit, so the request
+never pays for a recount. The reconciler also recounts every table every
+STATS_RECONCILE_INTERVAL seconds (and once at startup, see
+start_maintenance), correcting any drift from writes made outside the ORM.
+A recount first locks the entity's counter rows, so deltas from concurrent
+transactions wait for it and are applied on top of its result.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from collections import Counter
+from sqlalchemy import event, inspect, select, func, update, delete, insert
+from sqlalchemy.orm import Session
+from src.database import db
+
+TOTAL = ('total', '')  # (dimension, value) of an entity's overall count
+
+# Counted table -> grouping columns, plus the column that marks a soft-deleted row
+COUNTED_TABLES = {
+    'animals': {'dimensions': ('status', 'species', 'purpose'), 'soft_delete': 'deleted_at'},
+    'customers': {'dimensions': ('status', 'type', 'category')},
+    'lab_samples': {'dimensions': ('status',)},
+    'lab_tests': {'dimensions': ('status',)},
+    'lab_equipment': {'dimensions': ('status',)},
+    'biobank_storage_units': {'dimensions': ('status',)},
+    'biobank_samples': {'dimensions': ('status', 'sample_type')},
+    'genomic_analyses': {'dimensions': ('status', 'analysis_type')},
+    'snp_data': {'dimensions': ()},
+    'beadchip_mappings': {'dimensions': ('chip_type',)},
+    'users': {'dimensions': ('is_active', 'is_verified')},
+    'workflows': {'dimensions': ('is_active', 'is_template', 'category')},
+    'workflow_instances': {'dimensions': ('status',)}
+}
+
+PENDING_KEY = 'entity_counter_reconcile'  # session.info key for tables to reconcile after commit
+
+class _Unknown(Exception):
+    """A value needed to compute a delta is not loaded."""
+
+def encode_value(value):
+    """Counter value for a column value; booleans become 'true'/'false'."""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+def counter_keys(table_name, values):
+    """(dimension, value) keys a row counts towards, given a column -> value getter."""
+    spec = COUNTED_TABLES[table_name]
+    soft_delete = spec.get('soft_delete')
+    if soft_delete and values(soft_delete) is not None:
+        return []
+    
+    keys = [TOTAL]
+    for dimension in spec['dimensions']:
+        value = encode_value(values(dimension))
+        if value is not None:
+            keys.append((dimension, value))
+    return keys
+
+def _counter_table():
+    from src.models.analytics import EntityCounter
+    return EntityCounter.__table__
+
+def apply_counter_deltas(connection, deltas, absolute=False):
+    """
+    Upsert counter rows in the caller's transaction.
+    
+    Args:
+        connection: Connection of the transaction that made the change
+        deltas: Dictionary of (entity, dimension, value) -> change (or new count)
+        absolute: Set counts to the given values instead of adding to them
+    """
+    rows = [
+        {'entity': entity, 'dimension': dimension, 'value': value, 'count': count,
+         'updated_at': datetime.now(timezone.utc)}
+        for (entity, dimension, value), count in deltas.items()
+        if count or absolute
+    ]
+    if not rows:
+        return
+    
+    table = _counter_table()
+    dialect = connection.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        
+        statement = dialect_insert(table)
+        count = statement.excluded['count'] if absolute else table.c['count'] + statement.excluded['count']
+        statement = statement.on_conflict_do_update(
+            index_elements=['entity', 'dimension', 'value'],
+            set_={'count': count, 'updated_at': statement.excluded.updated_at}
+        )
+        connection.execute(statement, rows)
+        return
+    
+    # Other backends: update, then insert rows that did not exist yet
+    for row in rows:
+        key = (table.c.entity == row['entity']) & (table.c.dimension == row['dimension']) & (table.c.value == row['value'])
+        count = row['count'] if absolute else table.c['count'] + row['count']
+        result = connection.execute(update(table).where(key).values(count=count, updated_at=row['updated_at']))
+        if result.rowcount == 0:
+            connection.execute(insert(table).values(**row))
+
+def increment_total(connection, entity, count):
+    """Add count rows to an entity's total, for Core inserts that bypass the ORM."""
+    apply_counter_deltas(connection, {(entity, *TOTAL): count})
+
+class EntityCounts:
+    """Counters of one entity as read from entity_counters."""
+    
+    def __init__(self, counters=None):
+        self.counters = counters or {}
+    
+    @property
+    def total(self):
+        return self.get(*TOTAL)
+    
+    def get(self, dimension, value):
+        return self.counters.get(dimension, {}).get(encode_value(value), 0)
+    
+    def distribution(self, dimension, values=None):
+        """Count per value; with values, every listed value is present (0 if none)."""
+        if values is None:
+            return dict(self.counters.get(dimension, {}))
+        return {value: self.get(dimension, value) for value in values}
+
+class EntityCounterService:
+    """Maintains and reads entity_counters."""
+    
+    def __init__(self, app=None):
+        self.app = app
+        self.interval = None
+        self._registered = False
+        self._reconciler = None
+        self._reconciler_pid = None
+        self._periodic = False
+        self._stale_tables = set()  # Tables waiting for the reconciler
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        
+        if app:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        """Initialize counter maintenance with Flask app."""
+        self.app = app
+        self.interval = app.config.get('STATS_RECONCILE_INTERVAL', 3600)
+        
+        if not self._registered:
+            event.listen(Session, 'after_flush', self._after_flush)
+            event.listen(Session, 'do_orm_execute', self._on_orm_execute)
+            event.listen(Session, 'after_commit', self._after_commit)
+            event.listen(Session, 'after_rollback', self._after_rollback)
+            self._registered = True
+    
+    def start_maintenance(self):
+        """Start periodic reconciliation (a full recount now, then every interval). Call once tables exist."""
+        self._periodic = bool(self.interval)
+        self._ensure_reconciler()
+    
+    # Reading
+    
+    def read(self, *entities):
+        """
+        Counters for the given entities in one query.
+        
+        Returns:
+            Dictionary of entity -> EntityCounts
+        """
+        from src.models.analytics import EntityCounter
+        
+        rows = db.session.query(
+            EntityCounter.entity, EntityCounter.dimension, EntityCounter.value, EntityCounter.count
+        ).filter(EntityCounter.entity.in_(entities)).all()
+        
+        counters = {entity: {} for entity in entities}
+        for entity, dimension, value, count in rows:
+            counters[entity].setdefault(dimension, {})[value] = count
+        
+        # An entity without a total row has never been reconciled; build it now
+        missing = [entity for entity in entities if TOTAL[0] not in counters[entity]]
+        if missing:
+            self.reconcile(missing)
+            return self.read(*entities)
+        
+        return {entity: EntityCounts(counters[entity]) for entity in entities}
+    
+    # Incremental maintenance
+    
+    def _pending(self, session):
+        return session.info.setdefault(PENDING_KEY, set())
+    
+    @staticmethod
+    def _loaded(state, allow_missing):
+        """Getter over the row's loaded values; never triggers a load."""
+        def values(key):
+            if key in state.dict:
+                return state.dict[key]
+            if allow_missing:
+                return None
+            raise _Unknown(key)
+        return values
+    
+    @staticmethod
+    def _previous(state):
+        """Getter over the values a dirty row had before this flush."""
+        def values(key):
+            history = state.attrs[key].history
+            if history.deleted:
+                return history.deleted[0]
+            if history.unchanged:
+                return history.unchanged[0]
+            raise _Unknown(key)
+        return values
+    
+    def _after_flush(self, session, flush_context):
+        deltas = Counter()
+        
+        def count(obj, sign, values):
+            table_name = obj.__table__.name
+            try:
+                keys = counter_keys(table_name, values)
+            except _Unknown:
+                self._pending(session).add(table_name)
+                return
+            for dimension, value in keys:
+                deltas[(table_name, dimension, value)] += sign
+        
+        for obj in session.new:
+            if obj.__table__.name in COUNTED_TABLES:
+                # Unset columns were inserted as NULL
+                count(obj, 1, self._loaded(inspect(obj), allow_missing=True))
+        
+        for obj in session.deleted:
+            if obj.__table__.name in COUNTED_TABLES:
+                count(obj, -1, self._loaded(inspect(obj), allow_missing=False))
+        
+        for obj in session.dirty:
+            if obj.__table__.name in COUNTED_TABLES and session.is_modified(obj, include_collections=False):
+                state = inspect(obj)
+                count(obj, -1, self._previous(state))
+                count(obj, 1, self._loaded(state, allow_missing=False))
+        
+        if any(deltas.values()):
+            apply_counter_deltas(session.connection(), deltas)
+    
+    def _on_orm_execute(self, orm_execute_state):
+        # Bulk statements bypass flush; recount the table after commit
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            table = getattr(orm_execute_state.statement, 'table', None)
+            if getattr(table, 'name', None) in COUNTED_TABLES:
+                self._pending(orm_execute_state.session).add(table.name)
+    
+    def _after_rollback(self, session):
+        session.info.pop(PENDING_KEY, None)
+    
+    def _after_commit(self, session):
+        tables = session.info.pop(PENDING_KEY, None)
+        if tables:
+            # Recounting is O(table); leave it to the background reconciler
+            with self._lock:
+                self._stale_tables.update(tables)
+            self._ensure_reconciler()
+            self._wake.set()
+    
+    # Reconciliation
+    
+    def reconcile(self, entities=None):
+        """
+        Recount entities from their tables and correct drifted counters.
+        
+        Returns:
+            Dictionary of entity -> number of counter rows corrected
+        """
+        corrected = {}
+        with db.engine.begin() as connection:
+            for entity in entities or COUNTED_TABLES:
+                corrected[entity] = self._reconcile_table(connection, entity)
+        return corrected
+    
+    def _reconcile_table(self, connection, entity):
+        spec = COUNTED_TABLES[entity]
+        table = db.metadata.tables[entity]
+        counters = _counter_table()
+        
+        # Lock the entity's counters before counting (row locks on PostgreSQL, the write
+        # lock on SQLite). Transactions that already applied deltas commit first and are
+        # counted; later ones wait and add their deltas to the recounted values.
+        connection.execute(
+            update(counters).where(counters.c.entity == entity).values(count=counters.c['count'])
+        )
+        
+        criteria = []
+        if spec.get('soft_delete'):
+            criteria.append(table.c[spec['soft_delete']].is_(None))
+        
+        actual = {TOTAL: connection.execute(select(func.count()).select_from(table).where(*criteria)).scalar()}
+        for dimension in spec['dimensions']:
+            column = table.c[dimension]
+            for value, count in connection.execute(select(column, func.count()).where(*criteria).group_by(column)):
+                if value is not None:
+                    actual[(dimension, encode_value(value))] = count
+        
+        current = {
+            (dimension, value): count
+            for dimension, value, count in connection.execute(
+                select(counters.c.dimension, counters.c.value, counters.c['count']).where(counters.c.entity == entity)
+            )
+        }
+        
+        changed = {
+            (entity, dimension, value): count
+            for (dimension, value), count in actual.items()
+            if current.get((dimension, value)) != count
+        }
+        apply_counter_deltas(connection, changed, absolute=True)
+        
+        removed = [key for key in current if key not in actual]
+        for dimension, value in removed:
+            connection.execute(delete(counters).where(
+                counters.c.entity == entity, counters.c.dimension == dimension, counters.c.value == value
+            ))
+        
+        return len(changed) + len(removed)
+    
+    def _ensure_reconciler(self):
+        """Start the reconciler thread in this process (threads do not survive a fork)."""
+        if self._reconciler_pid == os.getpid() and self._reconciler and self._reconciler.is_alive():
+            return
+        with self._lock:
+            if self._reconciler_pid == os.getpid() and self._reconciler and self._reconciler.is_alive():
+                return
+            self._reconciler_pid = os.getpid()
+            self._reconciler = threading.Thread(target=self._reconcile_loop, daemon=True, name='entity-counter-reconciler')
+            self._reconciler.start()
+    
+    def _reconcile_loop(self):
+        full_at = time.monotonic()
+        while True:
+            timeout = max(0.0, full_at - time.monotonic()) if self._periodic else None
+            self._wake.wait(timeout)
+            self._wake.clear()
+            
+            with self._lock:
+                tables, self._stale_tables = self._stale_tables, set()
+            full = self._periodic and time.monotonic() >= full_at
+            if full:
+                full_at = time.monotonic() + self.interval
+            elif not tables:
+                continue
+            
+            with self.app.app_context():
+                try:
+                    corrected = sum(self.reconcile(None if full else sorted(tables)).values())
+                    if corrected and full:
+                        self.app.logger.warning(f"Corrected {corrected} drifted entity counters")
+                except Exception as e:
+                    self.app.logger.error(f"Entity counter reconcile error: {str(e)}")
+
+# Global entity counter service instance
+entity_counters = EntityCounterService()
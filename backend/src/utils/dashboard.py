@@ -0,0 +1,168 @@
+"""
+Dashboard snapshot service.
+
+All dashboard counters are computed in a single statement: one aggregate
+subquery per table, using FILTER (WHERE ...) aggregates for the conditional
+counts, cross-joined into one row. Recent activity comes from one UNION ALL
+of the per-table "latest N" queries. The resulting snapshot is cached with a
+short TTL under the collection tags of every table it reads, so commits that
+touch those tables (see cache_events) invalidate it immediately and reads in
+between are served from the in-process cache tier.
+"""
+
+import threading
+from datetime import datetime, timezone
+from sqlalchemy import select, func, literal, union_all
+from src.database import db
+
+SNAPSHOT_KEY = 'dashboard:snapshot'
+SNAPSHOT_TAGS = ['animals', 'customers', 'laboratory', 'biobank', 'genomic_analyses']
+
+# Activity kind -> (type, entity_type, user, description format)
+ACTIVITY_TYPES = {
+    'animal': ('animal_created', 'animal', 'System', 'New animal registered: {primary} ({secondary})'),
+    'customer': ('customer_created', 'customer', 'System', 'New customer registered: {primary}'),
+    'sample': ('sample_created', 'sample', 'Lab Technician', 'New sample collected: {primary} ({secondary})'),
+    'test': ('test_completed', 'test', 'Lab Technician', 'Test completed: {primary}'),
+    'analysis': ('analysis_completed', 'analysis', 'Genomics Team', 'Genomic analysis completed: {primary} ({secondary})'),
+    'biobank': ('biobank_sample_stored', 'biobank_sample', 'Biobank Staff', 'Sample stored in biobank: {primary} ({secondary})')
+}
+
+def _counters_statement():
+    from src.models.animal import Animal
+    from src.models.customer import Customer
+    from src.models.laboratory import LabSample, LabTest
+    from src.models.biobank import BiobankSample, BiobankStorageUnit
+    
+    animals = select(
+        func.count().label('total'),
+        func.count().filter(Animal.status == 'ACTIVE').label('active')
+    ).where(Animal.deleted_at.is_(None)).subquery()
+    
+    customers = select(
+        func.count().label('total'),
+        func.count().filter(Customer.status == 'Active').label('active')
+    ).select_from(Customer).subquery()
+    
+    lab_samples = select(func.count().label('total')).select_from(LabSample).subquery()
+    
+    lab_tests = select(
+        func.count().label('total'),
+        func.count().filter(LabTest.status == 'PENDING').label('pending')
+    ).select_from(LabTest).subquery()
+    
+    biobank_samples = select(func.count().label('total')).select_from(BiobankSample).subquery()
+    storage_units = select(func.count().label('total')).select_from(BiobankStorageUnit).subquery()
+    
+    # Each subquery yields exactly one row, so the cross join is one row too
+    return select(
+        animals.c.total, animals.c.active,
+        customers.c.total, customers.c.active,
+        lab_samples.c.total,
+        lab_tests.c.total, lab_tests.c.pending,
+        biobank_samples.c.total,
+        storage_units.c.total
+    ).select_from(animals).join(customers, literal(True)).join(lab_samples, literal(True)) \
+        .join(lab_tests, literal(True)).join(biobank_samples, literal(True)).join(storage_units, literal(True))
+
+def _activities_statement():
+    from src.models.animal import Animal
+    from src.models.customer import Customer
+    from src.models.laboratory import LabSample, LabTest
+    from src.models.biobank import BiobankSample
+    from src.models.genomics import GenomicAnalysis
+    
+    def latest(kind, model, primary, secondary, timestamp, limit, *criteria):
+        branch = select(
+            literal(kind).label('kind'),
+            model.id.label('entity_id'),
+            primary.label('primary'),
+            (secondary if secondary is not None else literal(None)).label('secondary'),
+            timestamp.label('timestamp')
+        ).where(*criteria).order_by(timestamp.desc()).limit(limit).subquery()
+        # Wrapped so each branch keeps its own ORDER BY/LIMIT inside the UNION ALL
+        return select(*branch.c)
+    
+    return union_all(
+        latest('animal', Animal, Animal.name, Animal.animal_id, Animal.created_at, 5, Animal.deleted_at.is_(None)),
+        latest('customer', Customer, Customer.name, None, Customer.created_at, 3),
+        latest('sample', LabSample, LabSample.sample_id, LabSample.sample_type, LabSample.created_at, 5),
+        latest('test', LabTest, LabTest.test_id, None, LabTest.completed_date, 5, LabTest.status == 'COMPLETED'),
+        latest('analysis', GenomicAnalysis, GenomicAnalysis.analysis_id, GenomicAnalysis.analysis_type,
+               GenomicAnalysis.completed_at, 3, GenomicAnalysis.status == 'COMPLETED'),
+        latest('biobank', BiobankSample, BiobankSample.sample_id, BiobankSample.sample_type, BiobankSample.created_at, 3)
+    )
+
+def _activity(row, now):
+    activity_type, entity_type, user, description = ACTIVITY_TYPES[row.kind]
+    return {
+        'id': f"{row.kind}_{row.entity_id}",
+        'type': activity_type,
+        'description': description.format(primary=row.primary, secondary=row.secondary),
+        'timestamp': row.timestamp.isoformat() if row.timestamp else now,
+        'user': user,
+        'entity_id': str(row.entity_id),
+        'entity_type': entity_type
+    }
+
+def compute_snapshot(activity_limit=10):
+    """Build the dashboard snapshot from the database (two statements)."""
+    (animals_total, animals_active, customers_total, customers_active, lab_samples,
+     lab_tests, pending_tests, biobank_samples, storage_units) = db.session.execute(_counters_statement()).one()
+    
+    now = datetime.now(timezone.utc).isoformat()
+    activities = [_activity(row, now) for row in db.session.execute(_activities_statement())]
+    activities.sort(key=lambda x: x['timestamp'], reverse=True)
+    
+    return {
+        'statistics': {
+            'animals': {'total': animals_total, 'active': animals_active},
+            'customers': {'total': customers_total, 'active': customers_active},
+            'laboratory': {'samples': lab_samples, 'tests': lab_tests, 'pending_tests': pending_tests},
+            'biobank': {'samples': biobank_samples, 'storage_units': storage_units}
+        },
+        'recent_activities': activities[:activity_limit],
+        'generated_at': now
+    }
+
+class DashboardSnapshot:
+    """Cached dashboard snapshot, recomputed after a commit touches its tables or the TTL lapses."""
+    
+    def __init__(self, app=None, cache=None):
+        self.app = app
+        self.cache = cache
+        self.ttl = 30
+        self._lock = threading.Lock()
+        
+        if app:
+            self.init_app(app, cache)
+    
+    def init_app(self, app, cache):
+        """Initialize dashboard snapshot with Flask app and cache."""
+        self.app = app
+        self.cache = cache
+        self.ttl = app.config.get('DASHBOARD_SNAPSHOT_TTL', 30)
+    
+    def get(self):
+        """Current snapshot, from cache when still valid."""
+        snapshot = self.cache.get(SNAPSHOT_KEY)
+        if snapshot is not None:
+            return snapshot
+        
+        # One recompute per process at a time; waiters pick up its result
+        with self._lock:
+            snapshot = self.cache.get(SNAPSHOT_KEY)
+            if snapshot is not None:
+                return snapshot
+            return self.refresh()
+    
+    def refresh(self):
+        """Recompute and cache the snapshot."""
+        # Read tag versions first so a commit landing mid-computation still invalidates it
+        versions = self.cache.tag_versions(SNAPSHOT_TAGS)
+        snapshot = compute_snapshot()
+        self.cache.set(SNAPSHOT_KEY, snapshot, self.ttl, tags=versions)
+        return snapshot
+
+# Global dashboard snapshot instance
+dashboard_snapshot = DashboardSnapshot()
@@ -0,0 +1,355 @@
+"""
+Compact columnar genotype storage.
+
+Each animal's calls are packed 2 bits per marker against a shared marker map
+(chromosome, position, snp_id), so a 50k marker panel takes ~12.5 KB instead
+of 50k snp_data rows. Calls are encoded as alternate allele dosage:
+
+    0 = homozygous reference, 1 = heterozygous, 2 = homozygous alternate,
+    3 = missing
+
+Packed arrays are stored inline as a blob, or as .npy files that are
+memory-mapped on read when GENOTYPE_STORE_PATH is configured.
+"""
+
+import hashlib
+import io
+import os
+import threading
+import uuid
+import numpy as np
+from src.database import db
+
+MISSING_CALL = 3
+
+def encode_genotype(genotype, reference_allele=None, alternate_allele=None):
+    """
+    Convert a genotype string to alternate allele dosage (0-2, or 3 if missing).
+    
+    Understands Illumina A/B calls ('AB'), VCF style calls ('0/1', '1|1') and
+    nucleotide calls ('AG') when the alternate allele is known.
+    """
+    if not genotype:
+        return MISSING_CALL
+    
+    alleles = [allele for allele in genotype.upper() if allele not in '/|-_ ']
+    if len(alleles) != 2:
+        return MISSING_CALL
+    
+    if set(alleles) <= {'A', 'B'} and not alternate_allele:
+        return alleles.count('B')
+    if set(alleles) <= {'0', '1'}:
+        return alleles.count('1')
+    if alternate_allele:
+        alternate = alternate_allele.upper()
+        reference = (reference_allele or '').upper()
+        if reference and any(allele not in (reference, alternate) for allele in alleles):
+            return MISSING_CALL
+        return alleles.count(alternate)
+    
+    return MISSING_CALL
+
+def pack_calls(calls):
+    """Pack an array of 0-3 calls into bytes, four calls per byte."""
+    calls = np.asarray(calls, dtype=np.uint8)
+    padding = (-len(calls)) % 4
+    if padding:
+        calls = np.concatenate([calls, np.full(padding, MISSING_CALL, dtype=np.uint8)])
+    
+    quads = calls.reshape(-1, 4)
+    return (quads[:, 0] | (quads[:, 1] << 2) | (quads[:, 2] << 4) | (quads[:, 3] << 6)).astype(np.uint8)
+
+def unpack_calls(packed, count, start=0):
+    """
+    Unpack `count` calls starting at call index `start`.
+    
+    Only the bytes covering the requested range are touched, so reading a
+    region from a memory-mapped array does not page in the whole file.
+    """
+    if count <= 0:
+        return np.empty(0, dtype=np.uint8)
+    
+    first_byte = start // 4
+    last_byte = (start + count + 3) // 4
+    chunk = np.asarray(packed[first_byte:last_byte], dtype=np.uint8)
+    
+    calls = np.stack([(chunk >> shift) & 3 for shift in (0, 2, 4, 6)], axis=1).ravel()
+    offset = start - first_byte * 4
+    return calls[offset:offset + count]
+
+def as_uuid(value):
+    """Coerce an id (string or UUID) to uuid.UUID for UUID column comparisons."""
+    return value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))
+
+def marker_checksum(chromosomes, positions, snp_ids):
+    """Stable identity for an ordered marker list."""
+    digest = hashlib.sha256()
+    for chromosome, position, snp_id in zip(chromosomes, positions, snp_ids):
+        digest.update(f'{chromosome}\t{position}\t{snp_id}\n'.encode('utf-8'))
+    return digest.hexdigest()
+
+class MarkerMap:
+    """In-memory view of a GenotypeMarkerMap, sorted by (chromosome, position)."""
+    
+    def __init__(self, map_id, chromosomes, positions, snp_ids):
+        self.id = map_id
+        self.chromosomes = chromosomes
+        self.positions = positions
+        self.snp_ids = snp_ids
+        self._index = None
+    
+    def __len__(self):
+        return len(self.positions)
+    
+    @classmethod
+    def from_blob(cls, map_id, blob):
+        with np.load(io.BytesIO(blob)) as archive:
+            return cls(map_id, archive['chromosomes'], archive['positions'], archive['snp_ids'])
+    
+    def to_blob(self):
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer,
+            chromosomes=self.chromosomes,
+            positions=self.positions,
+            snp_ids=self.snp_ids
+        )
+        return buffer.getvalue()
+    
+    def index_of(self, chromosome, position):
+        """Marker index for a (chromosome, position) pair, or None."""
+        if self._index is None:
+            self._index = {
+                (chromosome, int(position)): i
+                for i, (chromosome, position) in enumerate(zip(self.chromosomes.tolist(), self.positions.tolist()))
+            }
+        return self._index.get((chromosome, int(position)))
+    
+    def region_slice(self, chromosome, start=None, end=None):
+        """Index range [first, last) of markers on a chromosome between start and end (inclusive)."""
+        first = int(np.searchsorted(self.chromosomes, chromosome, side='left'))
+        last = int(np.searchsorted(self.chromosomes, chromosome, side='right'))
+        
+        positions = self.positions[first:last]
+        if start is not None:
+            first += int(np.searchsorted(positions, start, side='left'))
+        if end is not None:
+            last = first + int(np.searchsorted(self.positions[first:last], end, side='right'))
+        
+        return first, last
+
+class GenotypeStore:
+    """Packed genotype storage backend alongside the row-based snp_data table."""
+    
+    def __init__(self, app=None):
+        self.app = app
+        self.storage_path = None
+        self._marker_maps = {}
+        self._lock = threading.Lock()
+        
+        if app:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        """Initialize genotype store with Flask app."""
+        self.app = app
+        self.storage_path = app.config.get('GENOTYPE_STORE_PATH')
+        if self.storage_path:
+            os.makedirs(self.storage_path, exist_ok=True)
+    
+    # Marker maps
+    
+    def get_marker_map(self, map_id):
+        """Load a marker map (cached in-process; maps are immutable)."""
+        from src.models.genomics import GenotypeMarkerMap
+        
+        key = str(map_id)
+        marker_map = self._marker_maps.get(key)
+        if marker_map is None:
+            record = db.session.get(GenotypeMarkerMap, as_uuid(map_id))
+            if not record:
+                return None
+            marker_map = MarkerMap.from_blob(record.id, record.marker_data)
+            with self._lock:
+                self._marker_maps[key] = marker_map
+        return marker_map
+    
+    def get_or_create_marker_map(self, markers, name=None):
+        """
+        Find or create the marker map for a list of (chromosome, position, snp_id).
+        
+        Markers are de-duplicated and sorted by (chromosome, position) so
+        region lookups can binary search.
+        """
+        from src.models.genomics import GenotypeMarkerMap
+        
+        unique_markers = sorted({(str(c), int(p)): s for c, p, s in markers}.items())
+        chromosomes = np.array([c for (c, _), _ in unique_markers], dtype='<U10')
+        positions = np.array([p for (_, p), _ in unique_markers], dtype=np.int64)
+        snp_ids = np.array([s or '' for _, s in unique_markers], dtype='<U50')
+        
+        checksum = marker_checksum(chromosomes.tolist(), positions.tolist(), snp_ids.tolist())
+        record = GenotypeMarkerMap.query.filter_by(checksum=checksum).first()
+        if record:
+            return self.get_marker_map(record.id)
+        
+        marker_map = MarkerMap(None, chromosomes, positions, snp_ids)
+        record = GenotypeMarkerMap(
+            name=name,
+            checksum=checksum,
+            marker_count=len(marker_map),
+            marker_data=marker_map.to_blob()
+        )
+        db.session.add(record)
+        db.session.flush()
+        
+        # Not cached until committed and reloaded, so a rollback cannot leave a stale map
+        marker_map.id = record.id
+        return marker_map
+    
+    # Writing
+    
+    def store_calls(self, animal_id, marker_map, calls):
+        """Pack and persist an animal's calls (aligned to marker_map). Caller commits."""
+        from src.models.genomics import AnimalGenotype
+        
+        animal_id = as_uuid(animal_id)
+        calls = np.asarray(calls, dtype=np.uint8)
+        if len(calls) != len(marker_map):
+            raise ValueError('Call vector length does not match marker map')
+        
+        packed = pack_calls(calls)
+        genotype = AnimalGenotype.query.filter_by(animal_id=animal_id, marker_map_id=marker_map.id).first()
+        if not genotype:
+            genotype = AnimalGenotype(animal_id=animal_id, marker_map_id=marker_map.id)
+            db.session.add(genotype)
+        
+        genotype.call_count = len(calls)
+        genotype.missing_count = int(np.count_nonzero(calls == MISSING_CALL))
+        
+        if self.storage_path:
+            path = os.path.join(self.storage_path, f'{marker_map.id}_{animal_id}.npy')
+            np.save(path, packed)
+            genotype.storage_path = path
+            genotype.packed_calls = None
+        else:
+            genotype.packed_calls = packed.tobytes()
+            genotype.storage_path = None
+        
+        return genotype
+    
+    def compact_from_snp_data(self, animal_id, marker_map_id=None, name=None):
+        """
+        Build an animal's packed genotype from its snp_data rows.
+        
+        Rows are read as plain tuples (no ORM objects). Without a marker map,
+        one is derived from the animal's own markers and shared with any
+        animal genotyped on the same panel.
+        """
+        from src.models.genomics import SNPData
+        
+        animal_id = as_uuid(animal_id)
+        rows = db.session.execute(
+            db.select(
+                SNPData.chromosome, SNPData.position, SNPData.snp_id,
+                SNPData.genotype, SNPData.reference_allele, SNPData.alternate_allele
+            ).where(SNPData.animal_id == animal_id)
+        ).all()
+        if not rows:
+            return None
+        
+        if marker_map_id:
+            marker_map = self.get_marker_map(marker_map_id)
+            if marker_map is None:
+                raise ValueError('Marker map not found')
+        else:
+            marker_map = self.get_or_create_marker_map(
+                ((row.chromosome, row.position, row.snp_id) for row in rows), name=name
+            )
+        
+        calls = np.full(len(marker_map), MISSING_CALL, dtype=np.uint8)
+        for row in rows:
+            index = marker_map.index_of(row.chromosome, row.position)
+            if index is not None:
+                calls[index] = encode_genotype(row.genotype, row.reference_allele, row.alternate_allele)
+        
+        return self.store_calls(animal_id, marker_map, calls)
+    
+    # Reading
+    
+    def _packed(self, genotype):
+        if genotype.storage_path:
+            return np.load(genotype.storage_path, mmap_mode='r')
+        return np.frombuffer(genotype.packed_calls, dtype=np.uint8)
+    
+    def _genotype_record(self, animal_id, marker_map_id=None):
+        from src.models.genomics import AnimalGenotype
+        
+        query = AnimalGenotype.query.filter_by(animal_id=as_uuid(animal_id))
+        if marker_map_id:
+            query = query.filter_by(marker_map_id=as_uuid(marker_map_id))
+        return query.order_by(AnimalGenotype.updated_at.desc()).first()
+    
+    def get_vector(self, animal_id, marker_map_id=None):
+        """
+        Full call vector for an animal.
+        
+        Returns:
+            Tuple of (MarkerMap, uint8 call array) or (None, None)
+        """
+        genotype = self._genotype_record(animal_id, marker_map_id)
+        if not genotype:
+            return None, None
+        
+        marker_map = self.get_marker_map(genotype.marker_map_id)
+        return marker_map, unpack_calls(self._packed(genotype), genotype.call_count)
+    
+    def get_region(self, animal_id, chromosome, start=None, end=None, marker_map_id=None):
+        """
+        Calls for markers on a chromosome between start and end (inclusive).
+        
+        Returns:
+            Dictionary with parallel positions, snp_ids and calls arrays, or None
+        """
+        genotype = self._genotype_record(animal_id, marker_map_id)
+        if not genotype:
+            return None
+        
+        marker_map = self.get_marker_map(genotype.marker_map_id)
+        first, last = marker_map.region_slice(str(chromosome), start, end)
+        
+        return {
+            'marker_map_id': marker_map.id,
+            'chromosome': str(chromosome),
+            'positions': marker_map.positions[first:last],
+            'snp_ids': marker_map.snp_ids[first:last],
+            'calls': unpack_calls(self._packed(genotype), last - first, start=first)
+        }
+    
+    def get_matrix(self, animal_ids, marker_map_id):
+        """
+        Stack call vectors for several animals on one marker map.
+        
+        Returns:
+            Tuple of (list of animal ids found, uint8 matrix animals x markers)
+        """
+        from src.models.genomics import AnimalGenotype
+        
+        records = AnimalGenotype.query.filter(
+            AnimalGenotype.animal_id.in_([as_uuid(animal_id) for animal_id in animal_ids]),
+            AnimalGenotype.marker_map_id == as_uuid(marker_map_id)
+        ).all()
+        by_animal = {str(record.animal_id): record for record in records}
+        
+        found = [str(animal_id) for animal_id in animal_ids if str(animal_id) in by_animal]
+        if not found:
+            return [], np.empty((0, 0), dtype=np.uint8)
+        
+        matrix = np.vstack([
+            unpack_calls(self._packed(by_animal[animal_id]), by_animal[animal_id].call_count)
+            for animal_id in found
+        ])
+        return found, matrix
+
+# Global genotype store instance
+genotype_store = GenotypeStore()
@@ -0,0 +1,232 @@
+"""
+Genomic relationship matrix (GRM) computation.
+
+Builds the VanRaden (2008) method 1 relationship matrix
+
+    G = Z Z' / (2 * sum(p * (1 - p)))
+
+from packed genotypes in the genotype store, where Z holds alternate allele
+dosages centred on 2p. Missing calls are mean-imputed (centred value 0) and
+markers without any calls are ignored. Z Z' is accumulated over blocks of
+markers, so only an animals x block slice is ever expanded to floating point.
+
+Results are cached in genomic_relationship_matrices keyed by the marker map
+checksum and the sorted animal set. Adding one newly genotyped animal reuses
+the cached matrix and its allele frequencies and only computes the new row.
+Such an extended matrix keeps the base matrix's frequencies rather than
+those of the extended animal set, so it is keyed by its base matrix as well
+and never served for a full computation of the same animals.
+"""
+
+import hashlib
+import io
+import numpy as np
+from src.database import db
+from src.utils.genotype_store import genotype_store, as_uuid, MISSING_CALL
+
+DEFAULT_BLOCK_SIZE = 10000  # Markers per block
+
+def grm_cache_key(marker_map_checksum, animal_ids, base_matrix_id=None):
+    """Stable cache key for a (marker set, animal set) pair, or for that set extended from a base matrix."""
+    digest = hashlib.sha256(marker_map_checksum.encode('utf-8'))
+    for animal_id in sorted({str(as_uuid(animal_id)) for animal_id in animal_ids}):
+        digest.update(f'\n{animal_id}'.encode('utf-8'))
+    if base_matrix_id:
+        digest.update(f'\nincremental:{as_uuid(base_matrix_id)}'.encode('utf-8'))
+    return digest.hexdigest()
+
+def allele_frequencies(matrix):
+    """
+    Alternate allele frequency per marker from non-missing calls.
+    
+    Markers with no calls get NaN and are excluded from the GRM.
+    """
+    called = matrix != MISSING_CALL
+    counts = called.sum(axis=0)
+    dosage_sums = np.where(called, matrix, 0).sum(axis=0, dtype=np.float64)
+    
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return dosage_sums / (2.0 * counts)
+
+def _centered_block(calls, frequencies):
+    """Centre a block of calls on 2p; missing calls and uninformative markers become 0."""
+    centered = calls.astype(np.float64) - 2.0 * np.nan_to_num(frequencies)
+    centered[(calls == MISSING_CALL) | np.isnan(frequencies)] = 0.0
+    return centered
+
+def _scale(frequencies):
+    informative = frequencies[~np.isnan(frequencies)]
+    return float(2.0 * np.sum(informative * (1.0 - informative)))
+
+def vanraden_grm(matrix, frequencies=None, block_size=DEFAULT_BLOCK_SIZE, progress_callback=None):
+    """
+    Compute the VanRaden GRM for a uint8 animals x markers call matrix.
+    
+    Args:
+        matrix: Calls from the genotype store (0, 1, 2, MISSING_CALL)
+        frequencies: Optional base allele frequencies; estimated from matrix if omitted
+        block_size: Markers expanded to float per block
+        progress_callback: Optional callable(fraction_complete)
+    
+    Returns:
+        Tuple of (GRM as float64 array, allele frequencies, scale)
+    """
+    if frequencies is None:
+        frequencies = allele_frequencies(matrix)
+    
+    scale = _scale(frequencies)
+    if scale <= 0:
+        raise ValueError('No polymorphic markers to build a relationship matrix from')
+    
+    animal_count, marker_count = matrix.shape
+    grm = np.zeros((animal_count, animal_count), dtype=np.float64)
+    
+    for start in range(0, marker_count, block_size):
+        end = min(start + block_size, marker_count)
+        block = _centered_block(matrix[:, start:end], frequencies[start:end])
+        grm += block @ block.T
+        
+        if progress_callback:
+            progress_callback(end / marker_count)
+    
+    grm /= scale
+    return grm, frequencies, scale
+
+def relationship_row(matrix, calls, frequencies, scale, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Relationships of one animal's calls against every row of matrix, plus
+    its own diagonal element, using fixed base allele frequencies.
+    """
+    row = np.zeros(matrix.shape[0], dtype=np.float64)
+    diagonal = 0.0
+    
+    for start in range(0, len(calls), block_size):
+        end = min(start + block_size, len(calls))
+        block_frequencies = frequencies[start:end]
+        new_block = _centered_block(calls[start:end], block_frequencies)
+        row += _centered_block(matrix[:, start:end], block_frequencies) @ new_block
+        diagonal += float(new_block @ new_block)
+    
+    return row / scale, diagonal / scale
+
+def pack_grm(animal_ids, frequencies, grm):
+    buffer = io.BytesIO()
+    np.savez_compressed(
+        buffer,
+        animal_ids=np.array([str(animal_id) for animal_id in animal_ids]),
+        frequencies=frequencies,
+        matrix=grm
+    )
+    return buffer.getvalue()
+
+def unpack_grm(record):
+    """Load (animal_ids, frequencies, matrix) from a GenomicRelationshipMatrix."""
+    with np.load(io.BytesIO(record.matrix_data)) as archive:
+        return archive['animal_ids'].tolist(), archive['frequencies'], archive['matrix']
+
+def _marker_map_record(marker_map_id):
+    from src.models.genomics import GenotypeMarkerMap
+    
+    record = db.session.get(GenotypeMarkerMap, as_uuid(marker_map_id))
+    if not record:
+        raise ValueError('Marker map not found')
+    return record
+
+def _load_matrix(animal_ids, marker_map_id):
+    found, matrix = genotype_store.get_matrix(animal_ids, marker_map_id)
+    missing = sorted(set(str(animal_id) for animal_id in animal_ids) - set(found))
+    if missing:
+        raise ValueError(f"No packed genotype on this marker map for animals: {', '.join(missing)}")
+    return found, matrix
+
+def find_cached_grm(animal_ids, marker_map_id):
+    """Return the cached GenomicRelationshipMatrix for this animal/marker set, if any."""
+    from src.models.genomics import GenomicRelationshipMatrix
+    
+    marker_map = _marker_map_record(marker_map_id)
+    cache_key = grm_cache_key(marker_map.checksum, animal_ids)
+    return GenomicRelationshipMatrix.query.filter_by(cache_key=cache_key).first()
+
+def compute_grm(animal_ids, marker_map_id, block_size=DEFAULT_BLOCK_SIZE, progress_callback=None):
+    """
+    Get or build the GRM for a set of animals on one marker map. Caller commits.
+    
+    Returns:
+        Tuple of (GenomicRelationshipMatrix, created flag)
+    """
+    from src.models.genomics import GenomicRelationshipMatrix
+    
+    animal_ids = sorted({str(as_uuid(animal_id)) for animal_id in animal_ids})
+    if len(animal_ids) < 2:
+        raise ValueError('At least two animals are required')
+    
+    marker_map = _marker_map_record(marker_map_id)
+    cache_key = grm_cache_key(marker_map.checksum, animal_ids)
+    record = GenomicRelationshipMatrix.query.filter_by(cache_key=cache_key).first()
+    if record:
+        return record, False
+    
+    animal_ids, matrix = _load_matrix(animal_ids, marker_map.id)
+    grm, frequencies, scale = vanraden_grm(matrix, block_size=block_size, progress_callback=progress_callback)
+    
+    record = GenomicRelationshipMatrix(
+        cache_key=cache_key,
+        marker_map_id=marker_map.id,
+        animal_count=len(animal_ids),
+        marker_count=int(np.count_nonzero(~np.isnan(frequencies))),
+        scale=scale,
+        matrix_data=pack_grm(animal_ids, frequencies, grm)
+    )
+    db.session.add(record)
+    db.session.flush()
+    
+    return record, True
+
+def add_animal_to_grm(base_record, animal_id, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Extend a cached GRM with one newly genotyped animal. Caller commits.
+    
+    Only the new animal's row is computed, against the base matrix's allele
+    frequencies, so existing relationships are unchanged.
+    
+    Returns:
+        Tuple of (GenomicRelationshipMatrix, created flag)
+    """
+    from src.models.genomics import GenomicRelationshipMatrix
+    
+    animal_id = str(as_uuid(animal_id))
+    animal_ids, frequencies, grm = unpack_grm(base_record)
+    if animal_id in animal_ids:
+        return base_record, False
+    
+    marker_map = _marker_map_record(base_record.marker_map_id)
+    extended_ids = animal_ids + [animal_id]
+    cache_key = grm_cache_key(marker_map.checksum, extended_ids, base_record.id)
+    record = GenomicRelationshipMatrix.query.filter_by(cache_key=cache_key).first()
+    if record:
+        return record, False
+    
+    _, calls = _load_matrix([animal_id], marker_map.id)
+    _, matrix = _load_matrix(animal_ids, marker_map.id)
+    row, diagonal = relationship_row(matrix, calls[0], frequencies, base_record.scale, block_size)
+    
+    size = len(animal_ids)
+    extended = np.empty((size + 1, size + 1), dtype=np.float64)
+    extended[:size, :size] = grm
+    extended[size, :size] = row
+    extended[:size, size] = row
+    extended[size, size] = diagonal
+    
+    record = GenomicRelationshipMatrix(
+        cache_key=cache_key,
+        marker_map_id=marker_map.id,
+        animal_count=size + 1,
+        marker_count=base_record.marker_count,
+        scale=base_record.scale,
+        base_matrix_id=base_record.id,
+        matrix_data=pack_grm(extended_ids, frequencies, extended)
+    )
+    db.session.add(record)
+    db.session.flush()
+    
+    return record, True
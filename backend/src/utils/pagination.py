@@ -0,0 +1,237 @@
+"""
+Shared pagination for list endpoints.
+
+Offset mode (the default) keeps the classic page/per_page contract backed by
+Flask-SQLAlchemy's paginate(), which costs a COUNT(*) plus an OFFSET scan.
+
+Cursor mode is opt-in with a `cursor` query parameter (empty for the first
+page). Rows are fetched with a keyset predicate on the sort key plus the
+primary key, so every page is an index range scan no matter how deep, and
+the response carries an opaque `next_cursor` for the following page.
+
+Either mode accepts `total=exact|approximate|none`. Approximate totals come
+from the PostgreSQL planner's row estimate, or from the materialised entity
+counters when the request has no filters, so no COUNT(*) runs at all.
+"""
+
+import base64
+import hashlib
+import json
+import math
+import uuid
+from datetime import datetime, date
+from decimal import Decimal
+from flask import request
+from sqlalchemy import and_, or_, inspect
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import UnaryExpression
+from src.database import db
+
+PAGINATION_ARGS = {'page', 'per_page', 'cursor', 'total'}
+TOTAL_MODES = ('exact', 'approximate', 'none')
+
+# Python types restored from their JSON (string) form when decoding a cursor
+CURSOR_TYPES = {
+    datetime: datetime.fromisoformat,
+    date: date.fromisoformat,
+    uuid.UUID: uuid.UUID,
+    Decimal: Decimal
+}
+
+class InvalidCursor(ValueError):
+    """The cursor is malformed or was issued for a different sort order."""
+
+def _sort_keys(query, order_by):
+    """(column, descending) pairs for the order, with the primary key appended as tiebreaker."""
+    keys = []
+    for expression in order_by:
+        if isinstance(expression, UnaryExpression) and expression.modifier in (operators.desc_op, operators.asc_op):
+            keys.append((expression.element, expression.modifier is operators.desc_op))
+        else:
+            keys.append((expression, False))
+    
+    entity = query.column_descriptions[0]['entity']
+    primary_key = inspect(entity).primary_key[0]
+    if not any(column.key == primary_key.key for column, _ in keys):
+        keys.append((primary_key, keys[0][1] if keys else False))
+    return keys
+
+def _fingerprint(keys):
+    description = ','.join(f"{column.key}:{'d' if descending else 'a'}" for column, descending in keys)
+    return hashlib.sha256(description.encode('utf-8')).hexdigest()[:12]
+
+def encode_cursor(keys, item):
+    """Opaque cursor positioned after item."""
+    payload = {
+        'o': _fingerprint(keys),
+        'k': [getattr(item, column.key) for column, _ in keys]
+    }
+    raw = json.dumps(payload, default=str, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(keys, cursor):
+    """Sort key values stored in a cursor, converted back to column types."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        values = payload['k']
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursor('Malformed cursor')
+    
+    if payload.get('o') != _fingerprint(keys) or len(values) != len(keys):
+        raise InvalidCursor('Cursor does not match this listing')
+    
+    decoded = []
+    for (column, _), value in zip(keys, values):
+        try:
+            converter = CURSOR_TYPES.get(column.type.python_type)
+        except NotImplementedError:
+            converter = None
+        try:
+            decoded.append(converter(value) if converter and value is not None else value)
+        except (ValueError, TypeError, ArithmeticError):
+            raise InvalidCursor('Malformed cursor')
+    return decoded
+
+def _nullable(column):
+    return getattr(column, 'nullable', True)
+
+def _ordering(column, descending):
+    """
+    Cursor-mode ORDER BY term. NULL sorts as the largest value (PostgreSQL's
+    default, so existing indexes still serve the order) on every backend.
+    """
+    term = column.desc() if descending else column.asc()
+    if _nullable(column):
+        term = term.nulls_first() if descending else term.nulls_last()
+    return term
+
+def _beyond(column, descending, value):
+    """Rows strictly after value on one sort key, or None if there are none."""
+    if descending:
+        return column.isnot(None) if value is None else column < value
+    if value is None:
+        return None
+    return or_(column > value, column.is_(None)) if _nullable(column) else column > value
+
+def _after(keys, values):
+    """Keyset predicate for rows strictly after values in the cursor order."""
+    clauses = []
+    for i, ((column, descending), value) in enumerate(zip(keys, values)):
+        beyond = _beyond(column, descending, value)
+        if beyond is None:
+            continue
+        equal = [
+            keys[j][0].is_(None) if values[j] is None else keys[j][0] == values[j]
+            for j in range(i)
+        ]
+        clauses.append(and_(*equal, beyond))
+    return or_(*clauses) if clauses else None
+
+def _counter_total(counter_entity):
+    from src.utils.counters import entity_counters
+    return entity_counters.read(counter_entity)[counter_entity].total
+
+def _planner_estimate(query):
+    """Row estimate from EXPLAIN on PostgreSQL, or None if unavailable."""
+    bind = db.session.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return None
+    try:
+        statement = query.order_by(None).statement.compile(
+            dialect=bind.dialect, compile_kwargs={'literal_binds': True}
+        )
+    except Exception:
+        return None  # Parameters without a literal form
+    plan = db.session.connection().exec_driver_sql(f'EXPLAIN (FORMAT JSON) {statement}').scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+def count_total(query, mode, counter_entity=None):
+    """
+    Total rows for a listing.
+    
+    Args:
+        query: Filtered list query
+        mode: 'exact', 'approximate' or 'none'
+        counter_entity: entity_counters entity this query lists, used for
+            approximate totals when the request carries no filters
+    
+    Returns:
+        Tuple of (total or None, whether the total is an estimate)
+    """
+    if mode == 'none':
+        return None, False
+    
+    if mode == 'approximate':
+        unfiltered = not set(request.args) - PAGINATION_ARGS
+        if counter_entity and unfiltered:
+            return _counter_total(counter_entity), True
+        estimate = _planner_estimate(query)
+        if estimate is not None:
+            return estimate, True
+    
+    return query.order_by(None).count(), False
+
+def paginate_query(query, order_by, page, per_page, counter_entity=None):
+    """
+    Order and paginate a list query using the mode the request asks for.
+    
+    Args:
+        query: Filtered, unordered list query
+        order_by: Sort expressions, e.g. [Animal.created_at.desc()]
+        page: Page number (offset mode)
+        per_page: Page size
+        counter_entity: entity_counters entity for approximate totals
+    
+    Returns:
+        Tuple of (items, pagination dictionary for the response)
+    """
+    total_mode = request.args.get('total', 'exact' if 'cursor' not in request.args else 'none')
+    if total_mode not in TOTAL_MODES:
+        total_mode = 'exact'
+    
+    if 'cursor' not in request.args:
+        pagination = query.order_by(*order_by).paginate(
+            page=page, per_page=per_page, error_out=False, count=False
+        )
+        total, estimated = count_total(query, total_mode, counter_entity)
+        result = {
+            'page': page,
+            'per_page': per_page,
+            'total': total,
+            'pages': math.ceil(total / per_page) if total is not None and per_page else None,
+            'has_next': len(pagination.items) == per_page if total is None else page * per_page < total,
+            'has_prev': page > 1
+        }
+        if estimated:
+            result['total_is_estimate'] = True
+        return pagination.items, result
+    
+    keys = _sort_keys(query, order_by)
+    cursor = request.args.get('cursor')
+    
+    keyset_query = query
+    if cursor:
+        after = _after(keys, decode_cursor(keys, cursor))
+        if after is not None:
+            keyset_query = keyset_query.filter(after)
+    keyset_query = keyset_query.order_by(*[_ordering(column, descending) for column, descending in keys])
+    
+    # One extra row tells whether another page follows
+    items = keyset_query.limit(per_page + 1).all()
+    has_next = len(items) > per_page
+    items = items[:per_page]
+    
+    total, estimated = count_total(query, total_mode, counter_entity)
+    result = {
+        'mode': 'cursor',
+        'per_page': per_page,
+        'next_cursor': encode_cursor(keys, items[-1]) if has_next else None,
+        'has_next': has_next,
+        'total': total
+    }
+    if estimated:
+        result['total_is_estimate'] = True
+    return items, result
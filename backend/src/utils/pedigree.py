@@ -0,0 +1,253 @@
+"""
+In-memory pedigree index.
+
+Sire/dam links for every animal are loaded in one scan of the animals table
+into parent and offspring adjacency maps, so ancestor, descendant and
+relationship queries walk dictionaries instead of issuing one query per
+animal. The index is rebuilt lazily after invalidation (or once it is older
+than PEDIGREE_INDEX_TTL seconds, which bounds staleness across worker
+processes) and patched in place when a single animal's parents change.
+
+Additive relationships use the tabular method over the closed set of
+ancestors of the animals involved, ordered parents before offspring.
+"""
+
+import threading
+import time
+from collections import deque
+import numpy as np
+from src.database import db
+
+class PedigreeIndex:
+    """Parent/offspring adjacency index over all animals, including soft-deleted ones."""
+    
+    def __init__(self, app=None):
+        self.app = app
+        self.ttl = None
+        self._parents = None
+        self._offspring = None
+        self._built_at = None
+        self._lock = threading.RLock()
+        
+        if app:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        """Initialize pedigree index with Flask app."""
+        self.app = app
+        self.ttl = app.config.get('PEDIGREE_INDEX_TTL', 300)
+    
+    # Index maintenance
+    
+    def build(self):
+        """Load every animal's sire and dam in one query."""
+        from src.models.animal import Animal
+        
+        rows = db.session.query(Animal.id, Animal.father_id, Animal.mother_id).all()
+        
+        parents = {}
+        offspring = {}
+        for animal_id, father_id, mother_id in rows:
+            animal_id = str(animal_id)
+            sire = str(father_id) if father_id else None
+            dam = str(mother_id) if mother_id else None
+            parents[animal_id] = (sire, dam)
+            for parent_id in (sire, dam):
+                if parent_id:
+                    offspring.setdefault(parent_id, set()).add(animal_id)
+        
+        with self._lock:
+            self._parents = parents
+            self._offspring = offspring
+            self._built_at = time.monotonic()
+    
+    def invalidate(self):
+        """Drop the index; the next query rebuilds it."""
+        with self._lock:
+            self._parents = None
+            self._offspring = None
+            self._built_at = None
+    
+    def update_parents(self, animal_id, father_id, mother_id):
+        """Apply one animal's (new) sire and dam to a built index in place."""
+        with self._lock:
+            if self._parents is None:
+                return
+            
+            # Offspring sets are replaced rather than mutated so concurrent walks stay valid
+            animal_id = str(animal_id)
+            for parent_id in self._parents.get(animal_id, (None, None)):
+                if parent_id and parent_id in self._offspring:
+                    self._offspring[parent_id] = self._offspring[parent_id] - {animal_id}
+            
+            sire = str(father_id) if father_id else None
+            dam = str(mother_id) if mother_id else None
+            self._parents[animal_id] = (sire, dam)
+            for parent_id in (sire, dam):
+                if parent_id:
+                    self._offspring[parent_id] = self._offspring.get(parent_id, frozenset()) | {animal_id}
+    
+    def _ensure_built(self):
+        with self._lock:
+            stale = self._built_at is None or (
+                self.ttl and time.monotonic() - self._built_at > self.ttl
+            )
+            if stale:
+                self.build()
+            return self._parents, self._offspring
+    
+    def stats(self):
+        """Index size and age."""
+        with self._lock:
+            if self._parents is None:
+                return {'built': False}
+            return {
+                'built': True,
+                'animals': len(self._parents),
+                'with_offspring': len(self._offspring),
+                'age_seconds': round(time.monotonic() - self._built_at, 1)
+            }
+    
+    # Queries
+    
+    def contains(self, animal_id):
+        parents, _ = self._ensure_built()
+        return str(animal_id) in parents
+    
+    def parents_of(self, animal_id):
+        parents, _ = self._ensure_built()
+        return parents.get(str(animal_id), (None, None))
+    
+    def ancestors(self, animal_id, max_depth=None):
+        """
+        Ancestors up to max_depth generations back.
+        
+        Returns:
+            Dictionary of ancestor id -> nearest generation (1 = parents)
+        """
+        parents, _ = self._ensure_built()
+        return self._walk(str(animal_id), lambda node: parents.get(node, ()), max_depth)
+    
+    def descendants(self, animal_id, max_depth=None):
+        """
+        Descendants up to max_depth generations down.
+        
+        Returns:
+            Dictionary of descendant id -> nearest generation (1 = offspring)
+        """
+        _, offspring = self._ensure_built()
+        return self._walk(str(animal_id), lambda node: offspring.get(node, ()), max_depth)
+    
+    def common_ancestors(self, first_id, second_id, max_depth=None):
+        """
+        Ancestors shared by two animals.
+        
+        Returns:
+            Dictionary of ancestor id -> (generation from first, generation from second)
+        """
+        first = self.ancestors(first_id, max_depth)
+        second = self.ancestors(second_id, max_depth)
+        return {
+            ancestor_id: (first[ancestor_id], second[ancestor_id])
+            for ancestor_id in first.keys() & second.keys()
+        }
+    
+    @staticmethod
+    def _walk(start, neighbours, max_depth):
+        found = {}
+        queue = deque([(start, 0)])
+        
+        while queue:
+            node, depth = queue.popleft()
+            if max_depth is not None and depth >= max_depth:
+                continue
+            for neighbour in neighbours(node):
+                if neighbour and neighbour != start and neighbour not in found:
+                    found[neighbour] = depth + 1
+                    queue.append((neighbour, depth + 1))
+        
+        return found
+    
+    # Relationships
+    
+    def _ordered_subpedigree(self, animal_ids):
+        """Animals plus all their ancestors, sorted parents before offspring."""
+        parents, _ = self._ensure_built()
+        
+        members = set()
+        for animal_id in animal_ids:
+            members.add(animal_id)
+            members.update(self.ancestors(animal_id))
+        
+        # Kahn's algorithm restricted to the sub-pedigree
+        pending = {
+            member: sum(1 for parent_id in parents.get(member, ()) if parent_id in members)
+            for member in members
+        }
+        children = {}
+        for member in members:
+            for parent_id in parents.get(member, ()):
+                if parent_id in members:
+                    children.setdefault(parent_id, []).append(member)
+        
+        queue = deque(sorted(member for member, count in pending.items() if count == 0))
+        order = []
+        while queue:
+            member = queue.popleft()
+            order.append(member)
+            for child in children.get(member, ()):
+                pending[child] -= 1
+                if pending[child] == 0:
+                    queue.append(child)
+        
+        if len(order) != len(members):
+            raise ValueError('Pedigree contains a cycle')
+        
+        return order, parents
+    
+    def relationship_matrix(self, animal_ids):
+        """
+        Additive relationship matrix (A) for the given animals by the tabular method.
+        
+        Returns:
+            Tuple of (animal ids in matrix order, float64 matrix)
+        """
+        animal_ids = [str(animal_id) for animal_id in animal_ids]
+        order, parents = self._ordered_subpedigree(animal_ids)
+        position = {member: i for i, member in enumerate(order)}
+        
+        size = len(order)
+        matrix = np.zeros((size, size), dtype=np.float64)
+        
+        for i, member in enumerate(order):
+            sire, dam = (position.get(parent_id) for parent_id in parents.get(member, (None, None)))
+            
+            row = np.zeros(i, dtype=np.float64)
+            if sire is not None:
+                row += 0.5 * matrix[:i, sire]
+            if dam is not None:
+                row += 0.5 * matrix[:i, dam]
+            matrix[i, :i] = row
+            matrix[:i, i] = row
+            
+            matrix[i, i] = 1.0
+            if sire is not None and dam is not None:
+                matrix[i, i] += 0.5 * matrix[sire, dam]
+        
+        indices = [position[animal_id] for animal_id in animal_ids]
+        return animal_ids, matrix[np.ix_(indices, indices)]
+    
+    def additive_relationship(self, first_id, second_id):
+        """Additive genetic relationship a(x, y) between two animals."""
+        _, matrix = self.relationship_matrix([first_id, second_id])
+        return float(matrix[0, 1])
+    
+    def inbreeding_coefficient(self, animal_id):
+        """Wright's inbreeding coefficient F = a(sire, dam) / 2."""
+        sire, dam = self.parents_of(animal_id)
+        if not sire or not dam:
+            return 0.0
+        return self.additive_relationship(sire, dam) / 2.0
+
+# Global pedigree index instance
+pedigree_index = PedigreeIndex()
@@ -0,0 +1,145 @@
+"""
+Permission bitsets.
+
+The registry gives every Permission a bit (in created_at order, so bits stay
+put as permissions are added) and keeps each role's permissions as one
+integer mask. A user's effective permissions are the OR of their roles'
+masks, and a permission check is a single AND against the permission's bit.
+
+Masks are rebuilt on the next check after a commit touches roles,
+permissions or role_permissions, in this process or (through
+cache_invalidator's Redis channel) another one. Without that channel other
+processes' commits go unseen, so masks are then also rebuilt once they are
+PERMISSION_REBUILD_INTERVAL seconds old. The registry version, a digest of
+the bit assignment, lets masks embedded in JWT claims be recognised as
+current.
+"""
+
+import hashlib
+import threading
+import time
+from sqlalchemy import event, select
+from src.database import db
+
+CLAIM = 'perm'  # JWT claim carrying roles, mask and the versions they were read at
+REBUILD_TAGS = {'roles', 'permissions'}
+
+class PermissionRegistry:
+    """Bit index per permission and permission mask per role."""
+    
+    def __init__(self, app=None, invalidator=None):
+        self.app = app
+        self.version = None
+        self._bits = {}  # permission name -> 1 << index
+        self._names = []  # index -> permission name
+        self._role_masks = {}  # role name -> mask
+        self._stale = True
+        self._built_at = 0.0
+        self._invalidator = None
+        self.rebuild_interval = 30
+        self._lock = threading.Lock()
+        
+        if app:
+            self.init_app(app, invalidator)
+    
+    def init_app(self, app, invalidator):
+        """Initialize permission registry with Flask app and subscribe to committed changes."""
+        from src.models.user import Role
+        
+        self.app = app
+        self.rebuild_interval = app.config.get('PERMISSION_REBUILD_INTERVAL', 30)
+        self._invalidator = invalidator
+        invalidator.subscribe(self._on_invalidate)
+        
+        # role.permissions changes only write role_permissions, which flushes no Role row
+        if not event.contains(Role.permissions, 'append', _mark_permissions_changed):
+            event.listen(Role.permissions, 'append', _mark_permissions_changed)
+            event.listen(Role.permissions, 'remove', _mark_permissions_changed)
+    
+    def _on_invalidate(self, tags, remote):
+        if REBUILD_TAGS.intersection(tags):
+            self._stale = True
+    
+    def build(self):
+        """Reload bit assignments and role masks (three small queries)."""
+        from src.models.user import Role, Permission, role_permissions
+        
+        with self._lock:
+            # Cleared first: a commit landing during the reload marks it stale again
+            self._stale = False
+            self._built_at = time.monotonic()
+            try:
+                names = [name for (name,) in db.session.execute(
+                    select(Permission.name).order_by(Permission.created_at, Permission.name)
+                )]
+                bits = {name: 1 << index for index, name in enumerate(names)}
+                
+                role_masks = {name: 0 for (name,) in db.session.execute(select(Role.name))}
+                for role, permission in db.session.execute(
+                    select(Role.name, Permission.name)
+                    .join(role_permissions, role_permissions.c.role_id == Role.id)
+                    .join(Permission, Permission.id == role_permissions.c.permission_id)
+                ):
+                    role_masks[role] |= bits[permission]
+            except Exception:
+                self._stale = True
+                raise
+            
+            self._names = names
+            self._bits = bits
+            self._role_masks = role_masks
+            self.version = hashlib.blake2b('\n'.join(names).encode('utf-8'), digest_size=6).hexdigest()
+    
+    def _expired(self):
+        # With the Redis channel every process hears of every commit; without it, age out
+        if self._invalidator is None or self._invalidator.channel:
+            return False
+        return time.monotonic() - self._built_at > self.rebuild_interval
+    
+    def _ensure_current(self):
+        if self._stale or self._expired():
+            self.build()
+    
+    # Masks
+    
+    def bit(self, permission_name):
+        """The permission's bit, or 0 for unknown permissions."""
+        self._ensure_current()
+        return self._bits.get(permission_name, 0)
+    
+    def role_mask(self, role_name):
+        self._ensure_current()
+        return self._role_masks.get(role_name, 0)
+    
+    def mask_for_roles(self, role_names):
+        """Effective mask of a set of roles."""
+        self._ensure_current()
+        mask = 0
+        for role in role_names:
+            mask |= self._role_masks.get(role, 0)
+        return mask
+    
+    def names(self, mask):
+        """Permission names set in mask."""
+        self._ensure_current()
+        return {name for name in self._names if mask & self._bits[name]}
+    
+    def has(self, mask, permission_name):
+        return bool(mask & self.bit(permission_name))
+    
+    def current_version(self):
+        self._ensure_current()
+        return self.version
+
+def _mark_permissions_changed(target, value, initiator):
+    from sqlalchemy.orm import object_session
+    from src.utils.cache_events import PENDING_KEY
+    
+    session = object_session(target)
+    if session is not None:
+        # Published with the rest of the transaction's tags once it commits
+        session.info.setdefault(PENDING_KEY, set()).add('permissions')
+    return value
+
+# Global permission registry instance
+permission_registry = PermissionRegistry()
@@ -0,0 +1,221 @@
+"""
+Per-request principal resolution.
+
+A principal is the authenticated user's identity, account status, role
+names and effective permission mask (see utils/permissions.py). It is
+resolved at most once per request into g.principal, and across requests it
+is served from the shared cache for PRINCIPAL_CACHE_TTL seconds. The cached
+entry carries the versions of the user's cache tags, so it is dropped as
+soon as roles or permissions are edited (cache_invalidator bumps 'roles'
+and 'permissions'), routes/users.py changes the user's roles, or any commit
+changes User.is_active (permissions:<id>, from an attribute listener; bulk
+updates of users bump 'permissions'). The user:<id> tag is deliberately not
+used: it moves on every write that references the user, such as created_by
+columns.
+
+With Redis, access tokens carry the roles and mask in a claim together with
+those tag versions (principal_claims). While the versions still match, the
+principal is taken from the token without touching the database or the
+cache entry. Without Redis the versions are per process, so another worker
+or a restarted one could not tell a stale claim from a current one: no claim
+is issued and none is trusted. Tag keys are seeded from the clock when a
+claim is issued, and a claim is rejected when any of its tags reads back as
+0, so evicted or flushed tag keys never revive an old claim.
+
+The User row itself is only loaded when a view asks for it, also at most
+once per request (g.current_user).
+"""
+
+from flask import g
+from flask_jwt_extended import get_jwt_identity, get_jwt
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+from src.database import db
+from src.utils.cache_events import PENDING_KEY
+from src.utils.genotype_store import as_uuid
+from src.utils.permissions import permission_registry, CLAIM
+
+PERMISSIONS_TAG = 'permissions'  # Global permissions version stamp
+
+class Principal:
+    """Authenticated identity with its role names and permission mask."""
+    
+    __slots__ = ('id', 'username', 'email', 'is_active', 'roles', 'mask')
+    
+    def __init__(self, id, username, email, is_active, roles=(), mask=None):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.is_active = is_active
+        self.roles = frozenset(roles)
+        self.mask = permission_registry.mask_for_roles(self.roles) if mask is None else mask
+    
+    @property
+    def permissions(self):
+        return permission_registry.names(self.mask)
+    
+    def has_role(self, role_name):
+        return role_name in self.roles
+    
+    def has_permission(self, permission_name):
+        return permission_registry.has(self.mask, permission_name)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'username': self.username,
+            'email': self.email,
+            'is_active': self.is_active,
+            'roles': sorted(self.roles)
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        # The mask is recomputed against this process's registry
+        return cls(**data)
+
+class PrincipalCache:
+    """Shared, version-stamped cache of principals by user id."""
+    
+    def __init__(self, app=None, cache=None):
+        self.app = app
+        self.cache = cache
+        self.ttl = 30
+        
+        if app:
+            self.init_app(app, cache)
+    
+    def init_app(self, app, cache):
+        """Initialize principal cache with Flask app and cache."""
+        from src.models.user import User
+        
+        self.app = app
+        self.cache = cache
+        self.ttl = app.config.get('PRINCIPAL_CACHE_TTL', 30)
+        
+        # Tokens carry no account status; every status change must retire them
+        if not event.contains(User.is_active, 'set', _mark_status_changed):
+            event.listen(User.is_active, 'set', _mark_status_changed)
+            event.listen(Session, 'do_orm_execute', _mark_bulk_status_change)
+    
+    @staticmethod
+    def _key(user_id):
+        return f'principal:{user_id}'
+    
+    @staticmethod
+    def _tags(user_id):
+        # 'roles' and 'permissions' are bumped by commits to those tables
+        return ['roles', PERMISSIONS_TAG, f'{PERMISSIONS_TAG}:{user_id}']
+    
+    def _query(self, user_id):
+        """Load a principal with two queries: the user row and its role names."""
+        from src.models.user import User, Role, user_roles
+        
+        user = db.session.execute(
+            select(User.id, User.username, User.email, User.is_active).where(User.id == as_uuid(user_id))
+        ).first()
+        if user is None:
+            return None
+        
+        roles = db.session.execute(
+            select(Role.name)
+            .select_from(user_roles)
+            .join(Role, Role.id == user_roles.c.role_id)
+            .where(user_roles.c.user_id == user.id)
+        ).scalars().all()
+        
+        return Principal(
+            id=str(user.id),
+            username=user.username,
+            email=user.email,
+            is_active=user.is_active,
+            roles=roles
+        )
+    
+    def load(self, user_id):
+        """Principal for user_id from the shared cache, or None if the user does not exist."""
+        key = self._key(user_id)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return Principal.from_dict(cached)
+        
+        # Read tag versions first so a change committed during the query invalidates this entry
+        versions = self.cache.tag_versions(self._tags(user_id))
+        principal = self._query(user_id)
+        if principal is not None:
+            self.cache.set(key, principal.to_dict(), timeout=self.ttl, tags=versions)
+        return principal
+    
+    def claims(self, user_id):
+        """Access token claims embedding the user's roles and permission mask ({} without Redis)."""
+        if not self.cache.redis_client:
+            return {}
+        versions = self.cache.seed_tags(self._tags(user_id))
+        principal = self.load(user_id)
+        if principal is None:
+            return {}
+        return {CLAIM: {
+            'v': permission_registry.current_version(),
+            'm': format(principal.mask, 'x'),
+            'r': sorted(principal.roles),
+            't': versions
+        }}
+    
+    def from_claims(self, user_id, claims):
+        """Principal from a token claim, or None if anything changed since it was issued."""
+        claim = claims.get(CLAIM)
+        if not claim or not self.cache.redis_client or claim.get('v') != permission_registry.current_version():
+            return None
+        versions = self.cache.tag_versions(self._tags(user_id))
+        # A version of 0 is a tag key that was evicted or flushed: its history is unknown
+        if 0 in versions.values() or claim.get('t') != versions:
+            return None
+        # Deactivation bumps permissions:<id>, so a matching claim belongs to an active user
+        return Principal(str(user_id), None, None, True, roles=claim.get('r', []), mask=int(claim['m'], 16))
+    
+    def invalidate(self, user_id=None):
+        """Bump the permissions version stamp of one user (roles or status changed), or of everyone."""
+        self.cache.invalidate_tags(f'{PERMISSIONS_TAG}:{user_id}' if user_id else PERMISSIONS_TAG)
+
+def _pending_tags(session):
+    # Published with the rest of the transaction's tags once it commits
+    return session.info.setdefault(PENDING_KEY, set())
+
+def _mark_status_changed(target, value, oldvalue, initiator):
+    session = object_session(target)
+    if session is not None and target.id is not None and value != oldvalue:
+        _pending_tags(session).add(f'{PERMISSIONS_TAG}:{target.id}')
+    return value
+
+def _mark_bulk_status_change(orm_execute_state):
+    # query.update()/delete() on users bypass attribute events; retire every principal
+    mapper = orm_execute_state.bind_mapper
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) and mapper is not None \
+            and mapper.local_table.name == 'users':
+        _pending_tags(orm_execute_state.session).add(PERMISSIONS_TAG)
+
+# Global principal cache instance
+principal_cache = PrincipalCache()
+
+def principal_claims(user_id):
+    """additional_claims for create_access_token."""
+    return principal_cache.claims(user_id)
+
+def current_principal():
+    """The authenticated principal of this request (None if unknown), resolved once."""
+    if 'principal' not in g:
+        user_id = get_jwt_identity()
+        principal = None
+        if user_id:
+            principal = principal_cache.from_claims(user_id, get_jwt()) or principal_cache.load(user_id)
+        g.principal = principal
+    return g.principal
+
+def current_user():
+    """The authenticated User row, loaded at most once per request."""
+    from src.models.user import User
+    
+    if g.get('current_user') is None:
+        principal = current_principal()
+        g.current_user = db.session.get(User, as_uuid(principal.id)) if principal else None
+    return g.current_user
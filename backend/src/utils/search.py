@@ -0,0 +1,360 @@
+"""
+Indexed text search over animals, customers and samples.
+
+Every searchable entity has a search document: its identifier columns plus a
+few descriptive text columns, lower-cased and joined with spaces. The
+document is indexed so a substring search no longer scans the table:
+
+- PostgreSQL: a pg_trgm GIN index on the document expression (serves
+  LIKE '%term%' and similarity()), a GIN tsvector index on the same
+  expression for word-prefix queries, and a text_pattern_ops btree on each
+  lower(identifier) so prefixes such as 'BOV-2024-12' are range scans.
+- SQLite: one FTS5 table per entity with the trigram tokenizer, keyed by
+  the source row's primary key (an UNINDEXED id column; rowids of tables
+  without an INTEGER PRIMARY KEY may change on VACUUM) and kept current by
+  triggers.
+
+List endpoints filter with search_index.matches(); the /search endpoint
+ranks across entity types with search_index.search(): an exact identifier
+match first, then identifier prefixes, then text relevance. Terms shorter
+than a trigram fall back to plain ILIKE in list filters and to identifier
+prefix lookups in /search; a database where the indexes could not be
+created falls back to ILIKE throughout.
+"""
+
+import re
+from sqlalchemy import (text, select, or_, and_, case, func, literal, literal_column, bindparam,
+                        table as table_clause, column)
+from src.database import db
+
+TRIGRAM_LENGTH = 3  # Shortest term the trigram indexes can serve
+LOCK_KEY = 'search_indexes'  # PostgreSQL advisory lock name for index builds
+
+# Entity type -> source table, identifier and text columns, and result labels
+SEARCH_ENTITIES = {
+    'animal': {
+        'table': 'animals',
+        'identifiers': ('animal_id', 'microchip'),
+        'text': ('name', 'owner'),
+        'title': 'name',
+        'subtitle': 'animal_id',
+        'soft_delete': 'deleted_at'
+    },
+    'customer': {
+        'table': 'customers',
+        'identifiers': ('customer_id', 'tax_id'),
+        'text': ('name',),
+        'title': 'name',
+        'subtitle': 'customer_id'
+    },
+    'lab_sample': {
+        'table': 'lab_samples',
+        'identifiers': ('sample_id', 'barcode'),
+        'text': ('sample_type',),
+        'title': 'sample_id',
+        'subtitle': 'sample_type'
+    },
+    'biobank_sample': {
+        'table': 'biobank_samples',
+        'identifiers': ('sample_id', 'container_id'),
+        'text': ('sample_name',),
+        'title': 'sample_name',
+        'subtitle': 'sample_id'
+    },
+    'genomic_analysis': {
+        'table': 'genomic_analyses',
+        'identifiers': ('analysis_id',),
+        'text': ('analysis_name',),
+        'title': 'analysis_name',
+        'subtitle': 'analysis_id'
+    }
+}
+
+# Score bonuses on top of text relevance (which is between 0 and 1)
+EXACT_ID_SCORE = 3.0
+PREFIX_ID_SCORE = 2.0
+
+def _columns(spec):
+    return spec['identifiers'] + spec['text']
+
+def _document_sql(spec, prefix=''):
+    """SQL of the lower-cased search document; the PostgreSQL indexes are built on this exact expression."""
+    parts = " || ' ' || ".join(f"coalesce({prefix}{column}, '')" for column in _columns(spec))
+    return f"lower({parts})"
+
+def _document(spec):
+    """Search document as a query expression, qualified so it survives joins."""
+    return literal_column(_document_sql(spec, f"{spec['table']}."))
+
+def _fts_name(spec):
+    return f"search_fts_{spec['table']}"
+
+def _fts_table(spec):
+    """Lightweight table construct for an entity's FTS5 table."""
+    return table_clause(_fts_name(spec), column('id'), column('document'))
+
+def _fts_match(spec, term):
+    """FTS5 MATCH criterion (the table-name form, which bm25() ranks)."""
+    return literal_column(_fts_name(spec)).op('MATCH')(_fts_phrase(term))
+
+def escape_like(term):
+    """Escape LIKE wildcards so the term matches literally (escape character '\\')."""
+    return re.sub(r'([\\%_])', r'\\\1', term)
+
+def _fts_phrase(term):
+    """FTS5 query matching the term as a substring (a quoted trigram phrase)."""
+    return '"' + term.replace('"', '""') + '"'
+
+def _tsquery(term):
+    """'word1:* & word2:*' prefix query over the words of the term, or None."""
+    words = re.findall(r'\w+', term.lower())
+    return ' & '.join(f'{word}:*' for word in words) if words else None
+
+class SearchIndex:
+    """Creates the search indexes and builds indexed search queries."""
+    
+    def __init__(self, app=None):
+        self.app = app
+        self.dialect = None
+        self.available = False  # Indexes exist for the current database
+        self.trigram = False  # pg_trgm installed (similarity() available)
+        self.max_results = 100
+        
+        if app:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        """Initialize search with Flask app. Call ensure_schema() once tables exist."""
+        self.app = app
+        self.max_results = app.config.get('SEARCH_MAX_RESULTS', 100)
+    
+    # Schema
+    
+    def ensure_schema(self):
+        """Create any missing search indexes (and the SQLite triggers that maintain them)."""
+        self.dialect = db.engine.dialect.name
+        try:
+            if self.dialect == 'postgresql':
+                self._ensure_postgresql()
+                self.available = True
+            elif self.dialect == 'sqlite':
+                self._ensure_sqlite()
+                self.available = True
+        except Exception as e:
+            self.available = False
+            self.app.logger.warning(f"Search indexes unavailable, falling back to ILIKE: {str(e)}")
+    
+    def _ensure_postgresql(self):
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction, so the build lock is a session lock
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            self.trigram = connection.execute(
+                text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            ).first() is not None
+            if self.trigram and not self._missing_indexes(connection):
+                return
+            
+            # Only one process builds; the others serve queries meanwhile
+            if not connection.execute(select(func.pg_try_advisory_lock(func.hashtext(LOCK_KEY)))).scalar():
+                return
+            try:
+                if not self.trigram:
+                    try:
+                        connection.exec_driver_sql('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+                        self.trigram = True
+                    except Exception as e:
+                        self.app.logger.warning(f"pg_trgm unavailable, substring search will not be indexed: {str(e)}")
+                
+                indexes = self._postgresql_indexes()
+                for name in self._missing_indexes(connection):
+                    # An interrupted concurrent build leaves an invalid index behind
+                    connection.exec_driver_sql(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+                    connection.exec_driver_sql(f"CREATE INDEX CONCURRENTLY {name} {indexes[name]}")
+            finally:
+                connection.execute(select(func.pg_advisory_unlock(func.hashtext(LOCK_KEY))))
+    
+    def _postgresql_indexes(self):
+        """Index name -> index definition for every PostgreSQL search index."""
+        indexes = {}
+        for spec in SEARCH_ENTITIES.values():
+            table = spec['table']
+            document = _document_sql(spec)
+            indexes[f'idx_{table}_search_tsv'] = f"ON {table} USING gin (to_tsvector('simple', {document}))"
+            if self.trigram:
+                indexes[f'idx_{table}_search_trgm'] = f"ON {table} USING gin ({document} gin_trgm_ops)"
+            for column in spec['identifiers']:
+                indexes[f'idx_{table}_{column}_prefix'] = f"ON {table} (lower({column}) text_pattern_ops)"
+        return indexes
+    
+    def _missing_indexes(self, connection):
+        """Names of search indexes that do not exist or are not valid."""
+        names = list(self._postgresql_indexes())
+        valid = {name for name, in connection.execute(
+            text(
+                "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname IN :names AND i.indisvalid AND c.relnamespace = current_schema()::regnamespace"
+            ).bindparams(bindparam('names', expanding=True)),
+            {'names': names}
+        )}
+        return [name for name in names if name not in valid]
+    
+    def _ensure_sqlite(self):
+        with db.engine.begin() as connection:
+            for spec in SEARCH_ENTITIES.values():
+                table, fts = spec['table'], _fts_name(spec)
+                columns = [row[1] for row in connection.exec_driver_sql(f"PRAGMA table_info({fts})")]
+                if columns and 'id' not in columns:
+                    # Keyed by rowid before: drop it and its triggers, and index afresh
+                    for trigger in ('insert', 'update', 'delete'):
+                        connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {fts}_{trigger}")
+                    connection.exec_driver_sql(f"DROP TABLE {fts}")
+                    columns = []
+                
+                connection.exec_driver_sql(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(id UNINDEXED, document, tokenize='trigram')"
+                )
+                connection.exec_driver_sql(
+                    f"CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN "
+                    f"INSERT INTO {fts}(id, document) VALUES (NEW.id, {_document_sql(spec, 'NEW.')}); END"
+                )
+                connection.exec_driver_sql(
+                    f"CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {', '.join(_columns(spec))} ON {table} BEGIN "
+                    f"UPDATE {fts} SET document = {_document_sql(spec, 'NEW.')} WHERE id = NEW.id; END"
+                )
+                connection.exec_driver_sql(
+                    f"CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN "
+                    f"DELETE FROM {fts} WHERE id = OLD.id; END"
+                )
+                
+                if not columns:
+                    # Index rows written before the search table existed
+                    connection.exec_driver_sql(
+                        f"INSERT INTO {fts}(id, document) SELECT id, {_document_sql(spec)} FROM {table}"
+                    )
+    
+    def rebuild(self):
+        """Rebuild the SQLite search tables from their source tables (PostgreSQL indexes need no rebuild)."""
+        if self.dialect != 'sqlite' or not self.available:
+            return
+        with db.engine.begin() as connection:
+            for spec in SEARCH_ENTITIES.values():
+                fts = _fts_name(spec)
+                connection.exec_driver_sql(f"DELETE FROM {fts}")
+                connection.exec_driver_sql(
+                    f"INSERT INTO {fts}(id, document) SELECT id, {_document_sql(spec)} FROM {spec['table']}"
+                )
+    
+    # Query building
+    
+    def _indexed(self, term):
+        return self.available and len(term) >= TRIGRAM_LENGTH
+    
+    def matches(self, entity_type, term):
+        """
+        Filter criterion for rows of entity_type whose search document contains term.
+        
+        Case-insensitive substring match over the same columns as the
+        ILIKE filters it replaces, served by the search indexes.
+        """
+        spec = SEARCH_ENTITIES[entity_type]
+        table = db.metadata.tables[spec['table']]
+        term = term.strip()
+        
+        if not self._indexed(term):
+            pattern = f'%{escape_like(term)}%'
+            return or_(*[table.c[column].ilike(pattern, escape='\\') for column in _columns(spec)])
+        
+        if self.dialect == 'sqlite':
+            return table.c.id.in_(select(_fts_table(spec).c.id).where(_fts_match(spec, term)))
+        
+        pattern = f'%{escape_like(term.lower())}%'
+        return _document(spec).like(bindparam('search_pattern', pattern), escape='\\')
+    
+    def _identifier_score(self, table, spec, term):
+        """EXACT_ID_SCORE / PREFIX_ID_SCORE when an identifier equals or starts with term."""
+        lowered = term.lower()
+        identifiers = [func.lower(table.c[column]) for column in spec['identifiers']]
+        return case(
+            (or_(*[column == lowered for column in identifiers]), literal(EXACT_ID_SCORE)),
+            (or_(*[column.like(f'{escape_like(lowered)}%', escape='\\') for column in identifiers]),
+             literal(PREFIX_ID_SCORE)),
+            else_=literal(0.0)
+        )
+    
+    def _entity_query(self, entity_type, term, limit):
+        """Ranked select of (id, title, subtitle, score) for one entity type."""
+        spec = SEARCH_ENTITIES[entity_type]
+        table = db.metadata.tables[spec['table']]
+        identifier_score = self._identifier_score(table, spec, term)
+        
+        criteria = []
+        if spec.get('soft_delete'):
+            criteria.append(table.c[spec['soft_delete']].is_(None))
+        
+        if not self._indexed(term):
+            # Too short for trigrams: identifier prefixes only, served by the prefix indexes
+            relevance = literal(0.0)
+            prefix = f'{escape_like(term.lower())}%'
+            criteria.append(or_(*[func.lower(table.c[column]).like(prefix, escape='\\') for column in spec['identifiers']]))
+        elif self.dialect == 'sqlite':
+            # bm25() is negative, more negative for better matches; map it into (0, 1)
+            fts = _fts_table(spec)
+            bm25 = -func.bm25(literal_column(_fts_name(spec)))
+            relevance = bm25 / (bm25 + 1.0)
+            table_source = table.join(fts, fts.c.id == table.c.id)
+            criteria.append(_fts_match(spec, term))
+        else:
+            document = _document(spec)
+            tsvector = func.to_tsvector(literal_column("'simple'"), document)
+            tsquery = _tsquery(term)
+            word_match = tsvector.op('@@')(func.to_tsquery(literal_column("'simple'"), tsquery)) if tsquery else None
+            criteria.append(or_(self.matches(entity_type, term), *([word_match] if word_match is not None else [])))
+            relevance = func.similarity(document, term.lower()) if self.trigram else literal(0.0)
+            if tsquery:
+                relevance = func.greatest(relevance, func.ts_rank(tsvector, func.to_tsquery(literal_column("'simple'"), tsquery)))
+        
+        score = (identifier_score + relevance).label('score')
+        statement = select(
+            table.c.id,
+            table.c[spec['title']].label('title'),
+            table.c[spec['subtitle']].label('subtitle'),
+            score
+        )
+        if self.dialect == 'sqlite' and self._indexed(term):
+            statement = statement.select_from(table_source)
+        return statement.where(and_(*criteria)).order_by(score.desc()).limit(limit)
+    
+    def search(self, term, entity_types=None, limit=20):
+        """
+        Search across entity types, best matches first.
+        
+        Args:
+            term: Search text (identifier, identifier prefix or words)
+            entity_types: Entity types to search (default: all)
+            limit: Maximum number of results overall
+        
+        Returns:
+            List of result dictionaries (type, id, title, subtitle, score)
+        """
+        if self.dialect is None:
+            self.dialect = db.engine.dialect.name
+        
+        term = term.strip()
+        limit = max(1, min(limit, self.max_results))
+        
+        results = []
+        for entity_type in entity_types or SEARCH_ENTITIES:
+            # Each type contributes at most limit rows; the merge keeps the best overall
+            for row in db.session.execute(self._entity_query(entity_type, term, limit)):
+                results.append({
+                    'type': entity_type,
+                    'id': str(row.id),
+                    'title': row.title,
+                    'subtitle': row.subtitle,
+                    'score': round(float(row.score or 0), 4)
+                })
+        
+        results.sort(key=lambda result: result['score'], reverse=True)
+        return results[:limit]
+
+# Global search index instance
+search_index = SearchIndex()
@@ -0,0 +1,304 @@
+"""
+High-throughput SNP genotype ingestion.
+
+Genotype files are read line by line, validated in fixed-size batches and
+written with a single statement per batch: PostgreSQL COPY when available,
+otherwise a Core ``insert()`` executemany. ORM objects are never built, so
+memory use is bounded by the batch size rather than the panel size.
+"""
+
+import csv
+import io
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from src.database import db
+
+SNP_COLUMNS = (
+    'id', 'animal_id', 'chromosome', 'position', 'snp_id', 'reference_allele',
+    'alternate_allele', 'genotype', 'quality_score', 'read_depth',
+    'allele_frequency', 'analysis_id', 'created_at'
+)
+
+SUPPORTED_FORMATS = ('ndjson', 'tsv')
+
+# Maximum lengths of the string columns on snp_data
+STRING_LIMITS = {
+    'chromosome': 10,
+    'snp_id': 50,
+    'reference_allele': 10,
+    'alternate_allele': 10,
+    'genotype': 10
+}
+
+MAX_BATCH_ERRORS = 100  # Batches with errors kept in the result
+MAX_ERRORS_PER_BATCH = 20  # Row errors kept per batch
+
+def detect_format(filename, requested_format=None):
+    """Resolve the file format from an explicit value or the file extension."""
+    if requested_format:
+        requested_format = requested_format.lower()
+        return requested_format if requested_format in SUPPORTED_FORMATS else None
+    
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension in ('.ndjson', '.jsonl', '.json'):
+        return 'ndjson'
+    if extension in ('.tsv', '.txt'):
+        return 'tsv'
+    return None
+
+def iter_records(file_obj, file_format):
+    """
+    Yield (line_number, record) pairs from a binary file object.
+    
+    NDJSON files contain one JSON object per line. TSV files start with a
+    header row naming the snp_data columns.
+    """
+    header = None
+    
+    for line_number, raw_line in enumerate(file_obj, start=1):
+        try:
+            line = raw_line.decode('utf-8').rstrip('\r\n')
+        except UnicodeDecodeError as e:
+            yield line_number, ValueError(f'Invalid UTF-8: {str(e)}')
+            continue
+        if not line.strip() or line.startswith('#'):
+            continue
+        
+        if file_format == 'ndjson':
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_number, ValueError(f'Invalid JSON: {str(e)}')
+                continue
+            yield line_number, record
+        else:
+            values = line.split('\t')
+            if header is None:
+                header = [value.strip().lower() for value in values]
+                continue
+            yield line_number, dict(zip(header, values))
+
+def _optional_number(value, cast):
+    if value is None or value == '':
+        return None
+    return cast(value)
+
+def validate_records(records, defaults=None, known_animals=None, label='Line'):
+    """
+    Validate and normalise a batch of (line_number, record) pairs.
+    
+    Args:
+        records: List of (line_number, record) pairs from iter_records
+        defaults: Values applied when a record omits animal_id/analysis_id
+        known_animals: Set of animal UUIDs already verified to exist; updated in place
+        label: Prefix used when reporting a record's position in errors
+    
+    Returns:
+        Tuple of (rows ready for insertion, list of error strings)
+    """
+    from src.models.animal import Animal
+    
+    defaults = defaults or {}
+    known_animals = known_animals if known_animals is not None else set()
+    
+    rows = []
+    errors = []
+    now = datetime.now(timezone.utc)
+    
+    for line_number, record in records:
+        if isinstance(record, Exception):
+            errors.append(f'{label} {line_number}: {str(record)}')
+            continue
+        if not isinstance(record, dict):
+            errors.append(f'{label} {line_number}: record must be an object')
+            continue
+        
+        try:
+            animal_id = record.get('animal_id') or defaults.get('animal_id')
+            if not animal_id:
+                raise ValueError('animal_id is required')
+            
+            chromosome = str(record.get('chromosome') or '').strip()
+            if not chromosome:
+                raise ValueError('chromosome is required')
+            
+            position = record.get('position')
+            if position is None or position == '':
+                raise ValueError('position is required')
+            position = int(position)
+            if position < 0:
+                raise ValueError('position must be non-negative')
+            
+            analysis_id = record.get('analysis_id') or defaults.get('analysis_id')
+            
+            row = {
+                'id': uuid.uuid4(),
+                'animal_id': uuid.UUID(str(animal_id)),
+                'chromosome': chromosome,
+                'position': position,
+                'snp_id': record.get('snp_id') or None,
+                'reference_allele': record.get('reference_allele') or None,
+                'alternate_allele': record.get('alternate_allele') or None,
+                'genotype': record.get('genotype') or None,
+                'quality_score': _optional_number(record.get('quality_score'), float),
+                'read_depth': _optional_number(record.get('read_depth'), int),
+                'allele_frequency': _optional_number(record.get('allele_frequency'), float),
+                'analysis_id': uuid.UUID(str(analysis_id)) if analysis_id else None,
+                'created_at': now
+            }
+            
+            for field, limit in STRING_LIMITS.items():
+                if row[field] is not None and len(str(row[field])) > limit:
+                    raise ValueError(f'{field} exceeds {limit} characters')
+            
+            if row['allele_frequency'] is not None and not 0 <= row['allele_frequency'] <= 1:
+                raise ValueError('allele_frequency must be between 0 and 1')
+            
+            rows.append((line_number, row))
+        
+        except (TypeError, ValueError) as e:
+            errors.append(f'{label} {line_number}: {str(e)}')
+    
+    # Verify referenced animals with one query per batch
+    unknown = {row['animal_id'] for _, row in rows} - known_animals
+    if unknown:
+        found = db.session.query(Animal.id).filter(Animal.id.in_(list(unknown))).all()
+        known_animals.update(animal_id for (animal_id,) in found)
+    
+    valid_rows = []
+    for line_number, row in rows:
+        if row['animal_id'] in known_animals:
+            valid_rows.append(row)
+        else:
+            errors.append(f"{label} {line_number}: animal {row['animal_id']} not found")
+    
+    return valid_rows, errors
+
+def _copy_rows(connection, rows):
+    """Write rows with PostgreSQL COPY ... FROM STDIN."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(['' if row[column] is None else row[column] for column in SNP_COLUMNS])
+    buffer.seek(0)
+    
+    dbapi_connection = connection.connection.dbapi_connection
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY snp_data ({', '.join(SNP_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+    finally:
+        cursor.close()
+
+def write_snp_rows(rows):
+    """
+    Insert validated rows in a single round trip.
+    
+    Uses COPY on PostgreSQL and falls back to a Core executemany insert on
+    other backends (SQLite). The caller owns the transaction.
+    """
+    from src.models.genomics import SNPData
+    from src.utils.counters import increment_total
+    
+    if not rows:
+        return 0
+    
+    connection = db.session.connection()
+    if connection.dialect.name == 'postgresql':
+        _copy_rows(connection, rows)
+    else:
+        connection.execute(SNPData.__table__.insert(), rows)
+    
+    # Neither path goes through the ORM, so keep the statistics counter in step here
+    increment_total(connection, 'snp_data', len(rows))
+    
+    return len(rows)
+
+def ingest_snp_file(file_path, file_format, defaults=None, batch_size=5000, progress_callback=None):
+    """
+    Stream a genotype file into snp_data in validated batches.
+    
+    Each batch is committed independently; a batch that fails to write is
+    rolled back and reported without aborting the rest of the file.
+    
+    Args:
+        file_path: Path to an NDJSON or TSV file
+        file_format: 'ndjson' or 'tsv'
+        defaults: Values applied when a record omits animal_id/analysis_id
+        batch_size: Records validated and written per batch
+        progress_callback: Optional callable(fraction_of_file_read, stats)
+    
+    Returns:
+        Dictionary of ingestion statistics including rows per second and
+        per-batch errors
+    """
+    if file_format not in SUPPORTED_FORMATS:
+        raise ValueError(f'Unsupported format: {file_format}')
+    
+    stats = {
+        'rows_read': 0,
+        'rows_inserted': 0,
+        'rows_rejected': 0,
+        'batches': 0,
+        'failed_batches': 0,
+        'batch_errors': []
+    }
+    known_animals = set()
+    total_bytes = os.path.getsize(file_path) or 1
+    started = time.monotonic()
+    
+    def flush(batch_number, batch):
+        rows, errors = validate_records(batch, defaults, known_animals)
+        inserted = 0
+        
+        try:
+            inserted = write_snp_rows(rows)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            errors.append(f'Batch write failed: {str(e)}')
+            stats['failed_batches'] += 1
+        
+        stats['batches'] += 1
+        stats['rows_read'] += len(batch)
+        stats['rows_inserted'] += inserted
+        stats['rows_rejected'] += len(batch) - inserted
+        
+        if errors and len(stats['batch_errors']) < MAX_BATCH_ERRORS:
+            stats['batch_errors'].append({
+                'batch': batch_number,
+                'first_line': batch[0][0],
+                'last_line': batch[-1][0],
+                'error_count': len(errors),
+                'errors': errors[:MAX_ERRORS_PER_BATCH]
+            })
+    
+    with open(file_path, 'rb') as file_obj:
+        batch = []
+        batch_number = 0
+        
+        for line_number, record in iter_records(file_obj, file_format):
+            batch.append((line_number, record))
+            
+            if len(batch) >= batch_size:
+                batch_number += 1
+                flush(batch_number, batch)
+                batch = []
+                
+                if progress_callback:
+                    progress_callback(file_obj.tell() / total_bytes, stats)
+        
+        if batch:
+            batch_number += 1
+            flush(batch_number, batch)
+    
+    elapsed = time.monotonic() - started
+    stats['elapsed_seconds'] = round(elapsed, 3)
+    stats['rows_per_second'] = round(stats['rows_inserted'] / elapsed, 1) if elapsed > 0 else None
+    
+    return stats
@@ -0,0 +1,159 @@
+"""
+Live background task progress.
+
+Tasks report progress far more often than anyone needs to see it (bulk
+import reports once per CSV row). Each task's ProgressReporter coalesces
+those reports:
+
+- the latest state is published to Redis (without Redis, to this process's
+  cache) at most every TASK_PROGRESS_INTERVAL seconds, and only once
+  progress moved by TASK_PROGRESS_MIN_DELTA points or the message changed;
+- it is written to background_tasks only at checkpoints: every
+  TASK_PROGRESS_CHECKPOINT_INTERVAL seconds, when the task asks for one,
+  and when the task finishes.
+
+Readers (GET /system/tasks/<id> and its event stream) prefer the live state
+and fall back to the row. Without Redis, tasks running in another process
+are only visible at their checkpoints.
+"""
+
+import json
+import time
+from datetime import datetime, timezone
+from src.database import db
+
+TERMINAL_STATUSES = ('COMPLETED', 'FAILED', 'CANCELLED')
+
+class ProgressReporter:
+    """Throttled progress reporting for one task."""
+    
+    def __init__(self, channel, task):
+        self.channel = channel
+        self.task = task
+        self.progress = task.progress or 0
+        self.message = (task.task_metadata or {}).get('progress_message')
+        self._published = None  # (progress, message) last published
+        self._published_at = 0.0
+        self._persisted_at = time.monotonic()
+        self._dirty = False  # Newer than the row
+    
+    def update(self, progress, message=None, checkpoint=False):
+        """Record progress; publish and persist it when due."""
+        self.progress = min(100, max(0, int(progress)))
+        if message:
+            self.message = message
+        self._dirty = True
+        
+        now = time.monotonic()
+        if checkpoint or now - self._persisted_at >= self.channel.checkpoint_interval:
+            self.persist()
+            self.publish()
+        elif self._due(now):
+            self.publish()
+    
+    def _due(self, now):
+        if self._published is None:
+            return True
+        if now - self._published_at < self.channel.interval:
+            return False
+        last_progress, last_message = self._published
+        return abs(self.progress - last_progress) >= self.channel.min_delta or self.message != last_message
+    
+    def publish(self):
+        """Publish the latest state for live readers."""
+        self.channel.publish(self.task.task_id, self.state())
+        self._published = (self.progress, self.message)
+        self._published_at = time.monotonic()
+    
+    def apply(self):
+        """Copy the latest state onto the task row, to be saved with its next commit."""
+        if self._dirty:
+            self.task.progress = self.progress
+            if self.message:
+                self.task.task_metadata = dict(self.task.task_metadata or {}, progress_message=self.message)
+            self._dirty = False
+    
+    def persist(self):
+        """Checkpoint: write the latest state to background_tasks."""
+        self.apply()
+        db.session.commit()
+        self._persisted_at = time.monotonic()
+    
+    def finish(self):
+        """Publish the row's state once the task stopped running (completed, failed, retrying, cancelled)."""
+        self.progress = self.task.progress or 0
+        self._dirty = False
+        self.publish()
+    
+    def state(self, status=None):
+        return {
+            'status': status or self.task.status.value,
+            'progress': self.progress,
+            'message': self.message,
+            'updated_at': datetime.now(timezone.utc).isoformat()
+        }
+
+class TaskProgress:
+    """Publishes and reads live task progress."""
+    
+    def __init__(self, app=None, cache=None):
+        self.app = app
+        self.cache = cache
+        self.redis_client = None
+        self.interval = 0.5
+        self.min_delta = 1
+        self.checkpoint_interval = 10
+        self.ttl = 3600
+        
+        if app:
+            self.init_app(app, cache)
+    
+    def init_app(self, app, cache):
+        """Initialize progress publishing with Flask app and the cache's Redis connection."""
+        self.app = app
+        self.cache = cache
+        self.redis_client = cache.redis_client
+        self.interval = app.config.get('TASK_PROGRESS_INTERVAL', 0.5)
+        self.min_delta = app.config.get('TASK_PROGRESS_MIN_DELTA', 1)
+        self.checkpoint_interval = app.config.get('TASK_PROGRESS_CHECKPOINT_INTERVAL', 10)
+        self.ttl = app.config.get('TASK_PROGRESS_TTL', 3600)
+    
+    @staticmethod
+    def _key(task_id):
+        return f'task_progress:{task_id}'
+    
+    def reporter(self, task):
+        return ProgressReporter(self, task)
+    
+    def publish(self, task_id, state):
+        try:
+            if self.redis_client:
+                # Straight to Redis: the cache's L1 tier would serve other processes stale copies
+                self.redis_client.setex(self._key(task_id), self.ttl, json.dumps(state))
+            elif self.cache:
+                self.cache.set(self._key(task_id), state, timeout=self.ttl)
+        except Exception as e:
+            self.app.logger.warning(f"Task progress publish error: {str(e)}")
+    
+    def read(self, task_id):
+        """Latest published state of a task, or None."""
+        try:
+            if self.redis_client:
+                payload = self.redis_client.get(self._key(task_id))
+                return json.loads(payload) if payload else None
+            return self.cache.get(self._key(task_id)) if self.cache else None
+        except Exception as e:
+            self.app.logger.warning(f"Task progress read error: {str(e)}")
+            return None
+    
+    def merge(self, task_data, live=None):
+        """Task dictionary (BackgroundTask.to_dict) with live progress applied while it runs."""
+        live = live if live is not None else self.read(task_data['task_id'])
+        if live and task_data['status'] not in TERMINAL_STATUSES:
+            task_data['progress'] = live['progress']
+            if live.get('message'):
+                task_data['metadata'] = dict(task_data.get('metadata') or {}, progress_message=live['message'])
+        return task_data
+
+# Global task progress instance
+task_progress = TaskProgress()
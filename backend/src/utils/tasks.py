@@ -2,15 +2,24 @@
 Background task system for handling long-running operations.
 """
 
+import importlib
 import json
+import multiprocessing
+import os
+import pickle
+import random
 import traceback
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timezone, timedelta
 from enum import Enum
-from threading import Thread
-from queue import Queue, Empty
+from threading import Lock
 import time
 from flask import current_app
+from sqlalchemy import select, update, and_, or_
+from sqlalchemy.dialects.postgresql import UUID
 from src.database import db
+from src.utils.genotype_store import as_uuid
 
 class TaskStatus(Enum):
     PENDING = "PENDING"
@@ -36,7 +45,7 @@ class BackgroundTask(db.Model):
     progress = db.Column(db.Integer, default=0)  # 0-100
     
     # User information
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
+    user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id'), index=True)
     
     # Task data
     input_data = db.Column(db.JSON)
@@ -51,6 +60,20 @@ class BackgroundTask(db.Model):
     # Metadata
     task_metadata = db.Column(db.JSON)
     
+    # Durable queue (TASK_BACKEND = 'database'): what to run and who holds it
+    task_ref = db.Column(db.String(200))  # Registered task name
+    queue = db.Column(db.String(50))
+    payload = db.Column(db.JSON)  # {'module': ..., 'args': [...], 'kwargs': {...}}
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    max_attempts = db.Column(db.Integer, default=1, nullable=False)
+    run_after = db.Column(db.DateTime(timezone=True))  # Retry backoff
+    lease_owner = db.Column(db.String(100))
+    lease_expires_at = db.Column(db.DateTime(timezone=True))
+    
+    __table_args__ = (
+        db.Index('ix_background_tasks_claim', 'queue', 'status', 'created_at'),
+    )
+    
     def __repr__(self):
         return f'<BackgroundTask {self.task_id} - {self.status.value}>'
     
@@ -62,24 +85,38 @@ class BackgroundTask(db.Model):
             'task_description': self.task_description,
             'status': self.status.value,
             'progress': self.progress,
-            'user_id': self.user_id,
+            'user_id': str(self.user_id) if self.user_id else None,
             'input_data': self.input_data,
             'result_data': self.result_data,
             'error_message': self.error_message,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'started_at': self.started_at.isoformat() if self.started_at else None,
             'completed_at': self.completed_at.isoformat() if self.completed_at else None,
-            'metadata': self.task_metadata
+            'metadata': self.task_metadata,
+            'queue': self.queue,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'next_attempt_at': self.run_after.isoformat() if self.run_after and self.status == TaskStatus.PENDING else None
         }
     
-    def update_progress(self, progress, message=None):
-        """Update task progress."""
-        self.progress = min(100, max(0, progress))
-        if message:
-            if not self.task_metadata:
-                self.task_metadata = {}
-            self.task_metadata['progress_message'] = message
-        db.session.commit()
+    @property
+    def progress_reporter(self):
+        """This task's throttled progress reporter (see utils/task_progress.py)."""
+        from src.utils.task_progress import task_progress
+        
+        if getattr(self, '_progress_reporter', None) is None:
+            self._progress_reporter = task_progress.reporter(self)
+        return self._progress_reporter
+    
+    def update_progress(self, progress, message=None, checkpoint=False):
+        """
+        Update task progress.
+        
+        Cheap enough to call per item: live readers see the update within
+        TASK_PROGRESS_INTERVAL, and the row (with anything else pending in
+        the session) is committed only at checkpoints.
+        """
+        self.progress_reporter.update(progress, message, checkpoint)
     
     def mark_completed(self, result_data=None):
         """Mark task as completed."""
@@ -89,22 +126,113 @@ class BackgroundTask(db.Model):
         if result_data:
             self.result_data = result_data
         db.session.commit()
+        self.progress_reporter.finish()
     
     def mark_failed(self, error_message):
         """Mark task as failed."""
+        if getattr(self, '_progress_reporter', None) is not None:
+            self._progress_reporter.apply()
         self.status = TaskStatus.FAILED
         self.completed_at = datetime.now(timezone.utc)
         self.error_message = error_message
         db.session.commit()
+        self.progress_reporter.finish()
+
+# Registered task functions by name: (function, queue, max_attempts). Process
+# pools and the durable queue receive the name and the defining module, not
+# the function; the module is imported on first use.
+TASK_REGISTRY = {}
+
+# Error recorded when a task's worker stopped renewing its lease too often
+LEASE_EXPIRED_ERROR = "Worker lease expired after {attempts} attempt(s)"
+
+def register_task(name, queue='io', max_attempts=None):
+    """
+    Register a task function under name, to run on the given queue.
+    
+    max_attempts bounds durable-queue retries (default TASK_MAX_ATTEMPTS);
+    use 1 for tasks that are not safe to run twice.
+    """
+    def decorator(func):
+        TASK_REGISTRY[name] = (func, queue, max_attempts)
+        func.registered_name = name
+        return func
+    return decorator
+
+def get_registered_task(name, module=None):
+    """Registry entry for name, importing its module if this process has not yet."""
+    if name not in TASK_REGISTRY and module:
+        importlib.import_module(module)
+    return TASK_REGISTRY[name]
+
+def parse_task_queues(value):
+    """Parse 'io=thread:4,cpu=process:2' into {'io': ('thread', 4), 'cpu': ('process', 2)}."""
+    queues = {}
+    for entry in (value or '').split(','):
+        if '=' not in entry:
+            continue
+        queue, spec = entry.split('=', 1)
+        kind, _, workers = spec.partition(':')
+        kind = kind.strip().lower()
+        if kind not in ('thread', 'process'):
+            raise ValueError(f"Unknown executor '{kind}' for task queue '{queue.strip()}'")
+        queues[queue.strip()] = (kind, int(workers) if workers.strip() else 2)
+    return queues
+
+# Flask app of a task process (see _init_task_process)
+_process_app = None
+
+def _init_task_process(config):
+    """Process pool initializer: build a worker app from the parent's configuration."""
+    global _process_app
+    from src.worker import create_worker_app
+    _process_app = create_worker_app(config)
+
+def _run_registered_task(task_data, module):
+    """Entry point of a task in a pool process."""
+    task_data = dict(task_data, func=get_registered_task(task_data['name'], module)[0])
+    with _process_app.app_context():
+        task_manager._execute_task(task_data)
+
+def _picklable(value):
+    try:
+        pickle.dumps(value)
+        return True
+    except Exception:
+        return False
 
 class TaskManager:
-    """Task manager for handling background tasks."""
+    """
+    Task manager for handling background tasks.
+    
+    Tasks run on named queues (TASK_QUEUES), each backed by a thread pool
+    (I/O-bound work) or a process pool (CPU-bound work, free of the GIL).
+    Registered tasks run on the queue they were registered for; plain
+    callables run on the default thread queue. Pools are created on first
+    use in the process that submits to them.
+    
+    With TASK_BACKEND = 'database', registered tasks are only recorded on
+    submit. Worker processes (src/worker.py) claim them with a lease
+    (claim), renew the lease while they run (renew_leases) and retry
+    failures with exponential backoff; tasks whose worker died are claimed
+    again once the lease expires (or failed by reap_expired when out of
+    attempts). Nothing is lost when web processes restart, and throughput
+    grows with the number of worker processes.
+    """
     
     def __init__(self, app=None):
         self.app = app
-        self.task_queue = Queue()
-        self.workers = []
-        self.running = False
+        self.queues = {'io': ('thread', 2)}
+        self.default_queue = 'io'
+        self.start_method = 'spawn'
+        self.backend = 'local'
+        self.lease_seconds = 60
+        self.max_attempts = 3
+        self.retry_backoff = 30
+        self.retry_backoff_max = 3600
+        self._executors = {}
+        self._executors_pid = None
+        self._lock = Lock()
         
         if app:
             self.init_app(app)
@@ -112,59 +240,98 @@ class TaskManager:
     def init_app(self, app):
         """Initialize task manager with Flask app."""
         self.app = app
-        
-        # Start worker threads
-        num_workers = app.config.get('TASK_WORKERS', 2)
-        self.start_workers(num_workers)
+        self.queues = parse_task_queues(app.config.get('TASK_QUEUES', 'io=thread:4,cpu=process:2')) or self.queues
+        self.default_queue = 'io' if 'io' in self.queues else next(iter(self.queues))
+        self.start_method = app.config.get('TASK_PROCESS_START_METHOD', 'spawn')
+        self.backend = app.config.get('TASK_BACKEND', 'local')
+        self.lease_seconds = app.config.get('TASK_LEASE_SECONDS', 60)
+        self.max_attempts = app.config.get('TASK_MAX_ATTEMPTS', 3)
+        self.retry_backoff = app.config.get('TASK_RETRY_BACKOFF', 30)
+        self.retry_backoff_max = app.config.get('TASK_RETRY_BACKOFF_MAX', 3600)
     
-    def start_workers(self, num_workers=2):
-        """Start worker threads."""
-        if self.running:
-            return
-        
-        self.running = True
-        for i in range(num_workers):
-            worker = Thread(target=self._worker, args=(i,), daemon=True)
-            worker.start()
-            self.workers.append(worker)
-        
-        if self.app:
-            with self.app.app_context():
-                current_app.logger.info(f"Started {num_workers} background task workers")
+    def _executor(self, queue):
+        """Pool for a queue, (re)created in this process on first use."""
+        if queue not in self.queues:
+            queue = self.default_queue
+        
+        with self._lock:
+            if self._executors_pid != os.getpid():
+                # Pools do not survive a fork; each worker process starts its own
+                self._executors = {}
+                self._executors_pid = os.getpid()
+            
+            if queue not in self._executors:
+                kind, workers = self.queues[queue]
+                if kind == 'process':
+                    config = {key: value for key, value in self.app.config.items() if _picklable(value)}
+                    self._executors[queue] = ProcessPoolExecutor(
+                        max_workers=workers,
+                        mp_context=multiprocessing.get_context(self.start_method),
+                        initializer=_init_task_process,
+                        initargs=(config,)
+                    )
+                else:
+                    self._executors[queue] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'task-{queue}')
+                self.app.logger.info(f"Started {workers} {kind} workers for task queue '{queue}'")
+            
+            return queue, self.queues[queue][0], self._executors[queue]
+    
+    def shutdown(self, wait=True):
+        """Stop all pools, letting running tasks finish when wait is true."""
+        with self._lock:
+            executors, self._executors = self._executors, {}
+        for executor in executors.values():
+            executor.shutdown(wait=wait, cancel_futures=True)
     
     def stop_workers(self):
-        """Stop worker threads."""
-        self.running = False
+        """Stop worker pools."""
         if self.app:
-            with self.app.app_context():
-                current_app.logger.info("Stopping background task workers")
+            self.app.logger.info("Stopping background task workers")
+        self.shutdown(wait=False)
     
-    def _worker(self, worker_id):
-        """Worker thread function."""
-        if self.app:
-            with self.app.app_context():
-                current_app.logger.info(f"Task worker {worker_id} started")
-        
-        while self.running:
+    def _run_in_thread(self, task_data):
+        with self.app.app_context():
             try:
-                # Get task from queue with timeout
-                task_data = self.task_queue.get(timeout=1)
-                
-                with self.app.app_context():
-                    self._execute_task(task_data)
-                
-                self.task_queue.task_done()
-                
-            except Empty:
-                continue
+                self._execute_task(task_data)
             except Exception as e:
-                if self.app:
-                    with self.app.app_context():
-                        current_app.logger.error(f"Worker {worker_id} error: {str(e)}")
+                current_app.logger.error(f"Task worker error: {str(e)}")
+    
+    def _on_process_done(self, task_id, queue, executor, future):
+        error = future.exception()
+        if error is None:
+            return
         
-        if self.app:
-            with self.app.app_context():
-                current_app.logger.info(f"Task worker {worker_id} stopped")
+        if isinstance(error, BrokenProcessPool):
+            # A dead process breaks the whole pool; the next submit starts a new one
+            with self._lock:
+                if self._executors.get(queue) is executor:
+                    del self._executors[queue]
+        
+        # The task process died (or the task could not be sent); record it as failed
+        with self.app.app_context():
+            current_app.logger.error(f"Task {task_id} process error: {str(error)}")
+            task = BackgroundTask.query.filter_by(task_id=task_id).first()
+            if task and task.status in (TaskStatus.PENDING, TaskStatus.RUNNING):
+                if task.lease_owner and task.attempts < task.max_attempts:
+                    self._schedule_retry(task, f"Task process error: {str(error)}")
+                else:
+                    task.mark_failed(f"Task process error: {str(error)}")
+    
+    def _dispatch(self, task_data, queue=None):
+        """Hand a task to the pool of its queue; returns the queue and the future."""
+        task_func = task_data['func']
+        name = getattr(task_func, 'registered_name', None)
+        if queue is None:
+            queue = TASK_REGISTRY[name][1] if name in TASK_REGISTRY else self.default_queue
+        queue, kind, executor = self._executor(queue)
+        
+        if kind == 'process' and name in TASK_REGISTRY:
+            sent = {key: value for key, value in task_data.items() if key != 'func'}
+            future = executor.submit(_run_registered_task, dict(sent, name=name), task_func.__module__)
+            future.add_done_callback(lambda done: self._on_process_done(task_data['task_id'], queue, executor, done))
+        else:
+            future = executor.submit(self._run_in_thread, task_data)
+        return queue, future
     
     def _execute_task(self, task_data):
         """Execute a background task."""
@@ -172,6 +339,7 @@ class TaskManager:
         task_func = task_data['func']
         args = task_data.get('args', ())
         kwargs = task_data.get('kwargs', {})
+        lease_owner = task_data.get('lease_owner')
         
         # Get task from database
         task = BackgroundTask.query.filter_by(task_id=task_id).first()
@@ -179,11 +347,22 @@ class TaskManager:
             current_app.logger.error(f"Task {task_id} not found in database")
             return
         
+        if lease_owner:
+            # Claimed from the durable queue: run only while the lease is still ours
+            if task.status != TaskStatus.RUNNING or task.lease_owner != lease_owner:
+                current_app.logger.info(f"Skipping task {task_id} (lease lost)")
+                return
+        elif task.status != TaskStatus.PENDING:
+            # Cancelled while it waited in the queue
+            current_app.logger.info(f"Skipping task {task_id} ({task.status.value})")
+            return
+        
         try:
-            # Mark task as running
-            task.status = TaskStatus.RUNNING
-            task.started_at = datetime.now(timezone.utc)
-            db.session.commit()
+            if not lease_owner:
+                # Mark task as running (claim() already did for durable tasks)
+                task.status = TaskStatus.RUNNING
+                task.started_at = datetime.now(timezone.utc)
+                db.session.commit()
             
             current_app.logger.info(f"Executing task {task_id}: {task.task_name}")
             
@@ -196,17 +375,152 @@ class TaskManager:
             current_app.logger.info(f"Task {task_id} completed successfully")
             
         except Exception as e:
-            # Mark task as failed
+            db.session.rollback()
             error_message = f"{str(e)}\n\nTraceback:\n{traceback.format_exc()}"
-            task.mark_failed(error_message)
             
-            current_app.logger.error(f"Task {task_id} failed: {str(e)}")
+            if lease_owner and task.attempts < task.max_attempts:
+                self._schedule_retry(task, error_message)
+                current_app.logger.warning(
+                    f"Task {task_id} failed (attempt {task.attempts}/{task.max_attempts}), retrying at {task.run_after.isoformat()}: {str(e)}"
+                )
+            else:
+                # Mark task as failed
+                task.mark_failed(error_message)
+                current_app.logger.error(f"Task {task_id} failed: {str(e)}")
+    
+    def _schedule_retry(self, task, error_message):
+        """Return a failed durable task to the queue after an exponential, jittered backoff."""
+        delay = min(self.retry_backoff_max, self.retry_backoff * 2 ** max(0, task.attempts - 1))
+        task.status = TaskStatus.PENDING
+        task.run_after = datetime.now(timezone.utc) + timedelta(seconds=delay * random.uniform(0.5, 1.0))
+        task.lease_owner = None
+        task.lease_expires_at = None
+        task.error_message = error_message
+        db.session.commit()
+        task.progress_reporter.finish()
+    
+    # Durable queue
+    
+    @staticmethod
+    def _claimable(now):
+        table = BackgroundTask.__table__
+        return or_(
+            and_(
+                table.c.status == TaskStatus.PENDING,
+                or_(table.c.run_after.is_(None), table.c.run_after <= now)
+            ),
+            # Running under a lease nobody renewed: its worker died
+            and_(
+                table.c.status == TaskStatus.RUNNING,
+                table.c.lease_expires_at < now,
+                table.c.attempts < table.c.max_attempts
+            )
+        )
+    
+    def claim(self, queue, limit, owner):
+        """
+        Lease up to limit runnable durable tasks of a queue to owner.
+        
+        owner must be unique per call. On PostgreSQL the candidates are
+        locked with FOR UPDATE SKIP LOCKED, so concurrent workers claim
+        disjoint rows without waiting on each other; on SQLite the single
+        UPDATE runs under the database write lock and rechecks that each
+        row is still claimable.
+        
+        Returns task data for _execute_task (without 'func').
+        """
+        table = BackgroundTask.__table__
+        now = datetime.now(timezone.utc)
+        
+        candidates = (
+            select(table.c.id)
+            .where(table.c.queue == queue, table.c.task_ref.isnot(None), self._claimable(now))
+            .order_by(table.c.created_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        
+        with db.engine.begin() as connection:
+            connection.execute(
+                update(table)
+                .where(table.c.id.in_(candidates.scalar_subquery()), self._claimable(now))
+                .values(
+                    status=TaskStatus.RUNNING,
+                    lease_owner=owner,
+                    lease_expires_at=now + timedelta(seconds=self.lease_seconds),
+                    attempts=table.c.attempts + 1,
+                    started_at=db.func.coalesce(table.c.started_at, now)
+                )
+            )
+            rows = connection.execute(
+                select(table.c.task_id, table.c.task_ref, table.c.payload)
+                .where(table.c.lease_owner == owner, table.c.status == TaskStatus.RUNNING)
+            ).all()
+        
+        return [{
+            'task_id': row.task_id,
+            'name': row.task_ref,
+            'module': (row.payload or {}).get('module'),
+            'args': tuple((row.payload or {}).get('args', ())),
+            'kwargs': (row.payload or {}).get('kwargs', {}),
+            'lease_owner': owner
+        } for row in rows]
+    
+    def renew_leases(self, owners):
+        """Extend the leases of running tasks held by owners; returns the number renewed."""
+        if not owners:
+            return 0
+        
+        table = BackgroundTask.__table__
+        with db.engine.begin() as connection:
+            result = connection.execute(
+                update(table)
+                .where(table.c.lease_owner.in_(list(owners)), table.c.status == TaskStatus.RUNNING)
+                .values(lease_expires_at=datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds))
+            )
+        return result.rowcount or 0
+    
+    def reap_expired(self):
+        """Fail tasks whose lease expired with no attempts left; returns the number failed."""
+        table = BackgroundTask.__table__
+        now = datetime.now(timezone.utc)
+        
+        with db.engine.begin() as connection:
+            expired = connection.execute(
+                select(table.c.id, table.c.attempts).where(
+                    table.c.status == TaskStatus.RUNNING,
+                    table.c.lease_expires_at < now,
+                    table.c.attempts >= table.c.max_attempts
+                )
+            ).all()
+            for row in expired:
+                connection.execute(
+                    update(table)
+                    .where(table.c.id == row.id, table.c.status == TaskStatus.RUNNING, table.c.lease_expires_at < now)
+                    .values(
+                        status=TaskStatus.FAILED,
+                        completed_at=now,
+                        error_message=LEASE_EXPIRED_ERROR.format(attempts=row.attempts)
+                    )
+                )
+        return len(expired)
     
     def submit_task(self, task_name, task_func, user_id=None, description=None, 
                    input_data=None, *args, **kwargs):
-        """Submit a task for background execution."""
+        """
+        Submit a task for background execution.
+        
+        task_func is a function (registered with register_task to choose its
+        queue) or the name it was registered under.
+        """
         import uuid
         
+        if isinstance(task_func, str):
+            task_func = TASK_REGISTRY[task_func][0]
+        
+        name = getattr(task_func, 'registered_name', None)
+        durable = self.backend == 'database' and name in TASK_REGISTRY
+        
         # Generate unique task ID
         task_id = str(uuid.uuid4())
         
@@ -215,24 +529,35 @@ class TaskManager:
             task_id=task_id,
             task_name=task_name,
             task_description=description,
-            user_id=user_id,
+            user_id=as_uuid(user_id) if user_id else None,
             input_data=input_data
         )
         
+        if durable:
+            _, queue, max_attempts = TASK_REGISTRY[name]
+            task.task_ref = name
+            task.queue = queue if queue in self.queues else self.default_queue
+            task.payload = {'module': task_func.__module__, 'args': list(args), 'kwargs': kwargs}
+            task.max_attempts = max_attempts or self.max_attempts
+            json.dumps(task.payload)  # Arguments must survive the trip through the database
+        
         db.session.add(task)
         db.session.commit()
         
-        # Add task to queue
-        task_data = {
+        if durable:
+            # A worker process claims it from the table
+            current_app.logger.info(f"Queued task {task_id} on durable queue '{task.queue}': {task_name}")
+            return task_id
+        
+        # Hand the task to its queue's pool
+        queue, _ = self._dispatch({
             'task_id': task_id,
             'func': task_func,
             'args': args,
             'kwargs': kwargs
-        }
-        
-        self.task_queue.put(task_data)
+        })
         
-        current_app.logger.info(f"Submitted task {task_id}: {task_name}")
+        current_app.logger.info(f"Submitted task {task_id} to queue '{queue}': {task_name}")
         
         return task_id
     
@@ -248,6 +573,7 @@ class TaskManager:
             task.status = TaskStatus.CANCELLED
             task.completed_at = datetime.now(timezone.utc)
             db.session.commit()
+            task.progress_reporter.finish()
             return True
         return False
 
@@ -255,6 +581,7 @@ class TaskManager:
 task_manager = TaskManager()
 
 # Task functions
+@register_task('bulk_import_animals', queue='cpu', max_attempts=1)  # Removes its input file
 def bulk_import_animals_task(task, file_path, user_id):
     """Background task for bulk importing animals."""
     import csv
@@ -338,6 +665,7 @@ def bulk_import_animals_task(task, file_path, user_id):
         db.session.rollback()
         raise e
 
+@register_task('generate_report', queue='cpu')
 def generate_report_task(task, report_type, filters, user_id):
     """Background task for generating large reports."""
     from src.routes.analytics import _execute_report_query
@@ -390,6 +718,60 @@ def generate_report_task(task, report_type, filters, user_id):
     except Exception as e:
         raise e
 
+@register_task('snp_ingest', queue='cpu', max_attempts=1)  # Removes its input file
+def snp_ingest_task(task, file_path, file_format, defaults=None, batch_size=5000):
+    """Background task for bulk ingesting SNP genotype files."""
+    from src.utils.snp_ingest import ingest_snp_file
+    
+    try:
+        task.update_progress(5, f"Reading {file_format.upper()} genotype file")
+        
+        def report_progress(fraction, stats):
+            progress = 5 + fraction * 90
+            task.update_progress(
+                int(progress),
+                f"Inserted {stats['rows_inserted']} of {stats['rows_read']} rows"
+            )
+        
+        result = ingest_snp_file(
+            file_path,
+            file_format,
+            defaults=defaults,
+            batch_size=batch_size,
+            progress_callback=report_progress
+        )
+        
+        task.update_progress(98, "Cleaning up")
+        
+        return result
+        
+    finally:
+        # Clean up uploaded file
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+@register_task('grm', queue='cpu')
+def grm_task(task, animal_ids, marker_map_id, block_size=10000):
+    """Background task for computing a genomic relationship matrix."""
+    from src.utils.grm import compute_grm
+    
+    task.update_progress(5, f"Loading genotypes for {len(animal_ids)} animals")
+    
+    def report_progress(fraction):
+        task.update_progress(int(10 + fraction * 85), "Accumulating marker blocks")
+    
+    record, created = compute_grm(
+        animal_ids,
+        marker_map_id,
+        block_size=block_size,
+        progress_callback=report_progress
+    )
+    db.session.commit()
+    
+    result = record.to_dict()
+    result['cached'] = not created
+    return result
+
 def cleanup_old_tasks(days_to_keep=30):
     """Clean up old completed tasks."""
     try:
@@ -434,3 +816,29 @@ def submit_report_generation(report_type, filters, user_id):
         filters=filters
     )
 
+def submit_snp_ingest(file_path, file_format, user_id, defaults=None, batch_size=5000):
+    """Submit SNP genotype ingestion task."""
+    return task_manager.submit_task(
+        task_name="Ingest SNP Data",
+        task_func=snp_ingest_task,
+        user_id=user_id,
+        description=f"Bulk ingest SNP genotypes from {file_format.upper()} file",
+        input_data={'file_path': file_path, 'file_format': file_format, 'defaults': defaults},
+        file_path=file_path,
+        file_format=file_format,
+        defaults=defaults,
+        batch_size=batch_size
+    )
+
+def submit_grm_computation(animal_ids, marker_map_id, user_id, block_size=10000):
+    """Submit genomic relationship matrix computation task."""
+    return task_manager.submit_task(
+        task_name="Compute Genomic Relationship Matrix",
+        task_func=grm_task,
+        user_id=user_id,
+        description=f"VanRaden GRM for {len(animal_ids)} animals",
+        input_data={'animal_ids': animal_ids, 'marker_map_id': marker_map_id},
+        animal_ids=animal_ids,
+        marker_map_id=marker_map_id,
+        block_size=block_size
+    )
@@ -0,0 +1,232 @@
+"""
+Cached JWT blocklist lookups.
+
+Every authenticated request asks whether its token was revoked. Instead of
+querying token_blacklist each time, each process keeps a Bloom filter of the
+JTIs of revoked tokens that have not expired yet. A negative answer is
+definite and needs no query; only a Bloom positive (a revoked token, or a
+rare false positive) is confirmed against the database.
+
+The filter is rebuilt from one streamed query every
+TOKEN_BLOCKLIST_REFRESH_INTERVAL seconds in a background thread. Logouts add
+their JTI to the local filter immediately and publish it on a Redis channel
+so other worker processes add it too; without Redis other processes pick it
+up at their next rebuild. Each process subscribes, and builds its own filter,
+on its first lookup: threads do not survive a fork, and a filter inherited
+from a preloading master has missed the revocations since. Rows whose tokens have expired can no longer be
+used and are pruned at most every TOKEN_BLOCKLIST_PRUNE_INTERVAL seconds.
+"""
+
+import hashlib
+import math
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from sqlalchemy import select, delete, func
+from src.database import db
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings."""
+    
+    def __init__(self, capacity, error_rate=0.001):
+        capacity = max(1, capacity)
+        self.size = max(64, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+    
+    def _positions(self, item):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+    
+    def add(self, item):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+    
+    def __contains__(self, item):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+class TokenBlocklist:
+    """Bloom-filtered view of token_blacklist."""
+    
+    def __init__(self, app=None, cache=None):
+        self.app = app
+        self.redis_client = None
+        self.channel = None
+        self.capacity = 100000
+        self.error_rate = 0.001
+        self.refresh_interval = 60
+        self.prune_interval = 3600
+        self._filter = None
+        self._filter_pid = None
+        self._built_at = None
+        self._pruned_at = None
+        self._recent = set()  # JTIs revoked since the running rebuild read the table
+        self._rebuilding = False
+        self._listener_thread = None
+        self._listener_pid = None
+        self._lock = threading.Lock()
+        self._stats = {'lookups': 0, 'bloom_positives': 0, 'revoked': 0, 'pruned': 0, 'rebuilds': 0}
+        
+        if app:
+            self.init_app(app, cache)
+    
+    def init_app(self, app, cache):
+        """Initialize blocklist cache with Flask app and the cache's Redis connection."""
+        self.app = app
+        self.capacity = app.config.get('TOKEN_BLOCKLIST_BLOOM_CAPACITY', 100000)
+        self.error_rate = app.config.get('TOKEN_BLOCKLIST_BLOOM_ERROR_RATE', 0.001)
+        self.refresh_interval = app.config.get('TOKEN_BLOCKLIST_REFRESH_INTERVAL', 60)
+        self.prune_interval = app.config.get('TOKEN_BLOCKLIST_PRUNE_INTERVAL', 3600)
+        self.redis_client = cache.redis_client if cache else None
+        
+        if self.redis_client:
+            self.channel = app.config.get('TOKEN_BLOCKLIST_CHANNEL', 'token-revocations')
+    
+    # Building
+    
+    def prune(self):
+        """Delete blocklist rows whose tokens have already expired."""
+        from src.models.user import TokenBlacklist
+        
+        with db.engine.begin() as connection:
+            result = connection.execute(
+                delete(TokenBlacklist.__table__).where(TokenBlacklist.expires_at < datetime.now(timezone.utc))
+            )
+        self._pruned_at = time.monotonic()
+        self._stats['pruned'] += result.rowcount or 0
+        return result.rowcount or 0
+    
+    def build(self):
+        """Rebuild the filter from the unexpired rows of token_blacklist."""
+        from src.models.user import TokenBlacklist
+        
+        if self._pruned_at is None or time.monotonic() - self._pruned_at > self.prune_interval:
+            try:
+                self.prune()
+            except Exception as e:
+                self.app.logger.warning(f"Token blocklist prune error: {str(e)}")
+        
+        with self._lock:
+            self._recent = set()
+        
+        now = datetime.now(timezone.utc)
+        with db.engine.connect() as connection:
+            count = connection.execute(
+                select(func.count()).select_from(TokenBlacklist.__table__).where(TokenBlacklist.expires_at >= now)
+            ).scalar()
+            bloom = BloomFilter(max(self.capacity, count * 2), self.error_rate)
+            result = connection.execution_options(yield_per=5000).execute(
+                select(TokenBlacklist.jti).where(TokenBlacklist.expires_at >= now)
+            )
+            for (jti,) in result:
+                bloom.add(jti)
+        
+        with self._lock:
+            # Revocations that arrived while the table was being read
+            for jti in self._recent:
+                bloom.add(jti)
+            self._recent = set()
+            self._filter = bloom
+            self._filter_pid = os.getpid()
+            self._built_at = time.monotonic()
+        self._stats['rebuilds'] += 1
+    
+    def _start_rebuild(self):
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        
+        def rebuild():
+            with self.app.app_context():
+                try:
+                    self.build()
+                except Exception as e:
+                    self.app.logger.error(f"Token blocklist rebuild error: {str(e)}")
+                finally:
+                    self._rebuilding = False
+        
+        threading.Thread(target=rebuild, daemon=True, name='token-blocklist-rebuild').start()
+    
+    # Revoking
+    
+    def _add(self, jti):
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(jti)
+            self._recent.add(jti)
+    
+    def revoke(self, jti):
+        """Add a JTI whose row was just committed, here and in other workers."""
+        self._ensure_listener()
+        self._add(jti)
+        self._stats['revoked'] += 1
+        if self.channel:
+            try:
+                self.redis_client.publish(self.channel, jti)
+            except Exception as e:
+                self.app.logger.warning(f"Token revocation publish failed: {str(e)}")
+    
+    def _ensure_listener(self):
+        # Threads do not survive a fork (gunicorn --preload); each worker process subscribes itself
+        if self._listener_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+            self._rebuilding = False  # A rebuild thread of the parent process
+            if self.channel:
+                self._listener_thread = threading.Thread(target=self._listen, daemon=True, name='token-revocations')
+                self._listener_thread.start()
+    
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    jti = message['data']
+                    self._add(jti.decode('utf-8') if isinstance(jti, bytes) else jti)
+            except Exception as e:
+                self.app.logger.warning(f"Token revocation listener error, reconnecting: {str(e)}")
+                time.sleep(5)
+                # Revocations published while disconnected were missed
+                self._built_at = 0.0
+    
+    # Lookup
+    
+    def is_revoked(self, jti):
+        """True if the token with this JTI was revoked."""
+        from src.models.user import TokenBlacklist
+        
+        self._ensure_listener()
+        if self._filter is None or self._filter_pid != os.getpid():
+            # Not built yet, or inherited from the process this one was forked from
+            self.build()
+        elif time.monotonic() - self._built_at > self.refresh_interval:
+            self._start_rebuild()
+        
+        self._stats['lookups'] += 1
+        if jti not in self._filter:
+            return False
+        
+        self._stats['bloom_positives'] += 1
+        return TokenBlacklist.is_jti_blacklisted(jti)
+    
+    def stats(self):
+        """Lookup counters and filter age."""
+        stats = dict(self._stats)
+        stats['built'] = self._filter is not None
+        if self._filter is not None:
+            stats['bloom_bits'] = self._filter.size
+            stats['bloom_hashes'] = self._filter.hashes
+            stats['age_seconds'] = round(time.monotonic() - self._built_at, 1)
+        return stats
+
+# Global token blocklist instance
+token_blocklist = TokenBlocklist()
@@ -0,0 +1,177 @@
+"""
+Background task worker application.
+
+Task processes need the database, cache and storage utilities, but not the
+HTTP side (blueprints, CORS, JWT). create_worker_app builds that smaller
+app; it is used by the process pools of utils/tasks.py.
+
+Run as a module, this is the standalone worker for the durable task queue
+(TASK_BACKEND = 'database'):
+
+    python -m src.worker [--queues cpu,io]
+
+Each worker claims tasks up to the size of its queue pools, renews the
+leases of the tasks it runs and finishes them before exiting on SIGTERM.
+Start more workers, on any host sharing the database, to raise throughput.
+"""
+
+import argparse
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import uuid
+# Same import root as src/main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from flask import Flask
+from src.config import config as config_classes
+from src.database import db, init_db
+from src.models import *  # Import all models
+
+from src.utils.cache import cache
+from src.utils.cache_events import cache_invalidator
+from src.utils.email import email_service
+from src.utils.tasks import task_manager, get_registered_task
+from src.utils.task_progress import task_progress
+from src.utils.genotype_store import genotype_store
+from src.utils.pedigree import pedigree_index
+from src.utils.dashboard import dashboard_snapshot
+from src.utils.counters import entity_counters
+from src.utils.search import search_index
+from src.utils.audit_writer import audit_writer
+from src.utils.audit_partitions import audit_partitions
+
+def create_worker_app(config=None, config_name=None):
+    """
+    Worker application factory.
+    
+    Args:
+        config: Configuration values to apply (e.g. a copy of the web app's config)
+        config_name: Configuration class to load first (default: FLASK_ENV)
+    """
+    app = Flask(__name__)
+    
+    app.config.from_object(config_classes[config_name or os.environ.get('FLASK_ENV', 'development')])
+    if config:
+        app.config.update(config)
+    
+    init_db(app)
+    
+    # Initialize utilities used by task functions
+    cache.init_app(app)
+    cache_invalidator.init_app(app, cache)
+    dashboard_snapshot.init_app(app, cache)
+    email_service.init_app(app)
+    task_manager.init_app(app)
+    task_progress.init_app(app, cache)
+    genotype_store.init_app(app)
+    pedigree_index.init_app(app)
+    entity_counters.init_app(app)
+    search_index.init_app(app)
+    audit_writer.init_app(app)
+    audit_partitions.init_app(app)
+    
+    return app
+
+class TaskWorker:
+    """Claims durable tasks for a set of queues and runs them on the task pools."""
+    
+    def __init__(self, app, queues=None):
+        self.app = app
+        self.queues = [queue for queue in (queues or task_manager.queues) if queue in task_manager.queues]
+        self.poll_interval = app.config.get('TASK_POLL_INTERVAL', 1.0)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._inflight = {queue: {} for queue in self.queues}  # queue -> {future: lease owner}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+    
+    def stop(self, *args):
+        """Stop claiming; tasks already running are finished."""
+        self._stopping.set()
+    
+    def _owners(self):
+        with self._lock:
+            return {owner for inflight in self._inflight.values() for owner in inflight.values()}
+    
+    def _done(self, queue, future):
+        with self._lock:
+            self._inflight[queue].pop(future, None)
+    
+    def run_once(self):
+        """Claim and dispatch tasks for every queue with idle workers; returns the number claimed."""
+        claimed = 0
+        for queue in self.queues:
+            with self._lock:
+                free = task_manager.queues[queue][1] - len(self._inflight[queue])
+            if free <= 0:
+                continue
+            
+            owner = f"{self.worker_id}:{uuid.uuid4().hex[:12]}"
+            for task_data in task_manager.claim(queue, free, owner):
+                try:
+                    task_data['func'] = get_registered_task(task_data['name'], task_data.pop('module', None))[0]
+                except (KeyError, ImportError) as e:
+                    self.app.logger.error(f"Task {task_data['task_id']} refers to unknown task '{task_data['name']}': {str(e)}")
+                    continue
+                
+                _, future = task_manager._dispatch(task_data, queue)
+                with self._lock:
+                    self._inflight[queue][future] = owner
+                future.add_done_callback(lambda done, queue=queue: self._done(queue, done))
+                claimed += 1
+        return claimed
+    
+    def maintain(self):
+        """Renew the leases of running tasks and fail abandoned ones that are out of attempts."""
+        task_manager.renew_leases(self._owners())
+        reaped = task_manager.reap_expired()
+        if reaped:
+            self.app.logger.warning(f"Failed {reaped} tasks whose worker lease expired")
+    
+    def run(self):
+        """Serve the queues until stopped."""
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        self.app.logger.info(f"Task worker {self.worker_id} serving queues: {', '.join(self.queues)}")
+        
+        renew_interval = max(1.0, task_manager.lease_seconds / 3)
+        maintained_at = 0.0
+        with self.app.app_context():
+            while not self._stopping.is_set():
+                claimed = 0
+                try:
+                    if time.monotonic() - maintained_at >= renew_interval:
+                        self.maintain()
+                        maintained_at = time.monotonic()
+                    claimed = self.run_once()
+                except Exception as e:
+                    self.app.logger.error(f"Task worker error: {str(e)}")
+                finally:
+                    db.session.remove()
+                
+                if not claimed:
+                    self._stopping.wait(self.poll_interval)
+            
+            self.app.logger.info(f"Task worker {self.worker_id} stopping; waiting for running tasks")
+            while self._owners():
+                # Keep leases alive until the running tasks finish
+                time.sleep(min(renew_interval, 1.0))
+                if time.monotonic() - maintained_at >= renew_interval:
+                    task_manager.renew_leases(self._owners())
+                    maintained_at = time.monotonic()
+            task_manager.shutdown(wait=True)
+
+def main():
+    parser = argparse.ArgumentParser(description='Run background task workers for the durable task queue.')
+    parser.add_argument('--queues', help='Comma-separated queues to serve (default: all of TASK_QUEUES)')
+    args = parser.parse_args()
+    
+    app = create_worker_app()
+    queues = [queue.strip() for queue in args.queues.split(',')] if args.queues else None
+    TaskWorker(app, queues).run()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Shared test fixtures.
+
+The application is created once with TestingConfig, on a temporary SQLite
+database and without Redis (the cache and rate limiter fall back to process
+memory). Tests create their own rows under unique names and assert on those
+rows, or on differences, so they can run in any order against the same
+database. Set TEST_DATABASE_URL to run them against another database.
+"""
+
+import contextlib
+import os
+import tempfile
+import uuid
+import pytest
+from sqlalchemy import event
+
+_tmp_dir = tempfile.mkdtemp(prefix='reprotech-tests-')
+os.environ['FLASK_ENV'] = 'testing'  # src.main creates its module-level app with this
+os.environ.setdefault('TEST_DATABASE_URL', f"sqlite:///{os.path.join(_tmp_dir, 'test.db')}")
+os.environ['CACHE_REDIS_URL'] = 'redis://localhost:1/0'  # Nothing listens here: in-process cache only
+os.environ['AUDIT_SPOOL_PATH'] = os.path.join(_tmp_dir, 'audit_spool.jsonl')
+
+from src.main import app as _app
+from src.database import db
+
+@pytest.fixture(scope='session')
+def app():
+    return _app
+
+@pytest.fixture
+def app_context(app):
+    with app.app_context():
+        yield
+        db.session.rollback()
+        db.session.remove()
+
+@pytest.fixture
+def unique():
+    """Short random suffix for names that must not collide between tests."""
+    return uuid.uuid4().hex[:10]
+
+@pytest.fixture
+def make_user(app_context):
+    """Create and commit a user, optionally with roles."""
+    from src.models.user import User, user_roles
+    
+    def make(roles=(), **fields):
+        name = f'user-{uuid.uuid4().hex[:10]}'
+        user = User(username=name, email=f'{name}@example.com', password_hash='x', **fields)
+        db.session.add(user)
+        db.session.flush()
+        for role in roles:
+            db.session.execute(user_roles.insert().values(user_id=user.id, role_id=role.id))
+        db.session.commit()
+        return user
+    return make
+
+@pytest.fixture
+def count_queries(app_context):
+    """Context manager collecting the SQL statements executed inside it."""
+    @contextlib.contextmanager
+    def count():
+        statements = []
+        
+        def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return count
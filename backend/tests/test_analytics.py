@@ -0,0 +1,38 @@
+"""Analytics report generation (routes/analytics.py)."""
+
+import uuid
+from src.database import db
+from src.models.animal import Animal
+from src.models.customer import Customer, CustomerContact
+from src.routes.analytics import _generate_customer_analysis_report
+
+def seed_customers(count):
+    """Customers with a mix of primary contacts and animals."""
+    for i in range(count):
+        customer = Customer(
+            customer_id=f'AN-{uuid.uuid4().hex[:12]}',
+            name=f'Analytics customer {i}',
+            type='Research' if i % 2 else 'Individual'
+        )
+        db.session.add(customer)
+        db.session.flush()
+        if i % 3 == 0:
+            db.session.add(CustomerContact(customer_id=customer.id, first_name='Primary', last_name=str(i), is_primary=True))
+        for _ in range(i % 4):
+            db.session.add(Animal(
+                animal_id=f'AN-{uuid.uuid4().hex[:12]}', name=f'Animal {i}', species='BOVINE', sex='FEMALE',
+                customer_id=customer.id
+            ))
+    db.session.commit()
+
+def test_customer_analysis_query_count_is_constant(count_queries):
+    seed_customers(10)
+    with count_queries() as statements:
+        small = _generate_customer_analysis_report({}, {})
+    
+    seed_customers(10)  # Twice the customers
+    with count_queries() as statements_doubled:
+        doubled = _generate_customer_analysis_report({}, {})
+    
+    assert doubled['summary']['total_customers'] - small['summary']['total_customers'] == 10
+    assert len(statements_doubled) == len(statements)
@@ -0,0 +1,89 @@
+"""Audit log month tables on SQLite (utils/audit_partitions.py)."""
+
+import gzip
+import json
+import os
+from datetime import datetime, timezone
+import pytest
+from sqlalchemy import select, insert, delete, func
+from src.database import db
+from src.utils.audit import AuditLog, get_audit_logs
+from src.utils.audit_partitions import audit_partitions, partition_name, _month_table
+
+FEBRUARY, MARCH = datetime(2001, 2, 1), datetime(2001, 3, 1)  # Closed months no other test writes to
+
+@pytest.fixture
+def old_logs(app_context, unique, tmp_path, monkeypatch):
+    """Three February and two March 2001 rows plus one current row, all still in the live table."""
+    monkeypatch.setattr(audit_partitions, 'archive_dir', str(tmp_path))
+    created = [FEBRUARY.replace(day=day) for day in (3, 14, 28)] + [MARCH.replace(day=day) for day in (1, 31)]
+    created.append(datetime.now(timezone.utc).replace(tzinfo=None))
+    with db.engine.begin() as connection:
+        connection.execute(insert(AuditLog.__table__), [
+            {'event_type': unique, 'event_category': 'SYSTEM', 'event_description': f'event {i}', 'created_at': value}
+            for i, value in enumerate(created)
+        ])
+    
+    yield unique
+    
+    with db.engine.begin() as connection:
+        for month in (FEBRUARY, MARCH):
+            connection.exec_driver_sql(f'DROP TABLE IF EXISTS {partition_name(month)}')
+        connection.execute(delete(AuditLog.__table__).where(AuditLog.__table__.c.event_type == unique))
+
+def rows_in(name, event_type):
+    table = _month_table(name)
+    with db.engine.connect() as connection:
+        return connection.execute(
+            select(func.count()).select_from(table).where(table.c.event_type == event_type)
+        ).scalar()
+
+def days_since(year, month, day):
+    return (datetime.now(timezone.utc) - datetime(year, month, day, tzinfo=timezone.utc)).days
+
+def test_roll_moves_closed_months_out_of_the_live_table(old_logs):
+    audit_partitions.roll()
+    
+    assert AuditLog.query.filter_by(event_type=old_logs).count() == 1  # The current month stays
+    assert rows_in(partition_name(FEBRUARY), old_logs) == 3
+    assert rows_in(partition_name(MARCH), old_logs) == 2
+    names = [name for name, _ in audit_partitions.partitions()]
+    assert partition_name(FEBRUARY) in names and partition_name(MARCH) in names
+    
+    audit_partitions.roll()  # Nothing left to move
+    assert rows_in(partition_name(FEBRUARY), old_logs) == 3
+
+def test_get_audit_logs_reads_through_month_tables(old_logs):
+    audit_partitions.roll()
+    
+    assert get_audit_logs({'event_type': old_logs}).total == 6
+    march = get_audit_logs({'event_type': old_logs, 'date_from': MARCH, 'date_to': datetime(2001, 3, 31, 23, 59)})
+    assert sorted(log.created_at.day for log in march.items) == [1, 31]
+    
+    # Ranges that overlap no month table read the live table alone
+    assert audit_partitions.source(date_from=datetime.now(timezone.utc)) is None
+    assert audit_partitions.source(date_from=FEBRUARY, date_to=datetime(2001, 2, 28)) is not None
+
+def test_expire_archives_whole_months_before_dropping_them(old_logs, tmp_path):
+    audit_partitions.roll()
+    
+    # Mid-March cutoff: February is entirely older, March is not
+    result = audit_partitions.expire(days_since(2001, 3, 15))
+    assert result['dropped'] == [partition_name(FEBRUARY)]
+    assert result['rows_removed'] == 3
+    
+    path, = result['archives']
+    assert path == os.path.join(str(tmp_path), f'{partition_name(FEBRUARY)}.jsonl.gz')
+    with gzip.open(path, 'rt', encoding='utf-8') as archive:
+        archived = [json.loads(line) for line in archive]
+    assert [row['event_type'] for row in archived] == [old_logs] * 3
+    assert [row['created_at'][:10] for row in archived] == ['2001-02-03', '2001-02-14', '2001-02-28']
+    
+    names = [name for name, _ in audit_partitions.partitions()]
+    assert partition_name(FEBRUARY) not in names and partition_name(MARCH) in names
+    assert get_audit_logs({'event_type': old_logs}).total == 3
+    
+    result = audit_partitions.expire(days_since(2001, 4, 2))
+    assert result['dropped'] == [partition_name(MARCH)] and result['rows_removed'] == 2
+    assert os.path.exists(os.path.join(str(tmp_path), f'{partition_name(MARCH)}.jsonl.gz'))
+    assert get_audit_logs({'event_type': old_logs}).total == 1
@@ -0,0 +1,116 @@
+"""Batched audit log writer and its spool (utils/audit_writer.py)."""
+
+import json
+import os
+import pytest
+from sqlalchemy.exc import OperationalError
+from src.utils.audit import AuditLog
+from src.utils.audit_writer import AuditWriter
+
+@pytest.fixture
+def writer(app, tmp_path):
+    writer = AuditWriter(app)
+    writer.asynchronous = False  # Flush on the calling thread
+    writer.spool_path = str(tmp_path / 'audit_spool.jsonl')
+    return writer
+
+def event(event_type, index=0):
+    return {'event_type': event_type, 'event_category': 'SYSTEM', 'event_description': f'event {index}'}
+
+def written(event_type):
+    return AuditLog.query.filter_by(event_type=event_type).count()
+
+def database_down(rows):
+    raise OperationalError('INSERT INTO audit_logs', {}, Exception('connection refused'))
+
+def test_batch_is_written_in_one_flush(app_context, writer, unique):
+    writer._flush([event(unique, i) for i in range(25)])
+    
+    assert written(unique) == 25
+    metrics = writer.metrics()
+    assert metrics['flushes'] == 1 and metrics['written'] == 25
+    assert not metrics['degraded']
+
+def test_rejected_row_is_dead_lettered_without_blocking_the_batch(app_context, writer, unique):
+    batch = [event(unique, 0), event(unique, 1), {'event_type': None, 'event_category': 'SYSTEM'}, event(unique, 3)]
+    
+    writer._flush(batch)
+    
+    assert written(unique) == 3
+    assert not writer.metrics()['degraded']
+    assert not os.path.exists(writer.spool_path)
+    with open(f'{writer.spool_path}.dead', encoding='utf-8') as dead:
+        entries = [json.loads(line) for line in dead]
+    assert len(entries) == 1
+    assert entries[0]['row']['event_type'] is None and entries[0]['error']
+    assert writer.metrics()['dead_lettered'] == 1
+
+def test_outage_spools_and_replays(app_context, writer, unique, monkeypatch):
+    monkeypatch.setattr(writer, '_insert', database_down)
+    writer._flush([event(unique, i) for i in range(5)])
+    writer._flush([event(unique, 5)])  # Degraded: straight to the spool
+    
+    assert writer.metrics()['degraded'] and writer.metrics()['spooled'] == 6
+    assert written(unique) == 0
+    
+    monkeypatch.undo()
+    writer._degraded_until = 0.0
+    writer._replay_spool()
+    
+    assert written(unique) == 6
+    assert writer.metrics()['replayed'] == 6
+    assert not os.path.exists(writer.spool_path) and not os.path.exists(f'{writer.spool_path}.replay')
+
+def test_replay_dead_letters_bad_spool_lines(app_context, writer, unique):
+    with open(writer.spool_path, 'w', encoding='utf-8') as spool:
+        spool.write(json.dumps(event(unique, 0)) + '\n')
+        spool.write('{not json\n')
+        spool.write(json.dumps({'event_type': None, 'event_category': 'SYSTEM'}) + '\n')
+        spool.write(json.dumps(event(unique, 1)) + '\n')
+    
+    writer._replay_spool()
+    
+    assert written(unique) == 2
+    assert writer.metrics()['dead_lettered'] == 2
+    assert not os.path.exists(f'{writer.spool_path}.replay')
+
+def test_replay_keeps_the_rest_when_the_database_goes_away(app_context, writer, unique, monkeypatch):
+    writer.batch_size = 2
+    with open(writer.spool_path, 'w', encoding='utf-8') as spool:
+        for i in range(5):
+            spool.write(json.dumps(event(unique, i)) + '\n')
+    
+    insert = writer._insert
+    calls = []
+    
+    def fail_second_chunk(rows):
+        calls.append(len(rows))
+        if len(calls) == 2:
+            database_down(rows)
+        insert(rows)
+    
+    monkeypatch.setattr(writer, '_insert', fail_second_chunk)
+    writer._replay_spool()
+    
+    assert written(unique) == 2
+    with open(f'{writer.spool_path}.replay', encoding='utf-8') as replay:
+        assert len(replay.readlines()) == 3
+    assert writer.metrics()['degraded']
+    
+    monkeypatch.undo()
+    writer._replay_spool()
+    assert written(unique) == 5
+
+def test_replay_is_skipped_while_another_process_replays(app_context, writer, unique):
+    with open(writer.spool_path, 'w', encoding='utf-8') as spool:
+        spool.write(json.dumps(event(unique)) + '\n')
+    
+    with writer._file_lock('.replay.lock') as acquired:
+        assert acquired
+        other = AuditWriter(writer.app)
+        other.spool_path = writer.spool_path
+        other._replay_spool()  # A separate lock file handle, as in another process
+        assert written(unique) == 0
+    
+    writer._replay_spool()
+    assert written(unique) == 1
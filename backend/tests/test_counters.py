@@ -0,0 +1,117 @@
+"""Materialised entity counters (utils/counters.py)."""
+
+import time
+from sqlalchemy import update
+from src.database import db
+from src.models.analytics import EntityCounter
+from src.models.customer import Customer
+from src.utils.counters import entity_counters, counter_keys, encode_value, TOTAL
+
+def customer_counts():
+    db.session.expire_all()
+    counts = entity_counters.read('customers')['customers']
+    return {
+        'total': counts.total,
+        'Active': counts.get('status', 'Active'),
+        'Inactive': counts.get('status', 'Inactive'),
+        'Suspended': counts.get('status', 'Suspended'),
+        'VIP': counts.get('category', 'VIP')
+    }
+
+def actual_customer_counts():
+    return {
+        'total': Customer.query.count(),
+        'Active': Customer.query.filter_by(status='Active').count(),
+        'Inactive': Customer.query.filter_by(status='Inactive').count(),
+        'Suspended': Customer.query.filter_by(status='Suspended').count(),
+        'VIP': Customer.query.filter_by(category='VIP').count()
+    }
+
+def add_customers(unique, statuses, category='VIP'):
+    customers = [
+        Customer(customer_id=f'CT-{unique}-{i}', name=f'Counter {unique} {i}', type='Research', category=category, status=status)
+        for i, status in enumerate(statuses)
+    ]
+    db.session.add_all(customers)
+    db.session.commit()
+    return customers
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return condition()
+
+def test_orm_changes_apply_exact_deltas(app_context, unique):
+    before = customer_counts()
+    
+    active, _, inactive = add_customers(unique, ['Active', 'Active', 'Inactive'])
+    after_insert = customer_counts()
+    assert after_insert['total'] - before['total'] == 3
+    assert after_insert['Active'] - before['Active'] == 2
+    assert after_insert['Inactive'] - before['Inactive'] == 1
+    assert after_insert['VIP'] - before['VIP'] == 3
+    
+    customer = db.session.get(Customer, active.id)  # Loaded first, as routes do
+    customer.status = 'Suspended'
+    db.session.commit()
+    after_update = customer_counts()
+    assert after_update['Active'] - after_insert['Active'] == -1
+    assert after_update['Suspended'] - after_insert['Suspended'] == 1
+    assert after_update['total'] == after_insert['total']
+    
+    db.session.delete(inactive)
+    db.session.commit()
+    after_delete = customer_counts()
+    assert after_delete['total'] - after_update['total'] == -1
+    assert after_delete['Inactive'] - after_update['Inactive'] == -1
+    assert after_delete['VIP'] - after_update['VIP'] == -1
+
+def test_rolled_back_changes_leave_counters_alone(app_context, unique):
+    before = customer_counts()
+    
+    db.session.add(Customer(customer_id=f'CT-{unique}-rb', name='Rolled back', type='Research'))
+    db.session.flush()  # Deltas are applied in the flush's transaction
+    db.session.rollback()
+    
+    assert customer_counts() == before
+
+def test_bulk_update_is_recounted_in_the_background(app_context, unique):
+    add_customers(unique, ['Active'] * 4)
+    counted = customer_counts()
+    
+    Customer.query.filter(Customer.customer_id.like(f'CT-{unique}-%')).update(
+        {'status': 'Inactive'}, synchronize_session=False
+    )
+    db.session.commit()
+    
+    # The committing request does not recount; the reconciler catches up
+    assert wait_for(lambda: customer_counts() == actual_customer_counts())
+    recounted = customer_counts()
+    assert recounted['Active'] - counted['Active'] == -4
+    assert recounted['Inactive'] - counted['Inactive'] == 4
+
+def test_reconcile_corrects_drift(app_context, unique):
+    add_customers(unique, ['Active'])
+    with db.engine.begin() as connection:
+        connection.execute(
+            update(EntityCounter.__table__)
+            .where(EntityCounter.entity == 'customers', EntityCounter.dimension == TOTAL[0])
+            .values(count=EntityCounter.__table__.c['count'] + 1000)
+        )
+    
+    corrected = entity_counters.reconcile(['customers'])
+    
+    assert corrected['customers'] >= 1
+    assert customer_counts() == actual_customer_counts()
+
+def test_counter_keys():
+    assert encode_value(True) == 'true' and encode_value(False) == 'false' and encode_value(None) is None
+    
+    animal = {'status': 'ACTIVE', 'species': 'BOVINE', 'purpose': None, 'deleted_at': None}
+    assert counter_keys('animals', animal.get) == [TOTAL, ('status', 'ACTIVE'), ('species', 'BOVINE')]
+    
+    # Soft-deleted rows count towards nothing
+    assert counter_keys('animals', dict(animal, deleted_at='2024-01-01').get) == []
@@ -0,0 +1,84 @@
+"""Keyset cursor pagination (utils/pagination.py)."""
+
+from datetime import datetime, timezone, timedelta
+import pytest
+from src.database import db
+from src.models.customer import Customer
+from src.utils.pagination import paginate_query, encode_cursor, decode_cursor, _sort_keys, _ordering, InvalidCursor
+
+@pytest.fixture
+def customers(app_context, unique):
+    """Twelve customers with tied created_at values and some NULL industries."""
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    rows = [
+        Customer(
+            customer_id=f'PG-{unique}-{i:02d}',
+            name=f'Pagination {unique} {i:02d}',
+            type='Individual',
+            industry=None if i % 4 == 0 else f'industry-{i % 3}',
+            created_at=base + timedelta(days=i // 3)  # Groups of three share a timestamp
+        )
+        for i in range(12)
+    ]
+    db.session.add_all(rows)
+    db.session.commit()
+    return Customer.query.filter(Customer.customer_id.like(f'PG-{unique}-%'))
+
+def walk(app, query, order_by, per_page):
+    """Every page of a listing in cursor mode, as lists of customer_id."""
+    pages, cursor = [], ''
+    while True:
+        with app.test_request_context(f'/?cursor={cursor}'):
+            items, pagination = paginate_query(query, order_by, 1, per_page)
+        pages.append([customer.customer_id for customer in items])
+        assert pagination['mode'] == 'cursor' and pagination['total'] is None
+        if not pagination['has_next']:
+            assert pagination['next_cursor'] is None
+            return pages
+        cursor = pagination['next_cursor']
+
+@pytest.mark.parametrize('order_by', [
+    [Customer.created_at.desc()],
+    [Customer.created_at.asc()],
+    [Customer.industry.asc(), Customer.name.desc()],
+    [Customer.industry.desc()]
+], ids=['created-desc', 'created-asc', 'nullable-asc', 'nullable-desc'])
+def test_cursor_pages_cover_every_row_once_in_order(app, customers, order_by):
+    keys = _sort_keys(customers, order_by)
+    ordered = customers.order_by(*[_ordering(column, descending) for column, descending in keys]).all()
+    
+    pages = walk(app, customers, order_by, per_page=5)
+    
+    assert [len(page) for page in pages] == [5, 5, 2]
+    assert sum(pages, []) == [customer.customer_id for customer in ordered]
+
+def test_exact_page_boundary_has_no_empty_trailing_page(app, customers):
+    pages = walk(app, customers, [Customer.created_at.desc()], per_page=6)
+    assert [len(page) for page in pages] == [6, 6]
+
+def test_cursor_round_trips_typed_values(customers):
+    keys = _sort_keys(customers, [Customer.created_at.desc()])
+    customer = customers.first()
+    
+    values = decode_cursor(keys, encode_cursor(keys, customer))
+    
+    assert values[1] == customer.id  # Primary key tiebreaker, restored as a UUID
+    assert values[0].replace(tzinfo=None) == customer.created_at.replace(tzinfo=None)
+
+def test_cursor_from_another_order_is_rejected(customers):
+    by_created = _sort_keys(customers, [Customer.created_at.desc()])
+    by_name = _sort_keys(customers, [Customer.name.asc()])
+    cursor = encode_cursor(by_created, customers.first())
+    
+    with pytest.raises(InvalidCursor):
+        decode_cursor(by_name, cursor)
+    with pytest.raises(InvalidCursor):
+        decode_cursor(by_created, 'not-a-cursor')
+
+def test_offset_mode_is_unchanged(app, customers):
+    with app.test_request_context('/?page=2&per_page=5'):
+        items, pagination = paginate_query(customers, [Customer.created_at.desc()], 2, 5)
+    
+    assert len(items) == 5
+    assert pagination['total'] == 12 and pagination['pages'] == 3
+    assert pagination['has_next'] and pagination['has_prev']
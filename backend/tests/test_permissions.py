@@ -0,0 +1,184 @@
+"""Permission bitmasks and principals (utils/permissions.py, utils/principal.py)."""
+
+import pytest
+from src.database import db
+from src.models.user import Role, Permission, User, role_permissions
+from src.utils.cache import cache
+from src.utils.permissions import permission_registry, CLAIM
+from src.utils.principal import principal_cache
+
+@pytest.fixture
+def rbac(app_context, unique):
+    """Permissions read/write/delete and roles viewer (read) and editor (read, write)."""
+    permissions = {
+        action: Permission(name=f'{unique}.{action}', resource=unique, action=action)
+        for action in ('read', 'write', 'delete')
+    }
+    viewer = Role(name=f'viewer-{unique}', permissions=[permissions['read']])
+    editor = Role(name=f'editor-{unique}', permissions=[permissions['read'], permissions['write']])
+    db.session.add_all([*permissions.values(), viewer, editor])
+    db.session.commit()
+    return {'permissions': permissions, 'viewer': viewer, 'editor': editor, 'prefix': unique}
+
+def test_role_masks_or_together(rbac):
+    prefix = rbac['prefix']
+    read, write, delete = (permission_registry.bit(f'{prefix}.{action}') for action in ('read', 'write', 'delete'))
+    assert len({read, write, delete}) == 3 and all(bit and bit & (bit - 1) == 0 for bit in (read, write, delete))
+    
+    assert permission_registry.role_mask(rbac['viewer'].name) == read
+    assert permission_registry.mask_for_roles([rbac['viewer'].name, rbac['editor'].name]) == read | write
+    
+    mask = permission_registry.mask_for_roles([rbac['editor'].name])
+    assert permission_registry.has(mask, f'{prefix}.write')
+    assert not permission_registry.has(mask, f'{prefix}.delete')
+    assert not permission_registry.has(mask, 'no.such.permission')
+    assert permission_registry.names(mask) == {f'{prefix}.read', f'{prefix}.write'}
+
+def test_bits_stay_put_when_permissions_are_added(rbac, unique):
+    bits = {name: permission_registry.bit(name) for name in (p.name for p in rbac['permissions'].values())}
+    version = permission_registry.current_version()
+    
+    db.session.add(Permission(name=f'{unique}.export', resource=unique, action='export'))
+    db.session.commit()
+    
+    assert {name: permission_registry.bit(name) for name in bits} == bits
+    assert permission_registry.bit(f'{unique}.export')
+    assert permission_registry.current_version() != version
+
+def test_role_permission_change_rebuilds_masks(rbac):
+    prefix = rbac['prefix']
+    viewer = rbac['viewer']
+    assert not permission_registry.has(permission_registry.role_mask(viewer.name), f'{prefix}.delete')
+    
+    viewer.permissions.append(rbac['permissions']['delete'])
+    db.session.commit()
+    
+    assert permission_registry.has(permission_registry.role_mask(viewer.name), f'{prefix}.delete')
+    assert viewer.has_permission(f'{prefix}.delete')
+
+def test_masks_age_out_without_an_invalidation_channel(rbac, monkeypatch):
+    prefix = rbac['prefix']
+    viewer, delete = rbac['viewer'], rbac['permissions']['delete']
+    permission_registry.build()
+    
+    # Committed by another worker: this process hears nothing
+    with db.engine.begin() as connection:
+        connection.execute(role_permissions.insert().values(role_id=viewer.id, permission_id=delete.id))
+    assert not viewer.has_permission(f'{prefix}.delete')
+    
+    monkeypatch.setattr(permission_registry, '_built_at', permission_registry._built_at - permission_registry.rebuild_interval - 1)
+    assert viewer.has_permission(f'{prefix}.delete')
+
+def test_principal_carries_role_mask(rbac, make_user):
+    user = make_user(roles=[rbac['editor']])
+    
+    principal = principal_cache.load(str(user.id))
+    
+    assert principal.has_role(rbac['editor'].name)
+    assert principal.has_permission(f"{rbac['prefix']}.write")
+    assert not principal.has_permission(f"{rbac['prefix']}.delete")
+
+class SharedStore:
+    """The few Redis commands the cache uses, over a dict every 'worker' shares."""
+    
+    def __init__(self):
+        self.data = {}
+    
+    def get(self, key):
+        return self.data.get(key)
+    
+    def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+    
+    def set(self, key, value, nx=False):
+        if nx and key in self.data:
+            return False
+        self.data[key] = str(value).encode()
+        return True
+    
+    def setex(self, key, timeout, value):
+        self.data[key] = value
+    
+    def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, 0)) + 1).encode()
+        return int(self.data[key])
+    
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+    
+    def pipeline(self, transaction=True):
+        return Pipeline(self)
+
+class Pipeline:
+    def __init__(self, store):
+        self.store = store
+        self.calls = []
+    
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((getattr(self.store, name), args, kwargs))
+    
+    def execute(self):
+        return [method(*args, **kwargs) for method, args, kwargs in self.calls]
+
+@pytest.fixture
+def shared_cache(monkeypatch):
+    """Redis stand-in; clearing cache.memory_cache then acts as switching to another worker."""
+    store = SharedStore()
+    monkeypatch.setattr(cache, 'redis_client', store)
+    cache.memory_cache.clear()
+    yield store
+    cache.memory_cache.clear()
+
+def test_token_claims_are_retired_on_deactivation(rbac, make_user, shared_cache):
+    user = make_user(roles=[rbac['viewer']])
+    user_id = str(user.id)
+    claims = principal_cache.claims(user_id)
+    
+    principal = principal_cache.from_claims(user_id, claims)
+    assert principal is not None and principal.has_permission(f"{rbac['prefix']}.read")
+    
+    user.email = f'renamed-{user.username}@example.com'  # Unrelated change
+    db.session.commit()
+    assert principal_cache.from_claims(user_id, claims) is not None
+    
+    db.session.get(User, user.id).is_active = False
+    db.session.commit()
+    cache.memory_cache.clear()  # Another worker
+    assert principal_cache.from_claims(user_id, claims) is None
+
+def test_bulk_user_update_retires_every_claim(rbac, make_user, shared_cache):
+    user = make_user(roles=[rbac['viewer']])
+    claims = principal_cache.claims(str(user.id))
+    
+    User.query.filter_by(id=user.id).update({'is_verified': True})
+    db.session.commit()
+    
+    assert principal_cache.from_claims(str(user.id), claims) is None
+
+def test_claims_are_rejected_once_tag_keys_are_lost(rbac, make_user, shared_cache):
+    user = make_user(roles=[rbac['viewer']])
+    claims = principal_cache.claims(str(user.id))
+    assert 0 not in claims[CLAIM]['t'].values()
+    
+    shared_cache.data.clear()  # Evicted or flushed
+    cache.memory_cache.clear()
+    assert principal_cache.from_claims(str(user.id), claims) is None
+    
+    reissued = principal_cache.claims(str(user.id))
+    assert principal_cache.from_claims(str(user.id), reissued) is not None
+    assert principal_cache.from_claims(str(user.id), claims) is None  # Reseeded ahead of the old versions
+
+def test_claims_are_not_trusted_without_redis(rbac, make_user):
+    user = make_user(roles=[rbac['viewer']])
+    assert principal_cache.claims(str(user.id)) == {}
+    
+    # Local tag versions match here, but another worker or a restart could not tell a stale claim
+    forged = {CLAIM: {
+        'v': permission_registry.current_version(),
+        'm': format(permission_registry.role_mask(rbac['viewer'].name), 'x'),
+        'r': [rbac['viewer'].name],
+        't': cache.tag_versions(principal_cache._tags(str(user.id)))
+    }}
+    assert principal_cache.from_claims(str(user.id), forged) is None
+    assert principal_cache.load(str(user.id)).has_permission(f"{rbac['prefix']}.read")
@@ -0,0 +1,84 @@
+"""Sliding-window rate limiting (middleware/rate_limiting.py)."""
+
+import uuid
+import pytest
+from flask import Flask, jsonify
+from src.middleware.rate_limiting import (
+    MemoryRateLimitStore, RateLimitStorage, _result, _weighted_count, rate_limit
+)
+
+LIMIT = 10
+WINDOW = 60
+
+def hits(store, key, count, index, elapsed):
+    return [store.hit(key, LIMIT, WINDOW, index, elapsed)[0] for _ in range(count)]
+
+def test_fixed_window_allows_up_to_limit():
+    store = MemoryRateLimitStore()
+    assert hits(store, 'k', LIMIT + 2, index=5, elapsed=1.0) == [True] * LIMIT + [False, False]
+
+def test_previous_window_weighted_by_overlap():
+    store = MemoryRateLimitStore()
+    hits(store, 'k', LIMIT, index=5, elapsed=1.0)
+    
+    # Half-way through the next window the previous 10 requests still count as 5
+    assert hits(store, 'k', 6, index=6, elapsed=30.0) == [True] * 5 + [False]
+    assert store.peek('k', WINDOW, 6) == (5, LIMIT)
+
+def test_counts_older_than_previous_window_are_dropped():
+    store = MemoryRateLimitStore()
+    hits(store, 'k', LIMIT, index=5, elapsed=1.0)
+    assert store.peek('k', WINDOW, 7) == (0, 0)
+    assert hits(store, 'k', LIMIT, index=7, elapsed=1.0) == [True] * LIMIT
+
+def test_weighted_count():
+    assert _weighted_count(current=3, previous=10, window=60, elapsed=15) == pytest.approx(10.5)
+    assert _weighted_count(current=3, previous=10, window=60, elapsed=60) == pytest.approx(3)
+
+def test_reset_after_when_denied():
+    # Current window alone is full: wait for it to roll and decay below the limit
+    result = _result(False, current=20, previous=0, limit=LIMIT, window=WINDOW, elapsed=20)
+    assert not result.allowed and result.remaining == 0
+    assert result.reset_after == pytest.approx(40 + 60 * (1 - LIMIT / 20))
+    
+    # Denied by the previous window's weight: wait until it decays enough
+    result = _result(False, current=4, previous=12, limit=LIMIT, window=WINDOW, elapsed=20)
+    assert _weighted_count(4, 12, WINDOW, 20 + result.reset_after) == pytest.approx(LIMIT)
+
+def test_memory_store_is_bounded():
+    store = MemoryRateLimitStore(max_keys=4, segments=1)
+    for key in 'abcdef':
+        store.hit(key, LIMIT, WINDOW, 1, 0.0)
+    assert len(store) == 4
+    assert store.peek('a', WINDOW, 1) == (0, 0)  # Least recently used keys went first
+    assert store.peek('f', WINDOW, 1) == (1, 0)
+
+def test_storage_without_redis_uses_memory():
+    storage = RateLimitStorage()
+    assert storage.backend == 'memory'
+    
+    for remaining in range(LIMIT - 1, -1, -1):
+        result = storage.hit('user:1', LIMIT, WINDOW)
+        assert result.allowed and result.remaining == remaining
+    assert not storage.hit('user:1', LIMIT, WINDOW).allowed
+    
+    # peek never counts
+    assert storage.peek('user:2', LIMIT, WINDOW).remaining == LIMIT
+    assert storage.peek('user:2', LIMIT, WINDOW).remaining == LIMIT
+
+def test_decorator_returns_429_with_retry_after():
+    key = f'test:{uuid.uuid4().hex}'
+    app = Flask(__name__)
+    
+    @app.route('/limited')
+    @rate_limit(max_requests=3, window_seconds=WINDOW, key_func=lambda: key)
+    def limited():
+        return jsonify({'ok': True})
+    
+    client = app.test_client()
+    responses = [client.get('/limited') for _ in range(4)]
+    
+    assert [response.status_code for response in responses] == [200, 200, 200, 429]
+    assert responses[0].headers['X-RateLimit-Remaining'] == '2'
+    assert int(responses[3].headers['Retry-After']) >= 1
+    assert responses[3].headers['X-RateLimit-Remaining'] == '0'
@@ -0,0 +1,41 @@
+"""Indexed search on SQLite (utils/search.py)."""
+
+import pytest
+from sqlalchemy import text
+from src.database import db
+from src.models.customer import Customer
+from src.utils.search import search_index
+
+@pytest.fixture
+def customers(app_context, unique):
+    rows = [Customer(customer_id=f'SR-{unique}-{i}', name=f'Searchable {unique} number {i}', type='Individual') for i in range(3)]
+    db.session.add_all(rows)
+    db.session.commit()
+    assert search_index.available and search_index.dialect == 'sqlite'
+    return rows
+
+def matching(term):
+    return {customer.customer_id for customer in Customer.query.filter(search_index.matches('customer', term))}
+
+def test_matches_and_search_find_substrings(customers, unique):
+    assert matching(f'{unique} number 1') == {f'SR-{unique}-1'}
+    
+    results = search_index.search(f'SR-{unique}-2', entity_types=['customer'])
+    assert results[0]['id'] == str(customers[2].id)
+
+def test_index_follows_updates_and_deletes(customers, unique):
+    customers[0].name = f'Renamed {unique}'
+    db.session.delete(customers[1])
+    db.session.commit()
+    
+    assert matching(f'Renamed {unique}') == {f'SR-{unique}-0'}
+    assert matching(f'Searchable {unique}') == {f'SR-{unique}-2'}
+
+def test_renumbered_rowids_do_not_change_results(customers, unique):
+    # VACUUM may renumber the rowids of tables without an INTEGER PRIMARY KEY
+    db.session.execute(text('UPDATE customers SET rowid = rowid + 1000000 WHERE customer_id = :id'), {'id': f'SR-{unique}-0'})
+    db.session.commit()
+    
+    assert matching(f'{unique} number 0') == {f'SR-{unique}-0'}
+    results = search_index.search(f'Searchable {unique} number 0', entity_types=['customer'])
+    assert [result['id'] for result in results] == [str(customers[0].id)]
@@ -0,0 +1,133 @@
+"""Durable task queue: lease claiming, renewal and retries (utils/tasks.py)."""
+
+from datetime import datetime, timezone, timedelta
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import update
+from src.database import db
+from src.utils.tasks import (
+    task_manager, register_task, BackgroundTask, TaskStatus, TASK_REGISTRY, LEASE_EXPIRED_ERROR
+)
+
+@pytest.fixture
+def durable(app_context, unique, monkeypatch):
+    """A registered task on its own durable queue, so tests never claim each other's rows."""
+    monkeypatch.setattr(task_manager, 'backend', 'database')
+    monkeypatch.setitem(task_manager.queues, unique, ('thread', 1))
+    calls = []
+    
+    def flaky(task, fail=False):
+        calls.append(task.task_id)
+        if fail:
+            raise RuntimeError('flaky task failed')
+        return {'ok': True}
+    
+    name = f'tests.flaky.{unique}'
+    register_task(name, queue=unique, max_attempts=2)(flaky)
+    # claim() owners must be unique per call, across tests too
+    yield SimpleNamespace(queue=unique, func=flaky, calls=calls, owner=lambda worker: f'{worker}:{unique}')
+    TASK_REGISTRY.pop(name, None)
+
+def submit(durable, count=1, **kwargs):
+    return [task_manager.submit_task('Flaky task', durable.func, **kwargs) for _ in range(count)]
+
+def task_row(task_id):
+    db.session.expire_all()
+    return BackgroundTask.query.filter_by(task_id=task_id).one()
+
+def move_to_past(task_id, column):
+    with db.engine.begin() as connection:
+        connection.execute(
+            update(BackgroundTask.__table__)
+            .where(BackgroundTask.task_id == task_id)
+            .values({column: datetime.now(timezone.utc) - timedelta(seconds=1)})
+        )
+
+def run(durable, claimed):
+    # As a worker does: in its own app context, so with its own session
+    task_manager._run_in_thread(dict(claimed, func=durable.func))
+
+def test_submit_only_records_the_task(durable):
+    task_id, = submit(durable)
+    
+    task = task_row(task_id)
+    assert task.status == TaskStatus.PENDING and task.queue == durable.queue
+    assert task.max_attempts == 2 and task.attempts == 0
+    assert durable.calls == []
+
+def test_concurrent_claims_are_disjoint(durable):
+    task_ids = submit(durable, 3)
+    
+    first = task_manager.claim(durable.queue, 2, durable.owner('worker-a'))
+    second = task_manager.claim(durable.queue, 5, durable.owner('worker-b'))
+    
+    assert len(first) == 2 and len(second) == 1
+    assert sorted(claimed['task_id'] for claimed in first + second) == sorted(task_ids)
+    assert task_manager.claim(durable.queue, 5, durable.owner('worker-c')) == []
+    
+    task = task_row(second[0]['task_id'])
+    assert task.status == TaskStatus.RUNNING and task.lease_owner == durable.owner('worker-b') and task.attempts == 1
+
+def test_renewed_lease_is_extended(durable):
+    task_id, = submit(durable)
+    task_manager.claim(durable.queue, 1, durable.owner('worker-a'))
+    leased_until = task_row(task_id).lease_expires_at
+    
+    assert task_manager.renew_leases({durable.owner('worker-a')}) == 1
+    assert task_row(task_id).lease_expires_at >= leased_until
+    assert task_manager.renew_leases({durable.owner('worker-gone')}) == 0
+
+def test_expired_lease_is_reclaimed_then_reaped(durable):
+    task_id, = submit(durable)
+    task_manager.claim(durable.queue, 1, durable.owner('worker-a'))
+    move_to_past(task_id, 'lease_expires_at')  # worker-a died
+    
+    reclaimed = task_manager.claim(durable.queue, 1, durable.owner('worker-b'))
+    assert [claimed['task_id'] for claimed in reclaimed] == [task_id]
+    assert task_row(task_id).attempts == 2
+    
+    # Out of attempts: no longer claimable, failed by the reaper instead
+    move_to_past(task_id, 'lease_expires_at')
+    assert task_manager.claim(durable.queue, 1, durable.owner('worker-c')) == []
+    assert task_manager.reap_expired() >= 1
+    
+    task = task_row(task_id)
+    assert task.status == TaskStatus.FAILED
+    assert task.error_message == LEASE_EXPIRED_ERROR.format(attempts=2)
+
+def test_failure_is_retried_after_backoff_then_failed(durable):
+    task_id, = submit(durable, fail=True)
+    
+    run(durable, task_manager.claim(durable.queue, 1, durable.owner('worker-a'))[0])
+    task = task_row(task_id)
+    assert task.status == TaskStatus.PENDING and task.attempts == 1
+    assert 'flaky task failed' in task.error_message
+    assert task.lease_owner is None
+    assert task.run_after.replace(tzinfo=timezone.utc) > datetime.now(timezone.utc)
+    assert task_manager.claim(durable.queue, 1, durable.owner('worker-b')) == []  # Still backing off
+    
+    move_to_past(task_id, 'run_after')
+    run(durable, task_manager.claim(durable.queue, 1, durable.owner('worker-b'))[0])
+    task = task_row(task_id)
+    assert task.status == TaskStatus.FAILED and task.attempts == 2
+    assert len(durable.calls) == 2
+
+def test_success_completes_the_task(durable):
+    task_id, = submit(durable)
+    
+    run(durable, task_manager.claim(durable.queue, 1, durable.owner('worker-a'))[0])
+    
+    task = task_row(task_id)
+    assert task.status == TaskStatus.COMPLETED and task.progress == 100
+    assert task.result_data == {'ok': True}
+
+def test_task_is_skipped_once_its_lease_was_lost(durable):
+    task_id, = submit(durable)
+    stale = task_manager.claim(durable.queue, 1, durable.owner('worker-a'))[0]
+    move_to_past(task_id, 'lease_expires_at')
+    task_manager.claim(durable.queue, 1, durable.owner('worker-b'))
+    
+    run(durable, stale)
+    
+    assert durable.calls == []
+    assert task_row(task_id).lease_owner == durable.owner('worker-b')
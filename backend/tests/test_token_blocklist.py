@@ -0,0 +1,85 @@
+"""Bloom-filtered JWT blocklist (utils/token_blocklist.py)."""
+
+import uuid
+from datetime import datetime, timezone, timedelta
+import pytest
+from src.database import db
+from src.models.user import TokenBlacklist
+from src.utils.token_blocklist import BloomFilter, TokenBlocklist
+
+def jtis(count):
+    return [str(uuid.uuid4()) for _ in range(count)]
+
+def test_bloom_filter_has_no_false_negatives():
+    members = jtis(2000)
+    bloom = BloomFilter(2000, error_rate=0.01)
+    for jti in members:
+        bloom.add(jti)
+    
+    assert all(jti in bloom for jti in members)
+
+def test_bloom_filter_false_positive_rate_near_target():
+    bloom = BloomFilter(2000, error_rate=0.01)
+    for jti in jtis(2000):
+        bloom.add(jti)
+    
+    probes = jtis(20000)
+    false_positives = sum(jti in bloom for jti in probes)
+    
+    assert bloom.hashes == 7  # k = m/n ln 2 for a 1% error rate
+    assert false_positives / len(probes) < 0.03
+
+@pytest.fixture
+def blocklist(app, app_context):
+    blocklist = TokenBlocklist(app)  # No Redis: lookups and revocations stay in this process
+    blocklist.build()
+    return blocklist
+
+def blacklist(jti, expires_in=timedelta(hours=1)):
+    db.session.add(TokenBlacklist(jti=jti, token_type='access', expires_at=datetime.now(timezone.utc) + expires_in))
+    db.session.commit()
+
+def test_revoked_token_is_found_without_a_rebuild(blocklist):
+    jti = str(uuid.uuid4())
+    assert not blocklist.is_revoked(jti)
+    
+    blacklist(jti)
+    blocklist.revoke(jti)
+    
+    assert blocklist.is_revoked(jti)
+    assert blocklist.stats()['rebuilds'] == 1
+
+def test_bloom_negative_needs_no_query(blocklist, count_queries):
+    with count_queries() as statements:
+        for jti in jtis(50):
+            assert not blocklist.is_revoked(jti)
+    
+    # Only Bloom positives (false positives here) are confirmed with a query
+    assert len(statements) == blocklist.stats()['bloom_positives']
+
+def test_bloom_positive_is_confirmed_against_the_database(blocklist):
+    jti = str(uuid.uuid4())
+    blocklist._add(jti)  # In the filter, never committed
+    
+    assert not blocklist.is_revoked(jti)
+    assert blocklist.stats()['bloom_positives'] >= 1
+
+def test_build_skips_and_prune_removes_expired_rows(blocklist):
+    live, expired = str(uuid.uuid4()), str(uuid.uuid4())
+    blacklist(live)
+    blacklist(expired, expires_in=timedelta(hours=-1))
+    
+    blocklist.build()
+    assert live in blocklist._filter
+    
+    assert blocklist.prune() >= 1
+    assert TokenBlacklist.query.filter_by(jti=expired).first() is None
+    assert TokenBlacklist.query.filter_by(jti=live).first() is not None
+
+def test_filter_inherited_from_another_process_is_rebuilt(blocklist):
+    jti = str(uuid.uuid4())
+    blacklist(jti)  # Committed by another worker; this process never saw the revocation
+    blocklist._filter_pid = -1  # As if built before a fork
+    
+    assert blocklist.is_revoked(jti)
+    assert blocklist.stats()['rebuilds'] == 2